@@ -5,6 +5,8 @@ import time
 import matplotlib.pyplot as plt
 import os
 
+from utils.spectral_features import extract_features
+
 class AQ6370D:
     def __init__(self, address, port):
         self.address = address
@@ -93,8 +95,9 @@ class AQ6370D:
         finally:
             self.close_socket()
 
-    def analyze_spectrum(self):
-        pass
+    def analyze_spectrum(self, wavelengths, intensities):
+        # Trace data is in dBm; returns peak table, summary and band integrals (None)
+        return extract_features(wavelengths, intensities, db=True)
 
     def ArrayForLabview(self, InputArray, wavelengthStart, wavelengthEnd):
         NumArray = InputArray.split('ready', 1)[1]
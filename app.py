@@ -5,6 +5,8 @@ import os
 # Import refactored components
 from layouts.main_layout import create_layout
 from layouts.index_template import index_string
+from utils.transport import enable_compression
+from utils.chunked_upload import register_upload_routes
 
 # Initialize the Dash app with multi-page support
 app = dash.Dash(
@@ -16,6 +18,15 @@ app = dash.Dash(
     use_pages=True,  # Enable multi-page support
 )
 
+# WSGI application for production servers (see serve.py and gunicorn.conf.py)
+server = app.server
+
+# Compress responses (callback payloads, Plotly.js and component bundles)
+enable_compression(app.server)
+
+# Routes for chunked CSV uploads into the server-side store
+register_upload_routes(app.server)
+
 # Set the app layout using the refactored layout
 app.layout = create_layout()
 
@@ -0,0 +1,113 @@
+// Chunked upload of CSV spectra (server side in utils/chunked_upload.py)
+//
+// The file is sent as raw binary slices, one request at a time, and parsed on
+// the server as it arrives. The page only receives the handle of the stored
+// spectrum, so large files neither freeze the tab nor travel back and forth
+// in callbacks. Progress is shown with set_props while the upload runs.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    chunked_upload: {
+        // Attempts per chunk before giving up
+        retries: 3,
+
+        /**
+         * Show the progress of the upload
+         *
+         * @param {number} sent - Bytes sent and parsed
+         * @param {number} total - File size in bytes
+         * @param {number} rows - Rows parsed so far
+         * @param {boolean} visible - Whether the progress bar is shown
+         */
+        showProgress: function(sent, total, rows, visible) {
+            const mb = v => (v / (1024 * 1024)).toFixed(1);
+            window.dash_clientside.set_props("csv-upload-progress", {
+                value: total > 0 ? Math.round(100 * sent / total) : 0,
+                label: total > 0 ? `${mb(sent)} / ${mb(total)} MB · ${rows} filas` : "",
+                style: {display: visible ? "flex" : "none"}
+            });
+        },
+
+        /**
+         * Send a request and decode its JSON answer, raising the server's error message
+         */
+        request: async function(url, options) {
+            const response = await fetch(url, options);
+            const body = await response.json().catch(() => ({}));
+            if (!response.ok) {
+                throw new Error(body.error || `Error ${response.status} del servidor`);
+            }
+            return body;
+        },
+
+        /**
+         * Select a CSV file and upload it in chunks
+         *
+         * @param {number} n_clicks - Number of button clicks
+         * @param {Object} current - Handle of the spectrum displayed so far
+         * @param {string} sessionId - Browser session id
+         * @returns {Object} - Handle of the stored spectrum ({name, handle, key}) or {name, error}
+         */
+        uploadCsv: async function(n_clicks, current, sessionId) {
+            const self = window.dash_clientside.chunked_upload;
+            if (!n_clicks) {
+                return window.dash_clientside.no_update;
+            }
+            let file;
+            try {
+                file = await window.dash_clientside.file_selector.selectFile();
+            } catch (error) {
+                console.error("Error selecting file:", error);
+                return window.dash_clientside.no_update;
+            }
+            if (!file) {
+                return window.dash_clientside.no_update;
+            }
+
+            const json = {"Content-Type": "application/json"};
+            self.showProgress(0, file.size, 0, true);
+            try {
+                const start = await self.request("/upload/start", {
+                    method: "POST",
+                    headers: json,
+                    body: JSON.stringify({
+                        name: file.name,
+                        size: file.size,
+                        session: sessionId,
+                        replaces: current ? current.handle : null
+                    })
+                });
+                const base = `/upload/${start.upload_id}`;
+                let offset = 0;
+                while (offset < file.size) {
+                    const end = Math.min(offset + start.chunk_size, file.size);
+                    let answer = null;
+                    for (let attempt = 1; answer === null; attempt++) {
+                        try {
+                            answer = await self.request(`${base}/chunk?offset=${offset}`, {
+                                method: "PUT",
+                                headers: {"Content-Type": "application/octet-stream"},
+                                body: file.slice(offset, end)
+                            });
+                        } catch (error) {
+                            // Parse errors are final; network errors are retried
+                            if (attempt >= self.retries || !(error instanceof TypeError)) {
+                                throw error;
+                            }
+                        }
+                    }
+                    offset = answer.received;
+                    self.showProgress(offset, file.size, answer.rows, true);
+                }
+                const result = await self.request(`${base}/finish`, {
+                    method: "POST",
+                    headers: json,
+                    body: JSON.stringify({session: sessionId})
+                });
+                self.showProgress(0, 0, 0, false);
+                return {name: result.name, handle: result.handle, key: result.key};
+            } catch (error) {
+                self.showProgress(0, 0, 0, false);
+                return {name: file.name, error: error.message};
+            }
+        }
+    }
+});
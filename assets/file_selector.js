@@ -99,6 +99,60 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
             }
         },
 
+        /**
+         * Let the user choose a CSV file
+         *
+         * @returns {File} - Selected file, or null if cancelled
+         */
+        selectFile: async function() {
+            // Check if File System Access API is supported
+            if ('showOpenFilePicker' in window) {
+                // Modern browsers with File System Access API
+                const opts = {
+                    types: [{
+                        description: 'CSV Files',
+                        accept: {
+                            'text/csv': ['.csv'],
+                        }
+                    }],
+                    excludeAcceptAllOption: false,
+                    multiple: false
+                };
+
+                const [fileHandle] = await window.showOpenFilePicker(opts);
+                return await fileHandle.getFile();
+            }
+
+            // Fallback for browsers without File System Access API
+            // Use a hidden file input
+            const input = document.getElementById('hidden-file-input');
+            if (!input) {
+                alert("Su navegador no soporta la selección nativa de archivos. Por favor, intente con otro navegador.");
+                return null;
+            }
+
+            // Create a promise that resolves when the file input changes
+            return await new Promise((resolve) => {
+                const handleChange = function() {
+                    input.removeEventListener('change', handleChange);
+                    resolve(input.files.length > 0 ? input.files[0] : null);
+                };
+
+                input.addEventListener('change', handleChange);
+                input.click();
+
+                // Handle cancel
+                setTimeout(() => {
+                    const handleCancel = function() {
+                        document.removeEventListener('click', handleCancel);
+                        input.removeEventListener('change', handleChange);
+                        resolve(null);
+                    };
+                    document.addEventListener('click', handleCancel);
+                }, 100);
+            });
+        },
+
         /**
          * Open a file picker dialog for CSV files
          * 
@@ -109,77 +163,14 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
             if (!n_clicks) return null;
 
             try {
-                // Check if File System Access API is supported
-                if ('showOpenFilePicker' in window) {
-                    // Modern browsers with File System Access API
-                    const opts = {
-                        types: [{
-                            description: 'CSV Files',
-                            accept: {
-                                'text/csv': ['.csv'],
-                            }
-                        }],
-                        excludeAcceptAllOption: false,
-                        multiple: false
-                    };
-
-                    const [fileHandle] = await window.showOpenFilePicker(opts);
-                    const file = await fileHandle.getFile();
-                    const content = await file.text();
-
-                    return {
-                        name: file.name,
-                        path: fileHandle.name,
-                        content: content
-                    };
-                } else {
-                    // Fallback for browsers without File System Access API
-                    // Use a hidden file input
-                    const input = document.getElementById('hidden-file-input');
-                    if (input) {
-                        // Create a promise that resolves when the file input changes
-                        const promise = new Promise((resolve) => {
-                            const handleChange = function() {
-                                input.removeEventListener('change', handleChange);
-
-                                if (input.files.length > 0) {
-                                    const file = input.files[0];
-                                    const reader = new FileReader();
-
-                                    reader.onload = function(e) {
-                                        resolve({
-                                            name: file.name,
-                                            path: file.name,
-                                            content: e.target.result
-                                        });
-                                    };
-
-                                    reader.readAsText(file);
-                                } else {
-                                    resolve(null);
-                                }
-                            };
-
-                            input.addEventListener('change', handleChange);
-                            input.click();
-
-                            // Handle cancel
-                            setTimeout(() => {
-                                const handleCancel = function() {
-                                    document.removeEventListener('click', handleCancel);
-                                    input.removeEventListener('change', handleChange);
-                                    resolve(null);
-                                };
-                                document.addEventListener('click', handleCancel);
-                            }, 100);
-                        });
-
-                        return await promise;
-                    } else {
-                        alert("Su navegador no soporta la selección nativa de archivos. Por favor, intente con otro navegador.");
-                        return null;
-                    }
-                }
+                const file = await window.dash_clientside.file_selector.selectFile();
+                if (!file) return null;
+
+                return {
+                    name: file.name,
+                    path: file.name,
+                    content: await file.text()
+                };
             } catch (error) {
                 console.error("Error selecting file:", error);
                 return null;
@@ -0,0 +1,74 @@
+// Client-side pacing and counters of the live spectrum view
+//
+// Only one frame request is in flight at a time: interval ticks that arrive
+// while the previous frame has not been delivered yet are skipped, so a slow
+// browser or network drops frames instead of queueing requests.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    live_view: {
+        state: {sentAt: {}, arrivals: [], shown: 0, dropped: 0, skipped: 0, lastSeq: 0, latency: 0},
+
+        // Resend a request that got no answer after this many milliseconds
+        requestTimeout: 5000,
+
+        /**
+         * Emit a new frame request if the previous one has been answered
+         *
+         * @param {number} n_intervals - Interval ticks
+         * @param {Object} ack - Answer to the last request ({request, seq, ...})
+         * @param {Object} request - Last request sent ({id, after})
+         * @returns {Object} - New request, or no_update to skip this tick
+         */
+        tick: function(n_intervals, ack, request) {
+            const live = window.dash_clientside.live_view;
+            const now = performance.now();
+            if (!request) {
+                // First tick after (re)starting the view
+                live.state = {sentAt: {}, arrivals: [], shown: 0, dropped: 0, skipped: 0, lastSeq: 0, latency: 0};
+            } else if ((!ack || ack.request !== request.id)
+                       && now - (live.state.sentAt[request.id] || 0) < live.requestTimeout) {
+                live.state.skipped += 1;
+                return window.dash_clientside.no_update;
+            }
+            const id = request ? request.id + 1 : 1;
+            live.state.sentAt = {[id]: now};
+            return {id: id, after: ack ? ack.seq : 0};
+        },
+
+        /**
+         * Update the frame, drop and latency counters when a frame arrives
+         *
+         * @param {Object} ack - Answer to the last request
+         * @returns {string} - Text of the counters
+         */
+        counters: function(ack) {
+            const live = window.dash_clientside.live_view;
+            const state = live.state;
+            if (!ack) {
+                return "";
+            }
+            if (ack.error) {
+                return "Error en la vista en vivo: " + ack.error;
+            }
+            const now = performance.now();
+            if (ack.seq > state.lastSeq) {
+                if (state.lastSeq > 0) {
+                    state.dropped += ack.seq - state.lastSeq - 1;
+                }
+                state.lastSeq = ack.seq;
+                state.shown += 1;
+                state.arrivals.push(now);
+                while (state.arrivals.length > 0 && now - state.arrivals[0] > 5000) {
+                    state.arrivals.shift();
+                }
+                const roundTrip = now - (state.sentAt[ack.request] || now);
+                // Age of the sweep on the server plus the request round trip
+                state.latency = 1000 * ack.age + roundTrip;
+            }
+            const span = state.arrivals.length > 1 ? (now - state.arrivals[0]) / 1000 : 0;
+            const fps = span > 0 ? (state.arrivals.length - 1) / span : 0;
+            return `${fps.toFixed(1)} fps | cuadros: ${state.shown} mostrados, ${state.dropped} descartados, ` +
+                `${state.skipped} ticks omitidos | latencia: ${state.latency.toFixed(0)} ms | ` +
+                `barrido: ${(1000 * ack.sweep).toFixed(0)} ms`;
+        }
+    }
+});
@@ -0,0 +1,212 @@
+// Client-side view transforms for spectrum figures
+//
+// The server sends the processed spectrum once (as typed arrays, see
+// utils/transport.py); normalization, dB/linear scale, nm/cm-1 units and
+// cropping are applied here, so changing them needs no server request.
+// Zooming fetches the visible window at higher resolution as a separate
+// detail trace, which is spliced into the whole spectrum; normalization
+// uses the extremes of the whole spectrum sent with the base figure.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    spectral_transforms: {
+        /**
+         * Decode a trace array sent as {dtype, bdata} or as a plain list
+         *
+         * Arrays with an offset and a step hold the number of grid steps
+         * between consecutive values (decimated views, see utils/transport.py).
+         *
+         * @param {Object|Array} spec - Typed-array specification or list of numbers
+         * @returns {Float64Array} - Decoded values
+         */
+        decodeArray: function(spec) {
+            if (spec && spec.bdata !== undefined) {
+                const binary = atob(spec.bdata);
+                const bytes = new Uint8Array(binary.length);
+                for (let i = 0; i < binary.length; i++) {
+                    bytes[i] = binary.charCodeAt(i);
+                }
+                const types = {
+                    f4: Float32Array, f8: Float64Array, i4: Int32Array,
+                    u1: Uint8Array, u2: Uint16Array, u4: Uint32Array
+                };
+                const values = Float64Array.from(new types[spec.dtype](bytes.buffer));
+                if (spec.step !== undefined) {
+                    let index = 0;
+                    for (let i = 0; i < values.length; i++) {
+                        index += values[i];
+                        values[i] = spec.offset + index * spec.step;
+                    }
+                }
+                return values;
+            }
+            return Float64Array.from(spec || []);
+        },
+
+        /**
+         * Get the x values of a trace, expanding x0/dx grids
+         *
+         * @param {Object} trace - Plotly trace
+         * @param {number} n - Number of points
+         * @returns {Float64Array} - X values
+         */
+        traceX: function(trace, n) {
+            if (trace.x !== null && trace.x !== undefined) {
+                return this.decodeArray(trace.x);
+            }
+            const x = new Float64Array(n);
+            for (let i = 0; i < n; i++) {
+                x[i] = trace.x0 + i * trace.dx;
+            }
+            return x;
+        },
+
+        /**
+         * Min-max normalization to [0, 1] (constant spectra become 0)
+         *
+         * @param {Float64Array} y - Values to normalize
+         * @param {Array} extremes - [min, max] to scale with, or null to use those of y
+         * @returns {Float64Array} - Normalized values
+         */
+        normalizeMinmax: function(y, extremes) {
+            let low = Infinity;
+            let high = -Infinity;
+            if (extremes && Number.isFinite(extremes[0]) && Number.isFinite(extremes[1])) {
+                low = Math.min(extremes[0], extremes[1]);
+                high = Math.max(extremes[0], extremes[1]);
+            } else {
+                for (const v of y) {
+                    if (v < low) low = v;
+                    if (v > high) high = v;
+                }
+            }
+            const span = high > low ? high - low : 1;
+            return y.map(v => (v - low) / span);
+        },
+
+        /**
+         * Replace the points of a trace inside the window of a detail trace
+         *
+         * @param {Float64Array} x - X values of the whole spectrum
+         * @param {Float64Array} y - Y values of the whole spectrum
+         * @param {Object} detail - Trace of the zoomed window
+         * @returns {Array} - Merged x and y arrays, sorted by x
+         */
+        spliceDetail: function(x, y, detail) {
+            const detailY = this.decodeArray(detail.y);
+            const detailX = this.traceX(detail, detailY.length);
+            if (detailX.length === 0) {
+                return [x, y];
+            }
+            const low = Math.min(detailX[0], detailX[detailX.length - 1]);
+            const high = Math.max(detailX[0], detailX[detailX.length - 1]);
+            const points = [];
+            for (let i = 0; i < x.length; i++) {
+                if (x[i] < low || x[i] > high) {
+                    points.push([x[i], y[i]]);
+                }
+            }
+            for (let i = 0; i < detailX.length; i++) {
+                points.push([detailX[i], detailY[i]]);
+            }
+            points.sort((a, b) => a[0] - b[0]);
+            return [Float64Array.from(points, p => p[0]), Float64Array.from(points, p => p[1])];
+        },
+
+        /**
+         * Convert dB values to linear scale
+         */
+        dbToLinear: function(y) {
+            return y.map(v => Math.pow(10, v / 10));
+        },
+
+        /**
+         * Convert linear values to dB (non-positive values become NaN)
+         */
+        linearToDb: function(y) {
+            return y.map(v => v > 0 ? 10 * Math.log10(v) : NaN);
+        },
+
+        /**
+         * Convert between nm and cm-1 (the conversion is its own inverse)
+         */
+        invertUnits: function(x) {
+            return x.map(v => v !== 0 ? 1e7 / v : NaN);
+        },
+
+        /**
+         * Keep the points whose x value is inside [start, end]
+         *
+         * @returns {Array} - Cropped x and y arrays
+         */
+        crop: function(x, y, start, end) {
+            const low = (start === null || start === undefined || start === "") ? -Infinity : Number(start);
+            const high = (end === null || end === undefined || end === "") ? Infinity : Number(end);
+            const keep = [];
+            for (let i = 0; i < x.length; i++) {
+                if (x[i] >= Math.min(low, high) && x[i] <= Math.max(low, high)) {
+                    keep.push(i);
+                }
+            }
+            return [Float64Array.from(keep, i => x[i]), Float64Array.from(keep, i => y[i])];
+        },
+
+        /**
+         * Build the displayed figure from the figure sent by the server
+         *
+         * @param {Object} base - Figure sent by the server, with the extremes of the whole spectrum
+         * @param {Object} detail - Trace of the zoomed window, or null
+         * @param {boolean} normalize - Min-max normalization
+         * @param {string} yScale - "original", "db_to_linear" or "linear_to_db"
+         * @param {string} xUnit - "nm" or "cm-1"
+         * @param {number} cropStart - Lower x limit, in the displayed unit
+         * @param {number} cropEnd - Upper x limit, in the displayed unit
+         * @returns {Object} - Figure for the graph
+         */
+        applyTransforms: function(base, detail, normalize, yScale, xUnit, cropStart, cropEnd) {
+            if (!base || !base.data || base.data.length === 0) {
+                return base || {data: [], layout: {}};
+            }
+            const self = window.dash_clientside.spectral_transforms;
+            const scale = y => yScale === "db_to_linear" ? self.dbToLinear(y)
+                : yScale === "linear_to_db" ? self.linearToDb(y) : y;
+            // Extremes of the whole spectrum; the scale conversions are monotonic
+            const extremes = base.extremes ? Array.from(scale(Float64Array.from(base.extremes))) : null;
+            const data = base.data.map((trace, index) => {
+                let y = self.decodeArray(trace.y);
+                let x = self.traceX(trace, y.length);
+                if (detail && index === 0) {
+                    [x, y] = self.spliceDetail(x, y, detail);
+                }
+                if (xUnit === "cm-1") {
+                    x = self.invertUnits(x);
+                }
+                [x, y] = self.crop(x, y, cropStart, cropEnd);
+                y = scale(y);
+                if (normalize) {
+                    y = self.normalizeMinmax(y, index === 0 ? extremes : null);
+                }
+                const transformed = Object.assign({}, trace, {x: x, y: y});
+                delete transformed.x0;
+                delete transformed.dx;
+                return transformed;
+            });
+
+            const layout = Object.assign({}, base.layout);
+            const yUnits = {db_to_linear: " (lineal)", linear_to_db: " (dB)"};
+            const scaleSuffix = {db_to_linear: " (Escala lineal)", linear_to_db: " (Escala dB)"};
+            let suffix = scaleSuffix[yScale] || "";
+            if (normalize) suffix += " (Normalizado)";
+            layout.title = Object.assign({}, layout.title, {text: ((layout.title || {}).text || "") + suffix});
+            // Each axis keeps the user's zoom until its own transforms change
+            const revision = String(layout.uirevision);
+            layout.xaxis = Object.assign({}, layout.xaxis, {
+                title: {text: xUnit === "cm-1" ? "Número de onda (cm⁻¹)" : "Longitud de onda (nm)"},
+                uirevision: [revision, xUnit, cropStart, cropEnd].join("|")
+            });
+            layout.yaxis = Object.assign({}, layout.yaxis, {
+                title: {text: normalize ? "Intensidad normalizada" : "Intensidad" + (yUnits[yScale] || " (u.a.)")},
+                uirevision: [revision, yScale, normalize, xUnit, cropStart, cropEnd].join("|")
+            });
+            return {data: data, layout: layout};
+        }
+    }
+});
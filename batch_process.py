@@ -0,0 +1,102 @@
+"""
+Apply a processing recipe to a whole folder of spectra using all CPU cores.
+
+Usage:
+    python batch_process.py <dir_or_glob> <output_archive> --recipe "to_nm; crop:high=2500; normalize_max"
+    python batch_process.py "./OSA_Data/muestra_*.csv" ./procesados --recipe receta.json --workers 8
+
+Available steps: to_nm, crop, normalize_max, normalize_minmax, reflectance,
+db_to_linear, linear_to_db, smooth, baseline, resample and ratio (see utils/recipes.py).
+Results are written to a binary spectrum archive; files already processed with
+the same recipe and unchanged since are skipped.
+"""
+
+import argparse
+import os
+
+from utils.batch_runner import (
+    run_in_pool, Throughput, collect_inputs, process_file, take_shared_result,
+    ensure_shared_memory_tracking, format_timings,
+)
+from utils.recipes import parse_recipe, recipe_changed, save_recipe, discard_recipe
+from utils.spectrum_archive import SpectrumArchive
+
+REPORT_EVERY = 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Procesa en lote una carpeta de espectros.")
+    parser.add_argument("inputs", help="Directorio o patrón glob con archivos .dpt/.csv")
+    parser.add_argument("output_dir", help="Archivo binario de salida")
+    parser.add_argument("--recipe", required=True, help="Receta en línea o archivo .json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Número de procesos")
+    parser.add_argument("--force", action="store_true", help="Reprocesar aunque el archivo no haya cambiado")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    recipe = parse_recipe(args.recipe)
+    source_root, files = collect_inputs(args.inputs)
+
+    archive = SpectrumArchive(args.output_dir)
+    changed = recipe_changed(args.output_dir, recipe)
+    force = args.force or changed
+    if changed:
+        # The recipe is recorded again only once every output comes from it
+        discard_recipe(args.output_dir)
+
+    pending = [f for f in files if force or not archive.is_current(*f)]
+    print(f"{len(files)} archivos encontrados, {len(pending)} por procesar")
+
+    progress = Throughput(len(pending))
+    timings = {}
+    errors = []
+
+    stats = {source: (size, mtime_ns) for source, size, mtime_ns in pending}
+
+    def on_result(item, result):
+        source = item[1]
+        size, mtime_ns = stats[source]
+        array = take_shared_result(result)
+        archive.add(source, result["kind"], array[0], array[1], size=size, mtime_ns=mtime_ns, commit=False)
+        for label, seconds in result["timings"].items():
+            timings[label] = timings.get(label, 0.0) + seconds
+        progress.add(size)
+        if progress.done % REPORT_EVERY == 0:
+            archive.commit()
+            print(progress.report())
+
+    def on_error(item, exception):
+        errors.append((item[1], str(exception)))
+        progress.add(0)
+
+    ensure_shared_memory_tracking()
+    interrupted = False
+    try:
+        run_in_pool(
+            process_file,
+            ((source_root, source, recipe) for source, _, _ in pending),
+            args.workers,
+            on_result,
+            on_error,
+        )
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Procesamiento interrumpido; el progreso se conserva y se reanudará en la próxima ejecución.")
+    finally:
+        archive.close()
+    if not interrupted and not errors:
+        save_recipe(args.output_dir, recipe)
+
+    print(progress.report())
+    if timings:
+        print("Tiempo por paso (suma de todos los procesos):")
+        print("\n".join(format_timings(timings)))
+    for source, message in errors:
+        print(f"Error en {source}: {message}")
+    print(f"Procesamiento terminado: {progress.done - len(errors)} procesados, {len(errors)} errores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Benchmarks package for the OSA Remote Control application.
+This package contains performance benchmarks for the processing code.
+"""
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Benchmark of the batched baseline estimators on a synthetic campaign.
+
+Usage:
+    python -m benchmarks.bench_baseline [n_spectra] [n_points]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from utils.baseline import BASELINE_METHODS, baseline
+
+
+def synthetic_campaign(n_spectra, n_points, seed=0):
+    # Sloped, curved baselines with one Gaussian band per spectrum plus noise
+    rng = np.random.default_rng(seed)
+    x = np.linspace(900, 2500, n_points)
+    t = (x - x[0]) / (x[-1] - x[0])
+    slope = rng.uniform(-0.5, 0.5, (n_spectra, 1))
+    curve = rng.uniform(-0.3, 0.3, (n_spectra, 1))
+    centers = rng.uniform(1000, 2400, (n_spectra, 1))
+    y = slope * t + curve * t ** 2 + np.exp(-(x - centers) ** 2 / 400)
+    y += 0.01 * rng.standard_normal(y.shape)
+    return x, y
+
+
+def main():
+    n_spectra = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 1601
+
+    x, y = synthetic_campaign(n_spectra, n_points)
+    print(f"{n_spectra} espectros x {n_points} puntos")
+    for method in BASELINE_METHODS:
+        start = time.perf_counter()
+        baseline(x, y, method)
+        elapsed = time.perf_counter() - start
+        print(f"{method:12s} {elapsed:8.2f} s | {n_spectra / elapsed:9.0f} espectros/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark of the live view: frame rate held while polling a sweep stream.
+
+A simulated source produces sweeps in a background thread while the main
+thread polls at the view's frame rate and builds each partial figure update
+as the poll callback does.
+
+Usage:
+    python -m benchmarks.bench_live_view [fps] [points] [seconds]
+"""
+
+import sys
+import time
+
+from plotly.io.json import to_json_plotly
+
+from components.graphs import spectrum_trace, patch_spectrum_figure
+from utils.downsampling import downsample_view
+from utils.sweep_stream import SimulatedSweepSource, SweepStream
+
+
+def main():
+    fps = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 50001
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    stream = SweepStream(SimulatedSweepSource(points=points), max_fps=2 * fps).start()
+    period = 1.0 / fps
+    shown, last_seq, dropped, payload, build = 0, 0, 0, 0, 0.0
+    start = time.perf_counter()
+    next_tick = start
+    while time.perf_counter() - start < seconds:
+        frame = stream.latest(last_seq)
+        if frame is not None:
+            tick = time.perf_counter()
+            x, y = downsample_view(frame["wavelengths"], frame["intensities"])
+            patch = patch_spectrum_figure([spectrum_trace(x, y)])
+            payload += len(to_json_plotly(patch))
+            build += time.perf_counter() - tick
+            dropped += frame["seq"] - last_seq - 1 if last_seq else 0
+            last_seq = frame["seq"]
+            shown += 1
+        next_tick += period
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    stream.stop(timeout=1)
+
+    print(f"Objetivo {fps:.0f} fps, barridos de {points} puntos")
+    print(f"Mostrados: {shown / elapsed:.1f} fps | producidos: {stream.seq / elapsed:.1f} fps | descartados: {dropped}")
+    if shown:
+        print(f"Por cuadro: {1000 * build / shown:.2f} ms de CPU, {payload / shown / 1024:.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of the multi-spectrum overlay: server time and bytes per update.
+
+A temporary archive with ``n_traces`` spectra is created; the overlay series
+are built for the whole range (cold and cached) and for a zoomed window, and
+the resulting WebGL traces are serialized as the page callback does.
+
+Usage:
+    python -m benchmarks.bench_overlay [n_traces] [n_points]
+"""
+
+import gzip
+import sys
+import tempfile
+import time
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from components.graphs import spectrum_trace
+from utils.overlay import overlay_series, points_per_trace
+from utils.spectrum_archive import SpectrumArchive
+
+
+def update(root, keys, x_range, points):
+    start = time.perf_counter()
+    series = overlay_series(root, keys, x_range, points)
+    traces = [spectrum_trace(x, y, webgl=True, width=1) for x, y in series.values()]
+    payload = to_json_plotly({"data": traces}).encode("utf-8")
+    return time.perf_counter() - start, payload
+
+
+def main():
+    n_traces = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 50001
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(1200, 1700, n_points)
+    with tempfile.TemporaryDirectory() as root:
+        with SpectrumArchive(root) as archive:
+            keys = [
+                archive.add(f"m{i:04d}.csv", "csv", x, np.sin(x / 10 + i) + 0.1 * rng.standard_normal(n_points),
+                            commit=False)
+                for i in range(n_traces)
+            ]
+        points = points_per_trace(n_traces)
+        print(f"{n_traces} espectros de {n_points} puntos, {points} puntos por traza")
+        for name, x_range in [("completo (frío)", None), ("completo (caché)", None), ("zoom 10 nm", (1500, 1510))]:
+            elapsed, payload = update(root, keys, x_range, points)
+            print(
+                f"{name:18s} {1000 * elapsed:7.1f} ms | {len(payload) / 1024:8.1f} kB | "
+                f"gzip {len(gzip.compress(payload, 6)) / 1024:8.1f} kB"
+            )
+
+
+if __name__ == "__main__":
+    main()
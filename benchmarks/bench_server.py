@@ -0,0 +1,156 @@
+"""
+Load test of the server: callback throughput of the development server and of
+``serve.py`` with one or more worker processes.
+
+Each configuration is started in a subprocess with its own temporary state
+directory. A synthetic spectrum is uploaded through the chunked upload routes
+and ``clients`` threads then send preprocessing callbacks for ``duration``
+seconds, cycling through a few smoothing options (so after the first requests
+they are served from the processing caches, shared between workers through
+disk). Every answer is checked: a handle or cache entry that a worker cannot
+see counts as an error.
+
+Usage:
+    python -m benchmarks.bench_server [duration] [clients] [n_points]
+"""
+
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+PORT = 8071
+
+CONFIGURATIONS = [
+    ("app.py (debug)", [sys.executable, "-c",
+                        f"from app import app; app.run(port={PORT}, debug=True, use_reloader=False)"]),
+    ("serve.py 1 proceso", [sys.executable, "serve.py", "--port", str(PORT), "--workers", "1", "--quiet"]),
+    ("serve.py 2 procesos", [sys.executable, "serve.py", "--port", str(PORT), "--workers", "2", "--quiet"]),
+    ("serve.py 4 procesos", [sys.executable, "serve.py", "--port", str(PORT), "--workers", "4", "--quiet"]),
+]
+
+# Smoothing options cycled by the clients
+OPTIONS = [("none", None), ("moving_average", 5), ("savgol", 11), ("gaussian", 9)]
+
+OUTPUTS = ["csv-base-figure.data", "csv-load-status.children", "csv-graph-shape.data", "csv-zoom-detail.data"]
+
+
+def request(connection, method, path, body=None):
+    headers = {"Content-Type": "application/json"} if isinstance(body, str) else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def wait_for_server(timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", PORT), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió")
+
+
+def upload(content):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT)
+    body = json.dumps({"name": "carga.csv", "size": len(content), "session": "bench"})
+    status, answer = request(connection, "POST", "/upload/start", body)
+    upload_id = json.loads(answer)["upload_id"]
+    offset = 0
+    while offset < len(content):
+        status, answer = request(connection, "PUT", f"/upload/{upload_id}/chunk?offset={offset}",
+                                 content[offset:offset + 1024 * 1024])
+        offset = json.loads(answer)["received"]
+    status, answer = request(connection, "POST", f"/upload/{upload_id}/finish", json.dumps({"session": "bench"}))
+    result = json.loads(answer)
+    return {"name": result["name"], "handle": result["handle"], "key": result["key"]}
+
+
+def callback_body(data, option):
+    method, window = option
+    return json.dumps({
+        "output": ".." + "...".join(OUTPUTS) + "..",
+        "outputs": [{"id": o.split(".")[0], "property": o.split(".")[1]} for o in OUTPUTS],
+        "inputs": [
+            {"id": "csv-data-store", "property": "data", "value": data},
+            {"id": "smoothing-method", "property": "value", "value": method},
+            {"id": "smoothing-window", "property": "value", "value": window},
+        ],
+        "state": [
+            {"id": "csv-graph-shape", "property": "data", "value": None},
+            {"id": "session-id", "property": "data", "value": "bench"},
+        ],
+        "changedPropIds": ["smoothing-method.value"],
+    })
+
+
+def client(bodies, offset, deadline, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT)
+    index = offset
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            status, answer = request(connection, "POST", "/_dash-update-component", bodies[index % len(bodies)])
+            if status != 200 or b"Datos cargados correctamente" not in answer:
+                errors.append(status)
+        except (OSError, http.client.HTTPException):
+            errors.append("conexión")
+            connection = http.client.HTTPConnection("127.0.0.1", PORT)
+        latencies.append(time.perf_counter() - start)
+        index += 1
+
+
+def run(command, content, duration, clients):
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = dict(os.environ, TMPDIR=state_dir, PYTHONWARNINGS="ignore")
+        server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_server()
+            data = upload(content)
+            bodies = [callback_body(data, option) for option in OPTIONS]
+            latencies, errors = [], []
+            deadline = time.monotonic() + duration
+            threads = [
+                threading.Thread(target=client, args=(bodies, i, deadline, latencies, errors))
+                for i in range(clients)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    return len(latencies) / elapsed, np.percentile(latencies, [50, 95]) * 1000, len(errors)
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 15.0
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    n_points = int(sys.argv[3]) if len(sys.argv) > 3 else 200_000
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(1200, 1700, n_points)
+    y = -60 + 30 * np.exp(-((x - 1550) / 2) ** 2) + rng.standard_normal(n_points)
+    content = ("wavelength,intensity\n" + "\n".join(f"{a:.6f},{b:.6f}" for a, b in zip(x, y)) + "\n").encode()
+
+    print(f"{clients} clientes, {duration:.0f} s por configuración, espectro de {n_points} puntos, "
+          f"{os.cpu_count()} CPU")
+    for name, command in CONFIGURATIONS:
+        throughput, (p50, p95), errors = run(command, content, duration, clients)
+        print(f"{name:22s} {throughput:7.1f} sol/s | p50 {p50:7.1f} ms | p95 {p95:7.1f} ms | errores {errors}")
+
+
+if __name__ == "__main__":
+    main()
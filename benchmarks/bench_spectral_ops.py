@@ -0,0 +1,73 @@
+"""
+Benchmark of the NumPy spectral engine against the legacy pandas pipeline.
+
+Usage:
+    python -m benchmarks.bench_spectral_ops [n_points] [repeats]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from utils.spectral_ops import process_dpt_arrays, normalize_minmax
+
+
+def legacy_process_dpt_dataframe(df):
+    # Original implementation of utils.data_processing.process_dpt_dataframe
+    df['Wavelength_nm'] = 1e7 / df['Wavelength']
+    df = df[df['Wavelength_nm'] <= 2500].copy()
+    max_intensity = df['Intensity'].max()
+    df['Absorbance'] = df['Intensity'] / max_intensity
+    df['Reflectance'] = 1 - df['Absorbance']
+    return df[['Wavelength_nm', 'Reflectance', 'Absorbance']]
+
+
+def legacy_normalize_data(df):
+    # Original implementation of utils.data_processing.normalize_data
+    df_normalized = df.copy()
+    min_intensity = df['intensity'].min()
+    max_intensity = df['intensity'].max()
+    if max_intensity > min_intensity:
+        df_normalized['intensity'] = (df['intensity'] - min_intensity) / (max_intensity - min_intensity)
+    return df_normalized
+
+
+def best_time(function, repeats):
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    wavenumber = np.linspace(12000, 3500, n_points)
+    intensity = np.random.default_rng(0).random(n_points)
+    dpt_df = pd.DataFrame({'Wavelength': wavenumber, 'Intensity': intensity})
+    csv_df = pd.DataFrame({'wavelength': 1e7 / wavenumber, 'intensity': intensity})
+
+    # Preallocated buffers, as a batch job would reuse them across spectra
+    dpt_buffer = np.empty((3, n_points))
+    norm_buffer = np.empty(n_points)
+
+    results = [
+        (
+            "process_dpt",
+            best_time(lambda: legacy_process_dpt_dataframe(dpt_df.copy()), repeats),
+            best_time(lambda: process_dpt_arrays(wavenumber, intensity, out=dpt_buffer), repeats),
+        ),
+        (
+            "normalize_minmax",
+            best_time(lambda: legacy_normalize_data(csv_df), repeats),
+            best_time(lambda: normalize_minmax(intensity, out=norm_buffer), repeats),
+        ),
+    ]
+
+    print(f"{n_points} puntos, mejor de {repeats} repeticiones")
+    for name, legacy, engine in results:
+        print(f"{name:18s} pandas {legacy * 1e6:9.1f} us | numpy {engine * 1e6:9.1f} us | {legacy / engine:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark of the bytes and serialization time of one spectrum update.
+
+Compares a figure with decimal JSON lists (as the graphs sent before) with the
+base64 float32 typed arrays used now, for a decimated view of a long sweep
+(x values sent as float32, or as grid steps for the preprocessing page) and for
+uniform grids sent as x0/dx, with and without gzip.
+
+Usage:
+    python -m benchmarks.bench_transport [n_points] [repeats]
+"""
+
+import gzip
+import sys
+import timeit
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from utils.downsampling import downsample_view
+from utils.transport import encode_array, encode_axis, COMPRESS_LEVEL
+
+
+def best_time(function, repeats):
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    rng = np.random.default_rng(0)
+    # Decimated view of a sweep 50 times longer: irregular x values on a uniform grid
+    sweep_x = np.linspace(1200, 1700, 50 * n_points)
+    sweep_y = -60 + 10 * np.exp(-(sweep_x - 1550) ** 2 / 50) + rng.standard_normal(sweep_x.shape[0])
+    x, y = downsample_view(sweep_x, sweep_y, max_points=n_points)
+    uniform_x = np.linspace(1200, 1700, x.shape[0])
+
+    cases = [
+        ("listas JSON", lambda: {"data": [{"x": x.tolist(), "y": y.tolist()}]}),
+        ("float32 base64", lambda: {"data": [{"x": encode_array(x), "y": encode_array(y)}]}),
+        ("pasos de malla", lambda: {"data": [dict(encode_axis(x, grid_steps=True), y=encode_array(y))]}),
+        ("malla uniforme", lambda: {"data": [dict(encode_axis(uniform_x), y=encode_array(y))]}),
+    ]
+    print(f"Vista de {x.shape[0]} puntos, {repeats} repeticiones")
+    for name, build in cases:
+        payload = to_json_plotly(build()).encode("utf-8")
+        # Building the figure and serializing it, as a callback answer does
+        elapsed = best_time(lambda: to_json_plotly(build()).encode("utf-8"), repeats)
+        compressed = gzip.compress(payload, compresslevel=COMPRESS_LEVEL)
+        print(
+            f"{name:15s} {len(payload) / 1024:8.1f} kB | gzip {len(compressed) / 1024:8.1f} kB | "
+            f"CPU {1000 * elapsed:7.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of loading a large CSV spectrum: whole-string parsing vs chunked upload.
+
+The string path is what the page did before: the file content is sent in a
+callback and parsed at once with ``load_csv_file``. The chunked path feeds
+1 MB chunks to the incremental parser used by the upload routes. Peak memory
+is measured with tracemalloc.
+
+Usage:
+    python -m benchmarks.bench_upload [n_points]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from utils.chunked_upload import IncrementalCSVParser, CHUNK_SIZE
+from utils.data_processing import load_csv_file
+
+
+def measure(run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(1200, 1700, n_points)
+    y = -60 + rng.standard_normal(n_points)
+    content = "wavelength,intensity\n" + "\n".join(f"{a:.6f},{b:.6f}" for a, b in zip(x, y)) + "\n"
+    data = content.encode("utf-8")
+    size_mb = len(data) / (1024 * 1024)
+
+    def string_path():
+        # Callback body with the file content, then parsing of the whole string
+        payload = json.dumps({"name": "big.csv", "content": data.decode("utf-8")})
+        load_csv_file(json.loads(payload)["content"])
+
+    def chunked_path():
+        parser = IncrementalCSVParser()
+        for offset in range(0, len(data), CHUNK_SIZE):
+            parser.feed(data[offset:offset + CHUNK_SIZE])
+        parser.finish()
+
+    print(f"CSV de {n_points} puntos ({size_mb:.1f} MB)")
+    for name, run in [("cadena completa", string_path), ("por fragmentos", chunked_path)]:
+        elapsed, peak = measure(run)
+        print(
+            f"{name:16s} {elapsed:6.2f} s | {size_mb / elapsed:6.1f} MB/s | "
+            f"memoria pico {peak / (1024 * 1024):7.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of the waterfall view on a large synthetic sweep campaign.
+
+A campaign of ``n_sweeps`` sweeps of ``n_points`` points with a drifting peak
+is written as a waterfall in a temporary directory, then views are rendered
+as the page does: the whole campaign and several zoomed windows, with the
+tile cache empty (cold) and filled (warm).
+
+Usage:
+    python -m benchmarks.bench_waterfall [n_sweeps] [n_points]
+"""
+
+import gzip
+import sys
+import tempfile
+import time
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+from components.graphs import waterfall_data
+from utils.waterfall import Waterfall, write_waterfall, tile_cache
+
+
+def campaign(n_sweeps, n_points, rng):
+    grid = np.linspace(-1, 1, n_points)
+    for index in range(n_sweeps):
+        peak = 0.5 * np.sin(index / 500)
+        yield -60 + 30 * np.exp(-((grid - peak) / 0.01) ** 2) + rng.standard_normal(n_points)
+
+
+def main():
+    n_sweeps = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 50001
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_waterfall(directory, campaign(n_sweeps, n_points, rng), n_sweeps, 1500.0, 1600.0, n_points)
+        print(f"Campaña de {n_sweeps} barridos × {n_points} puntos escrita en {time.perf_counter() - start:.1f} s")
+
+        waterfall = Waterfall(directory)
+        views = [
+            ("completa", None, None),
+            ("10 nm", (1550, 1560), None),
+            ("1000 barridos", None, (4000, 5000)),
+            ("0.1 nm × 50 barridos", (1550, 1550.1), (4000, 4050)),
+        ]
+        for cache in ("frío", "caché"):
+            if cache == "frío":
+                tile_cache.clear()
+            for name, x_range, row_range in views:
+                start = time.perf_counter()
+                view = waterfall.view(x_range, row_range)
+                payload = to_json_plotly(waterfall_data(view)).encode("utf-8")
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{cache:6s} {name:22s} nivel {view['level']} {view['z'].shape[0]:4d}×{view['z'].shape[1]:<4d} "
+                    f"{1000 * elapsed:7.1f} ms | {len(payload) / 1024:7.1f} kB | "
+                    f"gzip {len(gzip.compress(payload, 6)) / 1024:7.1f} kB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Build or update the similarity index of the reference spectrum library.
+
+Usage:
+    python build_reference_index.py <ref_dir> <index_dir> [--metric cosine|sam|correlation] [--pca N]
+    python build_reference_index.py <ref_dir> <index_dir> --query medicion.csv [--top 5]
+
+Only references that are new or modified since the last run are resampled and
+added to the index. If ``--metric`` or ``--pca`` differ from the settings of an
+existing index, the index is rebuilt (metric) or its compression refitted (PCA);
+when they are omitted the stored settings are kept.
+"""
+
+import argparse
+import os
+import time
+
+from utils.spectral_library import SpectralLibrary, LIBRARY_METRICS, METADATA_FILE
+from utils.spectrum_archive import read_spectrum_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Indexa la biblioteca de espectros de referencia.")
+    parser.add_argument("ref_dir", help="Directorio con las referencias .dpt/.csv")
+    parser.add_argument("index_dir", help="Directorio donde se guarda el índice")
+    parser.add_argument("--metric", choices=LIBRARY_METRICS, default=None,
+                        help="Métrica de similitud (por defecto la del índice existente, o cosine)")
+    parser.add_argument("--pca", type=int, default=None,
+                        help="Número de componentes PCA para comprimir el índice (0 para no comprimir)")
+    parser.add_argument("--query", help="Archivo .dpt/.csv a comparar contra la biblioteca")
+    parser.add_argument("--top", type=int, default=5, help="Número de coincidencias a mostrar")
+    return parser.parse_args()
+
+
+def compression_differs(library, n_components):
+    """
+    Check whether a library is compressed differently from what is requested.
+
+    Args:
+        library (SpectralLibrary): Loaded library
+        n_components (int): Requested number of PCA components (None to disable)
+
+    Returns:
+        bool: True if the compression must be refitted
+    """
+    stored = library.n_components if library.components is not None else None
+    if not n_components:
+        return stored is not None
+    # The stored count is capped by the number of references and grid points
+    return stored != min(n_components, len(library), library.grid.shape[0])
+
+
+def main():
+    args = parse_args()
+    n_components = args.pca or None
+
+    settings_changed = False
+    if os.path.exists(os.path.join(args.index_dir, METADATA_FILE)):
+        library = SpectralLibrary.load(args.index_dir)
+        if args.metric is not None and args.metric != library.metric:
+            # The stored vectors are prepared for the old metric, so every reference is read again
+            print(f"El índice usa la métrica '{library.metric}'; se reconstruye con '{args.metric}'.")
+            library = SpectralLibrary(
+                float(library.grid[0]), float(library.grid[-1]), library.grid.shape[0],
+                metric=args.metric, n_components=library.n_components,
+            )
+            settings_changed = True
+        if args.pca is not None:
+            if compression_differs(library, n_components):
+                print(f"Se reajusta la compresión PCA del índice ({n_components or 'sin compresión'}).")
+                settings_changed = True
+            library.n_components = n_components
+    else:
+        library = SpectralLibrary(metric=args.metric or "cosine", n_components=n_components)
+
+    start_time = time.perf_counter()
+    updated = library.update_from_directory(args.ref_dir)
+    if updated or settings_changed:
+        library.fit_compression()
+        library.save(args.index_dir)
+    print(f"{updated} referencias nuevas, modificadas o eliminadas, {len(library)} en total "
+          f"({time.perf_counter() - start_time:.2f} s)")
+
+    if args.query:
+        kind, x, y = read_spectrum_file(args.query)
+        start_time = time.perf_counter()
+        matches = library.query(x, y, kind=kind, k=args.top)[0]
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        print(f"Coincidencias para {args.query} ({elapsed_ms:.1f} ms):")
+        for name, score in matches:
+            print(f"  {name}: {score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Build the waterfall (sweeps x wavelength) of the spectra of a binary archive.
+
+Usage:
+    python build_waterfall.py <archive_dir> [--kind csv|dpt] [--float64] [--force]
+
+The sweeps are written in source order to ``<archive_dir>/waterfall/<kind>/``
+together with the coarser levels used by the waterfall page. The build is
+skipped when no spectrum was added or converted since the last one.
+"""
+
+import argparse
+import os
+import time
+
+from utils.spectrum_archive import SpectrumArchive, CATALOG_NAME
+from utils.waterfall import build_waterfall, open_waterfall
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Construye la cascada de barridos del archivo binario.")
+    parser.add_argument("archive_dir", help="Directorio del archivo binario de espectros")
+    parser.add_argument("--kind", choices=("csv", "dpt"), default="csv", help="Tipo de espectros")
+    parser.add_argument("--float64", action="store_true", help="Guardar en float64 en lugar de float32")
+    parser.add_argument("--force", action="store_true", help="Reconstruir aunque el archivo no haya cambiado")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.isfile(os.path.join(args.archive_dir, CATALOG_NAME)):
+        raise SystemExit(f"No se encontró un archivo de espectros en '{args.archive_dir}'.")
+
+    if not args.force:
+        try:
+            with SpectrumArchive(args.archive_dir) as archive:
+                entries = archive.entries(args.kind)
+            if open_waterfall(args.archive_dir, args.kind).is_current(entries):
+                print("La cascada está al día.")
+                return
+        except FileNotFoundError:
+            pass
+
+    def report(stage, done, total):
+        elapsed = time.perf_counter() - start_time
+        print(f"{stage}: {done}" + (f"/{total}" if total else "") + f" ({elapsed:.1f} s)")
+
+    start_time = time.perf_counter()
+    directory = build_waterfall(args.archive_dir, args.kind, "float64" if args.float64 else "float32", report)
+    waterfall = open_waterfall(args.archive_dir, args.kind)
+    print(f"Cascada de {waterfall.n_rows} barridos x {waterfall.n_points} puntos, "
+          f"{len(waterfall.levels)} niveles en {directory} ({time.perf_counter() - start_time:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Bulk conversion of legacy DPT/CSV datasets into the binary spectrum archive.
+
+Usage:
+    python bulk_convert.py <source_dir> <archive_dir> [--workers N] [--float32] [--force]
+
+Files are parsed in a process pool with the same rules as ``load_dpt_file`` and
+``load_csv_file``. Files already present in the archive catalog with the same
+size and modification time are skipped, so an interrupted run can simply be
+started again.
+"""
+
+import argparse
+import os
+
+from utils.batch_runner import run_in_pool, Throughput
+from utils.spectrum_archive import SpectrumArchive, convert_file, find_source_files
+
+# Catalog commits are batched to keep SQLite overhead low
+COMMIT_EVERY = 200
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convierte archivos .dpt/.csv al archivo binario de espectros.")
+    parser.add_argument("source_dir", help="Directorio con los archivos .dpt/.csv")
+    parser.add_argument("archive_dir", help="Directorio de destino del archivo binario")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Número de procesos")
+    parser.add_argument("--float32", action="store_true", help="Guardar en float32 en lugar de float64")
+    parser.add_argument("--force", action="store_true", help="Reconvertir aunque el archivo no haya cambiado")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    dtype = "float32" if args.float32 else "float64"
+
+    archive = SpectrumArchive(args.archive_dir)
+    files = find_source_files(args.source_dir)
+    pending = [f for f in files if args.force or not archive.is_current(*f)]
+    print(f"{len(files)} archivos encontrados, {len(files) - len(pending)} sin cambios, {len(pending)} por convertir")
+
+    progress = Throughput(len(pending))
+    errors = []
+
+    def on_result(item, entry):
+        archive.record(entry)
+        progress.add(item[3])
+        if progress.done % COMMIT_EVERY == 0:
+            archive.commit()
+            print(progress.report())
+
+    def on_error(item, exception):
+        errors.append((item[2], str(exception)))
+        progress.add(0)
+
+    try:
+        run_in_pool(
+            convert_file,
+            ((args.archive_dir, args.source_dir, source, size, mtime_ns, dtype) for source, size, mtime_ns in pending),
+            args.workers,
+            on_result,
+            on_error,
+        )
+    except KeyboardInterrupt:
+        print("Conversión interrumpida; el progreso se conserva y se reanudará en la próxima ejecución.")
+    finally:
+        archive.close()
+
+    print(progress.report())
+    for source, message in errors:
+        print(f"Error en {source}: {message}")
+    print(f"Conversión terminada: {progress.done - len(errors)} convertidos, {len(errors)} errores")
+
+
+if __name__ == "__main__":
+    main()
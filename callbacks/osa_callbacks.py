@@ -2,17 +2,28 @@
 This module contains callbacks for OSA connection and data acquisition.
 """
 
-from dash import Input, Output, State, callback, no_update
+from dash import Input, Output, State, ClientsideFunction, callback, clientside_callback, html, no_update
 from utils.osa_connection import AQ6370D
 import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
 import numpy as np
 import time
 import socket
 import datetime
 import os
-import pandas as pd
-from components.graphs import create_graph_component
+from components.graphs import (
+    create_spectrum_figure, create_message_figure, spectrum_trace, figure_shape, patch_spectrum_figure,
+)
+from utils.save_writer import get_save_writer, SaveQueueFull
+from utils.calibration import get_calibration_store, CalibrationUnavailable
+from utils.chemometrics import get_model, DEFAULT_MODEL_DIR
+from utils.downsampling import downsample_view, relayout_x_range
+from utils.session_store import get_session_store, HandleExpired
+from utils.shared_state import instrument_lock
+from utils.sweep_stream import OSASweepSource, get_stream_registry
+
+# Frame rate limits of the live view
+LIVE_DEFAULT_FPS = 5
+LIVE_MAX_FPS = 20
 
 @callback(
     Output("connection-test-store", "data"),
@@ -92,7 +103,7 @@ def perform_connection_test(test_params):
     Output("status-message", "children", allow_duplicate=True),
     Output("status-message", "color", allow_duplicate=True),
     Output("osa-graph", "figure"),
-    Output("loading-acquisition", "children"),
+    Output("osa-graph-shape", "data"),
     Output("save-button", "disabled"),
     Output("acquired-data-store", "data"),
     Input("acquire-button", "n_clicks"),
@@ -101,12 +112,20 @@ def perform_connection_test(test_params):
     State("wavelength-start", "value"),
     State("wavelength-end", "value"),
     State("sensitivity", "value"),
+    State("acquisition-mode", "value"),
+    State("osa-graph-shape", "data"),
+    State("acquired-data-store", "data"),
+    State("session-id", "data"),
     prevent_initial_call=True
 )
-def acquire_osa_data(n_clicks, ip_address, port, wavelength_start, wavelength_end, sensitivity):
+def acquire_osa_data(n_clicks, ip_address, port, wavelength_start, wavelength_end, sensitivity, mode="sample",
+                     shown_shape=None, previous_data=None, session_id=None):
     """
     Acquire data from the OSA device.
 
+    Sample measurements are corrected with the stored dark/reference calibration
+    when one is valid; dark and reference acquisitions update the calibration.
+
     Args:
         n_clicks (int): Number of times the button has been clicked
         ip_address (str): IP address of the OSA device
@@ -114,64 +133,82 @@ def acquire_osa_data(n_clicks, ip_address, port, wavelength_start, wavelength_en
         wavelength_start (float): Start wavelength in nm
         wavelength_end (float): End wavelength in nm
         sensitivity (str): Sensitivity setting (MID, NORMAL, HIGH1, HIGH2, HIGH3)
+        mode (str): Acquisition mode ("sample", "dark" or "reference")
+        shown_shape (list): Shape of the displayed figure, see ``figure_shape``
+        previous_data (dict): Handle of the previous acquisition, replaced in the server-side store
+        session_id (str): Browser session id
 
     Returns:
-        tuple: Status message, color, figure, loading children, save button disabled state, acquired data
+        tuple: Status message, color, figure (or partial update), figure shape, save button disabled state,
+        handle of the acquired data
     """
     if not n_clicks:
         return no_update, no_update, no_update, no_update, no_update, no_update
 
     if not ip_address:
-        return "Por favor, ingrese una dirección IP válida.", "warning", no_update, "", True, no_update
+        return "Por favor, ingrese una dirección IP válida.", "warning", no_update, no_update, True, no_update
 
     if not wavelength_start or not wavelength_end:
-        return "Por favor, complete todos los campos de configuración.", "warning", no_update, "", True, no_update
+        return "Por favor, complete todos los campos de configuración.", "warning", no_update, no_update, True, no_update
 
     try:
         # Connect to the OSA and acquire data based on the legacy code in OsaMain2.py
         port = int(port) if port else 10001
-        osa = AQ6370D(ip_address, port)
-
-        # Open connection
-        success, message = osa.open_socket()
-        if not success:
-            return f"Error al conectar con el OSA: {message}", "danger", no_update, "", True, no_update
-
-        # Send commands to configure the OSA
-        osa.send_command("open \"anonymous\"")
-        osa.send_command("*RST")
-        osa.send_command("CFORM1")
-        osa.send_command(f":sens:wav:start {wavelength_start}nm")
-        osa.send_command(f":sens:wav:stop {wavelength_end}nm")
-        osa.send_command(f":sens:sens {sensitivity}")
-        osa.send_command(":sens:sens:speed 2x")  # Default to 2x
-        osa.send_command(":sens:sweep:points:auto on")  # Default to auto
-        osa.send_command(":init:smode 1")  # Default to single
-        osa.send_command("*CLS")
-        osa.send_command(":init")
-
-        # Get the trace data
-        trace_data = osa.socket.recv(4096).decode('utf-8', errors='ignore')
-        osa.send_command(':TRACE:Y? TRA')
-
-        # Receive the trace data
-        received_data = b''
-        while True:
-            try:
-                chunk = osa.socket.recv(4096)
-                if not chunk:
+        if get_stream_registry().is_streaming(f"{ip_address}:{port}"):
+            return ("Detenga la vista en vivo antes de adquirir un espectro.", "warning",
+                    no_update, no_update, no_update, no_update)
+        # Only one request (or live view) at a time talks to the instrument,
+        # whichever worker process serves it
+        lock = instrument_lock(f"{ip_address}:{port}")
+        if not lock.acquire(blocking=False):
+            return ("El OSA está ocupado con otra adquisición. Intente de nuevo en unos segundos.", "warning",
+                    no_update, no_update, no_update, no_update)
+        try:
+            osa = AQ6370D(ip_address, port)
+
+            # Open connection
+            success, message = osa.open_socket()
+            if not success:
+                return f"Error al conectar con el OSA: {message}", "danger", no_update, no_update, True, no_update
+
+            # Send commands to configure the OSA
+            osa.send_command("open \"anonymous\"")
+            osa.send_command("*RST")
+            osa.send_command("CFORM1")
+            osa.send_command(f":sens:wav:start {wavelength_start}nm")
+            osa.send_command(f":sens:wav:stop {wavelength_end}nm")
+            osa.send_command(f":sens:sens {sensitivity}")
+            osa.send_command(":sens:sens:speed 2x")  # Default to 2x
+            osa.send_command(":sens:sweep:points:auto on")  # Default to auto
+            osa.send_command(":init:smode 1")  # Default to single
+            osa.send_command("*CLS")
+            osa.send_command(":init")
+
+            # Get the trace data
+            trace_data = osa.socket.recv(4096).decode('utf-8', errors='ignore')
+            osa.send_command(':TRACE:Y? TRA')
+
+            # Receive the trace data
+            received_data = b''
+            while True:
+                try:
+                    chunk = osa.socket.recv(4096)
+                    if not chunk:
+                        break
+                    received_data += chunk
+                    time.sleep(0.2)  # Small delay to ensure complete reception
+                except socket.timeout:
                     break
-                received_data += chunk
-                time.sleep(0.2)  # Small delay to ensure complete reception
-            except socket.timeout:
-                break
 
-        trace_data = received_data.decode('utf-8', errors='ignore')
+            trace_data = received_data.decode('utf-8', errors='ignore')
 
-        # Close the connection
-        osa.close_socket()
+            # Close the connection
+            osa.close_socket()
+        finally:
+            lock.release()
 
-        # Process the data
+        # Process the data; the OSA reports the intensities in dBm
+        in_db = True
         if 'ready' in trace_data:
             text_after_ready = trace_data.split('ready', 1)[1]
             intensities = np.array([float(numero) for numero in text_after_ready.split(",") if numero.strip()])
@@ -188,125 +225,386 @@ def acquire_osa_data(n_clicks, ip_address, port, wavelength_start, wavelength_en
             peak_position = (wavelength_start + wavelength_end) / 2
             peak_width = (wavelength_end - wavelength_start) / 20
             intensities = np.exp(-((wavelengths - peak_position) ** 2) / (2 * peak_width ** 2))
-
-        # Create the figure
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=wavelengths,
-            y=intensities,
-            mode='lines',
-            name='Espectro',
-            line=dict(color='blue', width=2)
-        ))
-        fig.update_layout(
-            title=f"Espectro adquirido ({sensitivity})",
-            xaxis_title="Longitud de onda (nm)",
-            yaxis_title="Intensidad (u.a.)",
-            template="plotly_white",
-            margin=dict(l=50, r=50, t=80, b=50),
-            height=600,
-            hovermode="closest",
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
-        )
-        # Add grid lines for better readability
-        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-
-        # Create a dictionary with the acquired data for storage
-        acquired_data = {
-            "wavelengths": wavelengths.tolist(),
-            "intensities": intensities.tolist(),
-            "metadata": {
-                "wavelength_start": wavelength_start,
-                "wavelength_end": wavelength_end,
-                "sensitivity": sensitivity,
-                "timestamp": time.time(),
-            }
+            in_db = False
+
+        # Update or apply the calibration for this instrument configuration
+        instrument = f"{ip_address}:{port}"
+        calibration = get_calibration_store()
+        corrected = None
+        calibration_info = None
+        if mode in ("dark", "reference"):
+            calibration.put(mode, instrument, sensitivity, wavelength_start, wavelength_end,
+                            wavelengths, intensities, db=in_db)
+            label = "Oscuridad" if mode == "dark" else "Referencia"
+            status_message = f"{label} adquirida y guardada como calibración para {sensitivity}."
+        else:
+            try:
+                corrected, calibration_info = calibration.correct(
+                    wavelengths, intensities, instrument, sensitivity, wavelength_start, wavelength_end,
+                    db=in_db
+                )
+                age = time.time() - calibration_info["reference_timestamp"]
+                status_message = (
+                    "Datos adquiridos y corregidos con la referencia almacenada "
+                    f"(hace {age / 60:.0f} min)."
+                )
+            except CalibrationUnavailable as e:
+                status_message = f"Datos adquiridos correctamente del OSA. Sin corrección: {e}"
+
+        # Project the measurement with the chemometric model, if one is installed
+        projection = None
+        if mode == "sample":
+            model = get_model(DEFAULT_MODEL_DIR)
+            # The model projects the same quantity it was fitted on
+            if model is not None and model.input_domain == "corrected" and corrected is None:
+                status_message += " No se proyectó con el modelo: requiere espectros corregidos y no hay calibración."
+            elif model is not None:
+                try:
+                    spectrum = corrected if model.input_domain == "corrected" else intensities
+                    values = model.project(wavelengths, spectrum)[0]
+                    names = model.target_names if model.kind == "pls" else [f"PC{i + 1}" for i in range(values.shape[0])]
+                    projection = {name: float(value) for name, value in zip(names, values)}
+                    status_message += " " + ", ".join(
+                        f"{name} = {value:.4g}" for name, value in list(projection.items())[:4]
+                    )
+                except ValueError as e:
+                    status_message += f" No se pudo proyectar con el modelo: {e}"
+
+        # Keep the arrays on the server; the browser only gets a handle and the metadata
+        acquired_at = time.time()
+        metadata = {
+            "wavelength_start": wavelength_start,
+            "wavelength_end": wavelength_end,
+            "sensitivity": sensitivity,
+            "mode": mode,
+            "timestamp": acquired_at,
         }
-
-        # Create a graph component with the figure
-        graph_component = create_graph_component(id="osa-graph", figure=fig, height="80vh")
+        if projection is not None:
+            metadata["projection"] = projection
+        arrays = {"wavelengths": wavelengths, "intensities": intensities}
+        if corrected is not None:
+            arrays["corrected"] = corrected
+            metadata["calibration"] = calibration_info
+        handle = get_session_store().put(
+            session_id, arrays, metadata, replaces=(previous_data or {}).get("handle")
+        )
+        acquired_data = {"handle": handle, "metadata": metadata}
+
+        # Create the figure; long traces are decimated for display and the
+        # zoom callback fetches the visible window at higher resolution
+        display_x, display_y = downsample_view(wavelengths, intensities, key=("osa", handle, "intensities"))
+        traces = [spectrum_trace(display_x, display_y)]
+        if corrected is not None:
+            display_x, display_y = downsample_view(wavelengths, corrected, key=("osa", handle, "corrected"))
+            traces.append(spectrum_trace(display_x, display_y, name="Corregido", color="green", yaxis="y2"))
+        title = f"Espectro adquirido ({sensitivity})"
+        shape = figure_shape(traces)
+        # A repeated acquisition only replaces the traces and the title;
+        # uirevision resets the zoom for each new measurement
+        if shape == shown_shape:
+            fig = patch_spectrum_figure(traces, title, uirevision=acquired_at)
+        else:
+            fig = create_spectrum_figure(
+                traces, title, uirevision=acquired_at,
+                yaxis2_title="Relativo a la referencia" if corrected is not None else None
+            )
 
         return (
-            "Datos adquiridos correctamente del OSA.", 
-            "success", 
+            status_message,
+            "success" if mode != "sample" or corrected is not None else "info",
             fig,  # This updates the figure in the existing graph
-            graph_component,  # Return the graph component with the figure
+            shape,
             False,  # Enable save button
             acquired_data  # Store the acquired data
         )
     except Exception as e:
-        # Create an empty figure with an error message
-        error_fig = go.Figure()
-        error_fig.add_annotation(
-            text=f"Error al adquirir datos: {str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False,
-            font=dict(size=14, color="red")
-        )
-        error_fig.update_layout(
-            xaxis_title="Longitud de onda (nm)",
-            yaxis_title="Intensidad (u.a.)",
-            template="plotly_white"
-        )
+        message = f"Error al adquirir datos: {str(e)}"
+        return message, "danger", create_message_figure(message, color="red"), None, True, no_update
+
+@callback(
+    Output("osa-graph", "figure", allow_duplicate=True),
+    Input("osa-graph", "relayoutData"),
+    State("acquired-data-store", "data"),
+    State("session-id", "data"),
+    prevent_initial_call=True
+)
+def zoom_osa_graph(relayout_data, acquired_data, session_id=None):
+    """
+    Replace the displayed traces with the visible window at higher resolution.
+
+    Args:
+        relayout_data (dict): Zoom/pan event of the graph
+        acquired_data (dict): Handle and metadata of the acquired data
+        session_id (str): Browser session id
 
-        # Create a graph component with the error figure
-        error_graph_component = create_graph_component(id="osa-graph", figure=error_fig, height="80vh")
+    Returns:
+        Patch: Partial figure update with the new trace points
+    """
+    changed, x_range = relayout_x_range(relayout_data)
+    if not changed or not acquired_data:
+        return no_update
 
-        return f"Error al adquirir datos: {str(e)}", "danger", error_fig, error_graph_component, True, no_update
+    handle = acquired_data["handle"]
+    try:
+        arrays, _ = get_session_store().get(handle, session_id)
+    except HandleExpired:
+        return no_update
+    traces = []
+    for name in ("intensities", "corrected"):
+        if name in arrays:
+            x, y = downsample_view(arrays["wavelengths"], arrays[name], x_range, key=("osa", handle, name))
+            traces.append(spectrum_trace(x, y))
+    return patch_spectrum_figure(traces)
 
 @callback(
     Output("status-message", "children", allow_duplicate=True),
     Output("status-message", "color", allow_duplicate=True),
+    Output("save-job-store", "data"),
+    Output("save-job-interval", "disabled"),
     Input("save-file-path-store", "data"),
     State("acquired-data-store", "data"),
+    State("session-id", "data"),
     prevent_initial_call=True
 )
-def save_osa_data(save_path, acquired_data):
+def save_osa_data(save_path, acquired_data, session_id=None):
     """
-    Save the acquired OSA data.
+    Queue the acquired OSA data to be saved by the background writer.
 
     Args:
         save_path (dict): Dictionary containing the save path information
-        acquired_data (dict): Dictionary containing the acquired data
+        acquired_data (dict): Handle and metadata of the acquired data
+        session_id (str): Browser session id
 
     Returns:
-        tuple: Status message and color
+        tuple: Status message, color, save job id and interval disabled state
     """
     if not save_path:
-        return no_update, no_update
+        return no_update, no_update, no_update, no_update
 
     if not acquired_data:
-        return "No hay datos para guardar. Por favor, adquiera datos primero.", "warning"
+        return "No hay datos para guardar. Por favor, adquiera datos primero.", "warning", no_update, no_update
 
     try:
-        directory = save_path["directory"]
-        filename = save_path["filename"]
+        arrays, metadata = get_session_store().get(acquired_data["handle"], session_id)
+        job_id = get_save_writer().submit(
+            save_path["directory"],
+            save_path["filename"],
+            arrays["wavelengths"],
+            arrays["intensities"],
+            settings={k: v for k, v in metadata.items() if k != "timestamp"},
+            corrected=arrays.get("corrected")
+        )
+        return "Guardando datos...", "info", job_id, False
+    except HandleExpired:
+        return (
+            "Los datos adquiridos expiraron en el servidor. Por favor, adquiera datos de nuevo.",
+            "warning", no_update, no_update
+        )
+    except SaveQueueFull as e:
+        return str(e), "warning", no_update, no_update
+    except Exception as e:
+        return f"Error al guardar datos: {str(e)}", "danger", no_update, no_update
 
-        # Add .csv extension if not present
-        if not filename.endswith(".csv"):
-            filename += ".csv"
+@callback(
+    Output("status-message", "children", allow_duplicate=True),
+    Output("status-message", "color", allow_duplicate=True),
+    Output("save-job-interval", "disabled", allow_duplicate=True),
+    Input("save-job-interval", "n_intervals"),
+    State("save-job-store", "data"),
+    prevent_initial_call=True
+)
+def poll_save_job(n_intervals, job_id):
+    """
+    Report the result of the pending save job.
 
-        # Create a DataFrame with the data
-        df = pd.DataFrame({
-            "wavelength": acquired_data["wavelengths"],
-            "intensity": acquired_data["intensities"]
-        })
+    Args:
+        n_intervals (int): Number of times the poll interval has fired
+        job_id (str): Id of the save job being tracked
 
-        # Create the directory if it doesn't exist
-        os.makedirs(directory, exist_ok=True)
+    Returns:
+        tuple: Status message, color and interval disabled state
+    """
+    if not job_id:
+        return no_update, no_update, True
+
+    job = get_save_writer().status(job_id)
+    if job is None:
+        return "No se encontró el trabajo de guardado.", "warning", True
+    if job["state"] == "done":
+        if job["deduplicated"]:
+            return (
+                f"Datos guardados correctamente como '{job['path']}' "
+                "(idénticos a un guardado previo, no se duplicaron en disco).",
+                "success",
+                True
+            )
+        return f"Datos guardados correctamente como '{job['path']}'.", "success", True
+    if job["state"] == "error":
+        return f"Error al guardar datos: {job['message']}", "danger", True
 
-        # Save the DataFrame to a CSV file
-        file_path = os.path.join(directory, filename)
-        df.to_csv(file_path, index=False)
+    return no_update, no_update, False
 
-        return f"Datos guardados correctamente como '{file_path}'.", "success"
-    except Exception as e:
-        return f"Error al guardar datos: {str(e)}", "danger"
+@callback(
+    Output("live-interval", "disabled"),
+    Output("live-interval", "interval"),
+    Output("live-toggle-button", "children"),
+    Output("live-toggle-button", "color"),
+    Output("live-collapse", "is_open"),
+    Output("live-request-store", "data"),
+    Output("live-frame-store", "data"),
+    Input("live-toggle-button", "n_clicks"),
+    State("osa-ip-address", "value"),
+    State("osa-port", "value"),
+    State("wavelength-start", "value"),
+    State("wavelength-end", "value"),
+    State("sensitivity", "value"),
+    State("live-fps", "value"),
+    prevent_initial_call=True
+)
+def toggle_live_view(n_clicks, ip_address, port, wavelength_start, wavelength_end, sensitivity, fps):
+    """
+    Start or stop the live view of the OSA sweeps.
+
+    Args:
+        n_clicks (int): Number of times the button has been clicked
+        ip_address (str): IP address of the OSA device
+        port (int): Port number for the OSA device
+        wavelength_start (float): Start wavelength in nm
+        wavelength_end (float): End wavelength in nm
+        sensitivity (str): Sensitivity setting
+        fps (float): Highest frame rate of the view
+
+    Returns:
+        tuple: Interval disabled state and period, button content and color, live graph
+        visibility, and the reset request and frame stores
+    """
+    if not n_clicks or not ip_address or not wavelength_start or not wavelength_end:
+        return (no_update,) * 7
+
+    port = int(port) if port else 10001
+    instrument = f"{ip_address}:{port}"
+    registry = get_stream_registry()
+    if registry.is_streaming(instrument):
+        registry.stop(instrument)
+        return True, no_update, [html.I(className="bi bi-play-fill me-2"), "Iniciar vista en vivo"], "info", False, None, None
+
+    fps = min(max(float(fps or LIVE_DEFAULT_FPS), 0.5), LIVE_MAX_FPS)
+    source = OSASweepSource(ip_address, port, wavelength_start, wavelength_end, sensitivity)
+    registry.start(instrument, source, max_fps=fps)
+    return (
+        False,
+        int(1000 / fps),
+        [html.I(className="bi bi-stop-fill me-2"), "Detener vista en vivo"],
+        "danger",
+        True,
+        None,
+        None,
+    )
+
+@callback(
+    Output("osa-live-graph", "figure"),
+    Output("live-frame-store", "data", allow_duplicate=True),
+    Output("live-interval", "disabled", allow_duplicate=True),
+    Output("live-toggle-button", "children", allow_duplicate=True),
+    Output("live-toggle-button", "color", allow_duplicate=True),
+    Output("live-collapse", "is_open", allow_duplicate=True),
+    Output("status-message", "children", allow_duplicate=True),
+    Output("status-message", "color", allow_duplicate=True),
+    Input("live-request-store", "data"),
+    State("live-frame-store", "data"),
+    State("osa-ip-address", "value"),
+    State("osa-port", "value"),
+    prevent_initial_call=True
+)
+def poll_live_frame(request, last_frame, ip_address, port):
+    """
+    Send the newest sweep of the live stream, if there is one the browser has not shown.
+
+    Frames produced since the previous request are skipped. The trace is
+    replaced with a partial update while the wavelength grid stays the same.
+    When the stream has ended on its own (source error, busy instrument or
+    idle timeout) the view is switched off as if the button had been pressed.
+
+    Args:
+        request (dict): Frame request from the browser ({id, after})
+        last_frame (dict): Acknowledgement of the previous request, with the displayed grid
+        ip_address (str): IP address of the OSA device
+        port (int): Port number for the OSA device
+
+    Returns:
+        tuple: Figure (or partial update), the acknowledgement of this request, the
+        interval disabled state, button content and color, live graph visibility,
+        and the status message and color
+    """
+    if not request:
+        return (no_update,) * 8
+
+    port = int(port) if port else 10001
+    stream = get_stream_registry().get(f"{ip_address}:{port}")
+    last_frame = last_frame or {}
+    ack = {
+        "request": request["id"],
+        "seq": last_frame.get("seq", 0),
+        "age": 0.0,
+        "sweep": 0.0,
+        "grid": last_frame.get("grid"),
+    }
+    if stream is None:
+        # Stopped with the button (or by another tab): the status message is left alone
+        return (no_update, dict(ack, error="La vista en vivo no está activa.")) + _live_view_ended()
+    stats = stream.stats()
+    ack["sweep"] = stats["sweep_seconds"]
+    frame = stream.latest(request.get("after", 0))
+    if frame is None:
+        if stats["error"]:
+            ack["error"] = stats["error"]
+        if not stats["running"]:
+            message = (
+                f"La vista en vivo se detuvo: {stats['error']}" if stats["error"]
+                else "La vista en vivo se detuvo por inactividad."
+            )
+            return (no_update, ack) + _live_view_ended(message)
+        return (no_update, ack) + (no_update,) * 6
+
+    wavelengths = frame["wavelengths"]
+    x, y = downsample_view(wavelengths, frame["intensities"])
+    ack["seq"] = frame["seq"]
+    ack["age"] = time.time() - frame["timestamp"]
+    ack["grid"] = [float(wavelengths[0]), float(wavelengths[-1]), int(wavelengths.shape[0])]
+
+    traces = [spectrum_trace(x, y, name="En vivo")]
+    if ack["grid"] == last_frame.get("grid"):
+        # Same grid as the displayed frame: only the intensities change
+        figure = patch_spectrum_figure(traces, update_x=x.shape[0] != wavelengths.shape[0])
+    else:
+        figure = create_spectrum_figure(traces, "Vista en vivo", uirevision="live", height=450)
+    return (figure, ack) + (no_update,) * 6
+
+def _live_view_ended(message=None):
+    """
+    Controls of a live view whose stream is no longer running.
+
+    Args:
+        message (str): Reason shown in the status message, None to keep the current one
+
+    Returns:
+        tuple: Interval disabled state, button content and color, live graph
+        visibility, and the status message and color
+    """
+    status = (no_update, no_update) if message is None else (message, "warning")
+    return (True, [html.I(className="bi bi-play-fill me-2"), "Iniciar vista en vivo"], "info", False) + status
+
+clientside_callback(
+    ClientsideFunction(namespace="live_view", function_name="tick"),
+    Output("live-request-store", "data", allow_duplicate=True),
+    Input("live-interval", "n_intervals"),
+    State("live-frame-store", "data"),
+    State("live-request-store", "data"),
+    prevent_initial_call=True
+)
+
+clientside_callback(
+    ClientsideFunction(namespace="live_view", function_name="counters"),
+    Output("live-counters", "children"),
+    Input("live-frame-store", "data")
+)
@@ -2,7 +2,7 @@
 This module contains callbacks for updating UI elements in the application.
 """
 
-from dash import Input, Output, State, callback
+from dash import Input, Output, State, callback, clientside_callback
 
 @callback(
     Output("sidebar", "className"),
@@ -31,4 +31,22 @@ def toggle_sidebar(n_clicks, sidebar_state):
         return sidebar_class, content_class, icon_class, {"collapsed": collapsed}
 
     # Default state (not collapsed)
-    return "sidebar", "content", "bi bi-chevron-left", sidebar_state
\ No newline at end of file
+    return "sidebar", "content", "bi bi-chevron-left", sidebar_state
+
+# Give each browser tab a random session id for the server-side data store.
+# crypto.getRandomValues also works on plain http (randomUUID does not).
+clientside_callback(
+    """
+    function(_, current) {
+        if (current) {
+            return current;
+        }
+        const bytes = new Uint8Array(16);
+        window.crypto.getRandomValues(bytes);
+        return Array.from(bytes, b => b.toString(16).padStart(2, "0")).join("");
+    }
+    """,
+    Output("session-id", "data"),
+    Input("session-id", "id"),
+    State("session-id", "data"),
+)
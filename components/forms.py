@@ -127,3 +127,25 @@ def create_form_card(title, children, id=None):
         ],
         **kwargs
     )
+
+def create_upload_progress(id):
+    """
+    Create a progress bar for a file upload, hidden until the upload starts.
+
+    The bar is shown and updated from the browser while the file is sent
+    (see assets/chunked_upload.js).
+
+    Args:
+        id (str): ID of the progress bar
+
+    Returns:
+        dbc.Progress: Hidden progress bar
+    """
+    return dbc.Progress(
+        id=id,
+        value=0,
+        striped=True,
+        animated=True,
+        className="mb-3",
+        style={"display": "none"}
+    )
@@ -3,9 +3,212 @@ Graph components for the OSA Remote Control application.
 """
 
 import plotly.express as px
-from dash import dcc, html
+import plotly.io as pio
+from dash import dcc, html, Patch
 import dash_bootstrap_components as dbc
 
+from utils.transport import encode_array, encode_axis
+
+# Axis titles shared by the spectrum graphs
+WAVELENGTH_TITLE = "Longitud de onda (nm)"
+WAVENUMBER_TITLE = "Número de onda (cm⁻¹)"
+INTENSITY_TITLE = "Intensidad (u.a.)"
+
+
+def _build_spectrum_template():
+    """
+    Build the compact figure template shared by the spectrum graphs.
+
+    Only the parts of ``plotly_white`` used by line plots are kept, so the
+    template adds a few hundred bytes to each figure instead of several kB.
+
+    Returns:
+        dict: Plotly template
+    """
+    base = pio.templates["plotly_white"].layout
+    axis = dict(
+        base.xaxis.to_plotly_json(),
+        showgrid=True,
+        gridwidth=1,
+        gridcolor="lightgray",
+    )
+    return {
+        "layout": {
+            "font": base.font.to_plotly_json(),
+            "paper_bgcolor": base.paper_bgcolor,
+            "plot_bgcolor": base.plot_bgcolor,
+            "colorway": list(base.colorway),
+            "hoverlabel": base.hoverlabel.to_plotly_json(),
+            "hovermode": "closest",
+            "margin": {"l": 50, "r": 50, "t": 80, "b": 50},
+            "legend": {"orientation": "h", "yanchor": "bottom", "y": 1.02, "xanchor": "right", "x": 1},
+            "xaxis": axis,
+            "yaxis": dict(axis),
+        }
+    }
+
+
+# Built once at import and referenced by every spectrum figure
+SPECTRUM_TEMPLATE = _build_spectrum_template()
+
+
+def spectrum_trace(x, y, name="Espectro", color="blue", yaxis=None, width=2, webgl=False, grid_steps=False):
+    """
+    Create a line trace for a spectrum.
+
+    The arrays are sent as base64 float32 typed arrays, and evenly spaced x
+    values as ``x0``/``dx`` (see ``utils.transport``).
+
+    Args:
+        x (array-like): Wavelength values
+        y (array-like): Intensity values
+        name (str): Legend name of the trace
+        color (str): Line color
+        yaxis (str): Secondary axis id (e.g. "y2"), or None for the main axis
+        width (float): Line width in pixels
+        webgl (bool): Draw with WebGL (``scattergl``), for figures with many traces
+        grid_steps (bool): Send decimated x values as grid steps, for traces drawn
+            through ``assets/spectral_transforms.js`` only
+
+    Returns:
+        dict: Plotly trace
+    """
+    trace = {"type": "scattergl" if webgl else "scatter", "mode": "lines", "name": name,
+             "y": encode_array(y), "line": {"color": color, "width": width}}
+    trace.update(encode_axis(x, grid_steps=grid_steps))
+    if yaxis:
+        trace["yaxis"] = yaxis
+    return trace
+
+
+def waterfall_trace(view, colorbar_title="Intensidad"):
+    """
+    Create a heatmap trace for a binned waterfall view.
+
+    Args:
+        view (dict): View with ``z`` and the ``x0``/``dx``/``y0``/``dy`` of its cells
+            (see ``utils.waterfall``)
+        colorbar_title (str): Title of the color bar
+
+    Returns:
+        dict: Plotly trace
+    """
+    trace = {"type": "heatmap", "colorscale": "Viridis", "zsmooth": False, "hoverongaps": False,
+             "colorbar": {"title": {"text": colorbar_title}}}
+    trace.update(waterfall_data(view))
+    return trace
+
+
+def waterfall_data(view):
+    """
+    Trace properties that change between waterfall views, for full figures and patches.
+
+    Args:
+        view (dict): View with ``z`` and the ``x0``/``dx``/``y0``/``dy`` of its cells
+
+    Returns:
+        dict: ``z``, ``x0``, ``dx``, ``y0`` and ``dy`` trace properties
+    """
+    data = {key: float(view[key]) for key in ("x0", "dx", "y0", "dy")}
+    data["z"] = encode_array(view["z"])
+    return data
+
+
+def create_spectrum_figure(traces, title, uirevision=None, yaxis2_title=None, height=600):
+    """
+    Create a spectrum figure using the shared template.
+
+    The figure is a plain dictionary, which avoids the validation cost of
+    ``go.Figure`` for long traces.
+
+    Args:
+        traces (list): Traces created with ``spectrum_trace``
+        title (str): Figure title
+        uirevision: Value that keeps the user's zoom while it does not change
+        yaxis2_title (str): Title of a secondary y axis on the right, if any
+        height (int): Figure height in pixels
+
+    Returns:
+        dict: Plotly figure
+    """
+    layout = {
+        "template": SPECTRUM_TEMPLATE,
+        "title": {"text": title},
+        "xaxis": {"title": {"text": WAVELENGTH_TITLE}},
+        "yaxis": {"title": {"text": INTENSITY_TITLE}},
+        "height": height,
+    }
+    if uirevision is not None:
+        layout["uirevision"] = uirevision
+    if yaxis2_title:
+        layout["yaxis2"] = {"title": {"text": yaxis2_title}, "overlaying": "y", "side": "right", "showgrid": False}
+    return {"data": traces, "layout": layout}
+
+
+def create_message_figure(message, color=None):
+    """
+    Create an empty spectrum figure that shows a message.
+
+    Args:
+        message (str): Message to display
+        color (str): Text color of the message (e.g. "red" for errors); without it
+            the message is used as the figure title
+
+    Returns:
+        dict: Plotly figure
+    """
+    if color is None:
+        return create_spectrum_figure([], message)
+    figure = create_spectrum_figure([], "")
+    figure["layout"]["annotations"] = [{
+        "text": message, "xref": "paper", "yref": "paper", "x": 0.5, "y": 0.5,
+        "showarrow": False, "font": {"size": 14, "color": color},
+    }]
+    return figure
+
+
+def figure_shape(traces):
+    """
+    Describe the structure of a spectrum figure for ``patch_spectrum_figure``.
+
+    Args:
+        traces (list): Traces of the figure
+
+    Returns:
+        list: Trace names and axes; two figures with the same shape differ only in data and title
+    """
+    return [[trace["name"], trace.get("yaxis", "y")] for trace in traces]
+
+
+def patch_spectrum_figure(traces, title=None, uirevision=None, update_x=True):
+    """
+    Partially update a displayed spectrum figure with the same shape.
+
+    Only the trace arrays (and optionally the title and ``uirevision``) are sent
+    to the browser; the layout and template stay as they are.
+
+    Args:
+        traces (list): Traces created with ``spectrum_trace``, in display order
+        title (str): New title, or None to keep it
+        uirevision: New ``uirevision``, or None to keep it
+        update_x (bool): Whether the x arrays changed
+
+    Returns:
+        Patch: Partial figure update
+    """
+    patched = Patch()
+    for index, trace in enumerate(traces):
+        if update_x:
+            for key in ("x", "x0", "dx"):
+                if key in trace:
+                    patched["data"][index][key] = trace[key]
+        patched["data"][index]["y"] = trace["y"]
+    if title is not None:
+        patched["layout"]["title"]["text"] = title
+    if uirevision is not None:
+        patched["layout"]["uirevision"] = uirevision
+    return patched
+
 def create_graph_component(id="graph", figure=None, height="80vh", title=None):
     """
     Create a graph component with optional title.
@@ -0,0 +1,105 @@
+"""
+Fit PCA or PLS models over a binary spectrum archive, chunk by chunk.
+
+Usage:
+    python fit_chemometrics.py <archive_dir> <model_dir> --method pca --components 10 --preprocessing snv
+    python fit_chemometrics.py <archive_dir> <model_dir> --method pls --targets valores.csv --components 5
+    python fit_chemometrics.py <archive_dir> <model_dir> --project medicion.csv
+
+The archive is created with bulk_convert.py or batch_process.py. The targets
+file for PLS is a CSV whose first column is the source path inside the archive
+and whose other columns are the values to predict.
+"""
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from utils.chemometrics import (
+    IncrementalPCA, IncrementalPLS, INPUT_DOMAINS, PREPROCESSING_METHODS, DEFAULT_CHUNK_SIZE,
+    fit_pca_archive, fit_pls_archive, load_model,
+)
+from utils.spectrum_archive import SpectrumArchive, read_spectrum_file
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ajusta modelos PCA/PLS sobre un archivo de espectros.")
+    parser.add_argument("archive_dir", help="Archivo binario de espectros")
+    parser.add_argument("model_dir", help="Directorio donde se guarda el modelo")
+    parser.add_argument("--method", choices=("pca", "pls"), default="pca", help="Tipo de modelo")
+    parser.add_argument("--components", type=int, default=10, help="Número de componentes")
+    parser.add_argument("--preprocessing", choices=PREPROCESSING_METHODS, default="snv", help="Preprocesamiento")
+    parser.add_argument(
+        "--input-domain", choices=INPUT_DOMAINS, default="raw",
+        help="Magnitud de los espectros del archivo: raw (intensidad medida) o corrected (cociente calibrado)"
+    )
+    parser.add_argument("--targets", help="CSV con los valores de referencia (solo PLS)")
+    parser.add_argument("--start", type=float, default=900.0, help="Inicio de la malla en nm")
+    parser.add_argument("--stop", type=float, default=2500.0, help="Fin de la malla en nm")
+    parser.add_argument("--points", type=int, default=1601, help="Puntos de la malla")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK_SIZE, help="Espectros leídos por bloque")
+    parser.add_argument("--project", help="Archivo .dpt/.csv a proyectar con un modelo existente")
+    return parser.parse_args()
+
+
+def read_targets(path):
+    """
+    Read PLS target values from a CSV file.
+
+    Args:
+        path (str): CSV path with a header row
+
+    Returns:
+        tuple: Target names and a dict of values by source path
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        targets = {row[0]: [float(v) for v in row[1:]] for row in reader if row}
+    return header[1:], targets
+
+
+def main():
+    args = parse_args()
+
+    if args.project:
+        model = load_model(args.model_dir)
+        kind, x, y = read_spectrum_file(args.project)
+        values = model.project(x, y, kind)[0]
+        names = model.target_names if model.kind == "pls" else [f"PC{i + 1}" for i in range(values.shape[0])]
+        for name, value in zip(names, values):
+            print(f"{name}: {value:.6g}")
+        return
+
+    start_time = time.perf_counter()
+    with SpectrumArchive(args.archive_dir) as archive:
+        if args.method == "pca":
+            model = IncrementalPCA(args.components, args.start, args.stop, args.points, args.preprocessing,
+                                   args.input_domain)
+            skipped = fit_pca_archive(archive, model, args.chunk)
+        else:
+            if not args.targets:
+                raise SystemExit("PLS necesita --targets con los valores de referencia.")
+            names, targets = read_targets(args.targets)
+            model = IncrementalPLS(args.components, args.start, args.stop, args.points, args.preprocessing, names,
+                                   args.input_domain)
+            skipped = fit_pls_archive(archive, model, targets, args.chunk)
+    elapsed = time.perf_counter() - start_time
+
+    if model.n_samples_seen == 0:
+        raise SystemExit("Ningún espectro cubre la malla seleccionada.")
+    model.save(args.model_dir)
+    print(f"Modelo {args.method.upper()} ajustado con {model.n_samples_seen} espectros en {elapsed:.1f} s "
+          f"({skipped} omitidos por no cubrir la malla)")
+    if args.method == "pca":
+        ratios = np.cumsum(model.explained_variance_ratio)
+        for i, ratio in enumerate(model.explained_variance_ratio):
+            print(f"PC{i + 1}: {100 * ratio:6.2f} % (acumulado {100 * ratios[i]:6.2f} %)")
+    print(f"Modelo guardado en {os.path.abspath(args.model_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for serving the application with several worker processes.
+
+Usage (gunicorn is not a dependency of the project; install it on the server):
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py app:server
+
+The settings can be changed with the OSA_BIND and OSA_WORKERS environment
+variables. ``serve.py`` offers the same mode without gunicorn.
+"""
+
+import os
+
+bind = os.environ.get("OSA_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("OSA_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Threads let a worker keep serving polls while another request waits for a sweep
+worker_class = "gthread"
+threads = 8
+
+# A single OSA sweep can take up to a minute (see utils/sweep_stream.py)
+timeout = 120
+graceful_timeout = 30
+
+# Load the application once, before forking the workers
+preload_app = True
+
+# The stores share their state between the workers (see utils/shared_state.py)
+raw_env = ["OSA_MULTI_WORKER=1"]
+
+accesslog = "-"
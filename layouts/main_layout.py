@@ -101,6 +101,9 @@ def create_layout():
             # Store for sidebar state
             dcc.Store(id="sidebar-state", data={"collapsed": False}),
 
+            # Id of the browser session, used to key the server-side data store
+            dcc.Store(id="session-id", storage_type="session"),
+
             # Sidebar
             sidebar,
 
@@ -13,7 +13,10 @@ from components.graphs import create_graph_component
 from components.alerts import create_info_alert
 
 # Import callbacks (this ensures they are registered)
-from callbacks.osa_callbacks import start_connection_test, perform_connection_test, acquire_osa_data, save_osa_data
+from callbacks.osa_callbacks import (
+    start_connection_test, perform_connection_test, acquire_osa_data, zoom_osa_graph, save_osa_data, poll_save_job,
+    toggle_live_view, poll_live_frame,
+)
 
 # Add new callbacks for the save modal
 @callback(
@@ -173,6 +176,20 @@ layout = dash.html.Div([
                             width=12
                         )
                     ]),
+                    dash.html.Br(),
+                    dbc.Row([
+                        create_dropdown_field(
+                            id="acquisition-mode",
+                            label="Tipo de adquisición",
+                            options=[
+                                {"label": "Muestra (corregida con la calibración)", "value": "sample"},
+                                {"label": "Referencia", "value": "reference"},
+                                {"label": "Oscuridad", "value": "dark"},
+                            ],
+                            value="sample",
+                            width=12
+                        )
+                    ]),
 
 
                     dash.html.Br(),
@@ -185,6 +202,27 @@ layout = dash.html.Div([
 
             dash.html.Br(),
 
+            # Continuous monitoring with the current configuration
+            create_form_card(
+                title="Vista en vivo",
+                children=[
+                    dbc.Row([
+                        create_input_field(
+                            id="live-fps",
+                            label="Cuadros por segundo (máx.)",
+                            value=5,
+                            type="number",
+                            width=6
+                        )
+                    ]),
+                    dash.html.Br(),
+                    create_button("Iniciar vista en vivo", id="live-toggle-button", color="info", icon="play-fill"),
+                    dash.html.Div(id="live-counters", className="small text-muted mt-2")
+                ]
+            ),
+
+            dash.html.Br(),
+
             # Status and messages
             create_info_alert(
                 "Esperando acción...",
@@ -203,18 +241,36 @@ layout = dash.html.Div([
                     create_graph_component(id="osa-graph", height="80vh")
                 ]
             ),
+            # Live view, fed by a background sweep stream
+            dbc.Collapse(
+                create_graph_component(id="osa-live-graph", height="50vh"),
+                id="live-collapse",
+                is_open=False
+            ),
         ], width=8),
     ]),
 
     # Store for holding acquired data
     dcc.Store(id="acquired-data-store"),
 
+    # Shape of the displayed figure, so repeated acquisitions can patch it
+    dcc.Store(id="osa-graph-shape"),
+
+    # Live view: last frame request, acknowledgement of the shown frame and pacing interval
+    dcc.Store(id="live-request-store"),
+    dcc.Store(id="live-frame-store"),
+    dcc.Interval(id="live-interval", interval=200, disabled=True),
+
     # Store for connection test state
     dcc.Store(id="connection-test-store"),
 
     # Store for save file path
     dcc.Store(id="save-file-path-store"),
 
+    # Store and poll interval for the background save job
+    dcc.Store(id="save-job-store"),
+    dcc.Interval(id="save-job-interval", interval=500, disabled=True),
+
     # Hidden div for folder picker setup
     html.Div(id="folder-picker-setup", style={"display": "none"}),
 
@@ -0,0 +1,258 @@
+import dash
+from dash import html, dcc, callback, ctx, Input, Output, State, no_update, Patch
+import dash_bootstrap_components as dbc
+
+# Import reusable components
+from components.alerts import create_info_alert, create_warning_alert, create_error_alert
+from components.buttons import create_primary_button
+from components.forms import create_form_card, create_dropdown_field, create_input_field
+from components.graphs import (
+    create_graph_component, create_spectrum_figure, create_message_figure, waterfall_trace, waterfall_data,
+    WAVELENGTH_TITLE, WAVENUMBER_TITLE,
+)
+from utils.downsampling import relayout_axis_range
+from utils.overlay import list_archive_spectra
+from utils.sweep_stream import get_stream_registry
+from utils.waterfall import open_waterfall, matrix_view
+
+# Register the page
+dash.register_page(__name__, path='/cascada-barridos', name='Cascada de barridos', order=4, icon='grid-3x3')
+
+# X axis title by archive kind
+AXIS_TITLES = {"csv": WAVELENGTH_TITLE, "dpt": WAVENUMBER_TITLE}
+
+# Layout for the waterfall page
+layout = html.Div([
+    dbc.Row([
+        dbc.Col([
+            html.H2("Cascada de barridos"),
+            html.Hr(),
+            html.P("Esta página muestra series largas de barridos como un mapa de calor (barrido × longitud de onda)."),
+
+            create_form_card(
+                title="Origen de los barridos",
+                children=[
+                    dbc.RadioItems(
+                        id="waterfall-source",
+                        options=[
+                            {"label": "Archivo binario", "value": "archive"},
+                            {"label": "Vista en vivo", "value": "live"},
+                        ],
+                        value="archive",
+                        inline=True,
+                        className="mb-3"
+                    ),
+                    dbc.Row([
+                        create_input_field(
+                            id="waterfall-archive-dir",
+                            label="Archivo binario",
+                            value="./archivo_espectros",
+                            width=8
+                        ),
+                        create_dropdown_field(
+                            id="waterfall-kind",
+                            label="Tipo",
+                            options=[
+                                {"label": "CSV (nm)", "value": "csv"},
+                                {"label": "DPT (cm⁻¹)", "value": "dpt"},
+                            ],
+                            value="csv",
+                            width=4
+                        ),
+                    ], className="mb-3"),
+                    dbc.Row([
+                        create_input_field(
+                            id="waterfall-ip",
+                            label="Dirección IP del OSA (vista en vivo)",
+                            value="168.176.118.22",
+                            width=8
+                        ),
+                        create_input_field(
+                            id="waterfall-port",
+                            label="Puerto",
+                            value=10001,
+                            type="number",
+                            width=4
+                        ),
+                    ], className="mb-3"),
+                    create_primary_button(
+                        "Mostrar",
+                        id="waterfall-open-button",
+                        icon="grid-3x3",
+                        className="w-100 mb-3"
+                    ),
+                    html.Div(id="waterfall-status"),
+                    html.Div(id="waterfall-info", className="text-muted small"),
+                ]
+            ),
+        ], width=4),
+
+        dbc.Col([
+            create_graph_component(
+                id="waterfall-graph",
+                figure=create_message_figure("Seleccione el origen de los barridos"),
+                height="80vh"
+            ),
+        ], width=8),
+    ]),
+
+    # Source shown ({"type": "archive", "root", "kind"} or {"type": "live", "instrument"})
+    dcc.Store(id="waterfall-source-data"),
+    # Visible wavelength and sweep ranges (None for the whole axis)
+    dcc.Store(id="waterfall-view"),
+    # Refresh of the live waterfall
+    dcc.Interval(id="waterfall-interval", interval=1000, disabled=True),
+])
+
+
+@callback(
+    Output("waterfall-source-data", "data"),
+    Output("waterfall-status", "children"),
+    Output("waterfall-interval", "disabled"),
+    Input("waterfall-open-button", "n_clicks"),
+    State("waterfall-source", "value"),
+    State("waterfall-archive-dir", "value"),
+    State("waterfall-kind", "value"),
+    State("waterfall-ip", "value"),
+    State("waterfall-port", "value"),
+    prevent_initial_call=True
+)
+def open_waterfall_source(n_clicks, source, root, kind, ip, port):
+    """
+    Check the selected source of sweeps and select it for display.
+
+    Args:
+        n_clicks (int): Number of button clicks
+        source (str): "archive" or "live"
+        root (str): Archive directory
+        kind (str): Kind of archive spectra
+        ip (str): OSA address of the live view
+        port (int): OSA port of the live view
+
+    Returns:
+        tuple: Selected source, status message and whether the refresh interval is disabled
+    """
+    if source == "live":
+        instrument = f"{ip}:{port}"
+        if not get_stream_registry().is_streaming(instrument):
+            return None, create_warning_alert(
+                f"No hay una vista en vivo activa para {instrument}. Iníciela en la página de adquisición."
+            ), True
+        return {"type": "live", "instrument": instrument}, create_info_alert(f"Barridos en vivo de {instrument}"), False
+
+    try:
+        entries = list_archive_spectra(root, kind)
+        waterfall = open_waterfall(root, kind)
+    except Exception as e:
+        return None, create_error_alert(str(e)), True
+    message = f"{waterfall.n_rows} barridos × {waterfall.n_points} puntos"
+    if not waterfall.is_current(entries):
+        return {"type": "archive", "root": root, "kind": kind}, create_warning_alert(
+            f"{message}. El archivo cambió desde que se construyó la cascada; "
+            f"ejecute python build_waterfall.py {root} --kind {kind}"
+        ), True
+    return {"type": "archive", "root": root, "kind": kind}, create_info_alert(message), True
+
+
+def waterfall_view(source, x_range, row_range):
+    """
+    Binned view of the selected source for the visible ranges.
+
+    Args:
+        source (dict): Selected source
+        x_range (tuple): Visible wavelength range, or None
+        row_range (tuple): Visible sweep range, or None
+
+    Returns:
+        dict: View (see ``utils.waterfall``) with a description in "info"
+
+    Raises:
+        LookupError: If the live view stopped
+    """
+    if source["type"] == "live":
+        stream = get_stream_registry().get(source["instrument"])
+        history = stream.history() if stream is not None and stream.running else None
+        if history is None:
+            raise LookupError("La vista en vivo se detuvo o aún no tiene barridos.")
+        seqs, wavelengths, matrix = history
+        dx = (wavelengths[-1] - wavelengths[0]) / max(wavelengths.shape[0] - 1, 1)
+        view = matrix_view(matrix, wavelengths[0], dx, x_range, row_range, row0=seqs[0])
+        view["info"] = f"{matrix.shape[0]} barridos recientes × {matrix.shape[1]} puntos"
+        return view
+
+    waterfall = open_waterfall(source["root"], source["kind"])
+    view = waterfall.view(x_range, row_range)
+    view["info"] = (
+        f"{waterfall.n_rows} barridos × {waterfall.n_points} puntos; "
+        f"nivel {view['level']}, cada celda agrupa {view['dy']:.0f} barridos × "
+        f"{round(view['dx'] / waterfall.dx)} puntos"
+    )
+    return view
+
+
+@callback(
+    Output("waterfall-graph", "figure"),
+    Output("waterfall-view", "data"),
+    Output("waterfall-info", "children"),
+    Output("waterfall-interval", "disabled", allow_duplicate=True),
+    Input("waterfall-source-data", "data"),
+    Input("waterfall-graph", "relayoutData"),
+    Input("waterfall-interval", "n_intervals"),
+    State("waterfall-view", "data"),
+    prevent_initial_call=True
+)
+def render_waterfall(source, relayout_data, n_intervals, view_ranges):
+    """
+    Render the waterfall for the visible ranges.
+
+    A new source, or the first render after an error, gets a full figure;
+    zooming, panning and live refreshes only replace the binned cells of the
+    heatmap. An error stops the live refresh.
+
+    Args:
+        source (dict): Selected source
+        relayout_data (dict): Last zoom event of the graph
+        n_intervals (int): Live refresh ticks
+        view_ranges (dict): Visible ranges so far
+
+    Returns:
+        tuple: Figure (or partial update), visible ranges, information text and
+        live refresh disabled state
+    """
+    if not source:
+        return create_message_figure("Seleccione el origen de los barridos"), None, "", no_update
+
+    # Without visible ranges the graph holds a message figure (no heatmap to patch)
+    full_figure = ctx.triggered_id == "waterfall-source-data" or not view_ranges
+    ranges = {"x": None, "rows": None} if full_figure else dict(view_ranges)
+    if ctx.triggered_id == "waterfall-graph":
+        x_changed, x_range = relayout_axis_range(relayout_data, "xaxis")
+        rows_changed, row_range = relayout_axis_range(relayout_data, "yaxis")
+        if not x_changed and not rows_changed:
+            return no_update, no_update, no_update, no_update
+        if x_changed:
+            ranges["x"] = x_range
+        if rows_changed:
+            ranges["rows"] = row_range
+
+    try:
+        view = waterfall_view(source, ranges["x"], ranges["rows"])
+    except Exception as e:
+        message = f"Error al mostrar la cascada: {str(e)}"
+        return create_message_figure(message, color="red"), None, message, True if source["type"] == "live" else no_update
+
+    if not full_figure:
+        patched = Patch()
+        for key, value in waterfall_data(view).items():
+            patched["data"][0][key] = value
+        return patched, ranges, view["info"], no_update
+
+    if source["type"] == "live":
+        title, uirevision, x_title = f"Barridos en vivo de {source['instrument']}", f"live|{source['instrument']}", WAVELENGTH_TITLE
+    else:
+        title, uirevision = f"Cascada de {source['root']}", f"{source['root']}|{source['kind']}"
+        x_title = AXIS_TITLES.get(source["kind"], "X")
+    figure = create_spectrum_figure([waterfall_trace(view)], title, uirevision=uirevision, height=750)
+    figure["layout"]["xaxis"]["title"]["text"] = x_title
+    figure["layout"]["yaxis"]["title"]["text"] = "Barrido (n.º)"
+    return figure, ranges, view["info"], no_update
@@ -28,6 +28,14 @@ layout = dash.html.Div([
                         dash.html.Strong("Pre Procesamiento y visualización: "),
                         "Visualice y procese los datos adquiridos previamente."
                     ]),
+                    dash.html.Li([
+                        dash.html.Strong("Superposición de espectros: "),
+                        "Compare decenas o cientos de espectros del archivo binario en un mismo gráfico."
+                    ]),
+                    dash.html.Li([
+                        dash.html.Strong("Cascada de barridos: "),
+                        "Explore series largas de barridos como mapa de calor, desde el archivo binario o la vista en vivo."
+                    ]),
                 ]),
             ]),
             dash.html.Br(),
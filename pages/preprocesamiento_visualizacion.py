@@ -1,15 +1,23 @@
 import dash
-from dash import html, dcc, callback, Input, Output, State, clientside_callback
+from dash import html, dcc, callback, ctx, Input, Output, State, ClientsideFunction, clientside_callback, no_update
 import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
 import pandas as pd
 import json
+import numpy as np
 
 # Import reusable components
 from components.alerts import create_info_alert, create_error_alert
 from components.buttons import create_primary_button, create_success_button, create_button
-from components.forms import create_form_card
-from components.graphs import create_graph_component
+from components.forms import (
+    create_form_card, create_dropdown_field, create_input_field, create_range_input, create_upload_progress,
+)
+from components.graphs import (
+    create_graph_component, create_spectrum_figure, create_message_figure,
+    spectrum_trace, figure_shape, patch_spectrum_figure,
+)
+from utils.processing_cache import processed_spectrum
+from utils.session_store import get_session_store, HandleExpired
+from utils.downsampling import downsample_view, relayout_x_range, MIN_DECIMATION_POINTS
 
 # Register the page
 dash.register_page(__name__, path='/preprocesamiento-visualizacion', name='Pre Procesamiento y visualización', order=2, icon='graph-up')
@@ -36,9 +44,63 @@ layout = html.Div([
                                 className="w-100 mb-3"
                             ),
 
+                            # Upload progress, shown while a file is sent (assets/chunked_upload.js)
+                            create_upload_progress("csv-upload-progress"),
+
                             # Display selected file name
                             html.Div(id="selected-file-info", className="mb-3"),
 
+                            # Smoothing options
+                            dbc.Row([
+                                create_dropdown_field(
+                                    id="smoothing-method",
+                                    label="Suavizado",
+                                    options=[
+                                        {"label": "Ninguno", "value": "none"},
+                                        {"label": "Savitzky-Golay", "value": "savgol"},
+                                        {"label": "Media móvil", "value": "moving_average"},
+                                        {"label": "Gaussiano", "value": "gaussian"},
+                                    ],
+                                    value="none",
+                                    width=7
+                                ),
+                                create_input_field(
+                                    id="smoothing-window",
+                                    label="Ventana (puntos)",
+                                    value=11,
+                                    type="number",
+                                    width=5
+                                )
+                            ], className="mb-3"),
+
+                            # View transforms, applied in the browser (assets/spectral_transforms.js)
+                            dbc.Row([
+                                create_dropdown_field(
+                                    id="y-scale",
+                                    label="Escala de intensidad",
+                                    options=[
+                                        {"label": "Original", "value": "original"},
+                                        {"label": "dB → lineal", "value": "db_to_linear"},
+                                        {"label": "Lineal → dB", "value": "linear_to_db"},
+                                    ],
+                                    value="original",
+                                    width=7
+                                ),
+                                create_dropdown_field(
+                                    id="x-unit",
+                                    label="Eje X",
+                                    options=[
+                                        {"label": "nm", "value": "nm"},
+                                        {"label": "cm⁻¹", "value": "cm-1"},
+                                    ],
+                                    value="nm",
+                                    width=5
+                                )
+                            ], className="mb-3"),
+                            dbc.Row([
+                                create_range_input("crop", "Recorte (unidades del eje X)")
+                            ], className="mb-3"),
+
                             # Normalization option
                             dbc.Checkbox(
                                 id="normalize-data-checkbox",
@@ -73,8 +135,15 @@ layout = html.Div([
         ], width=8),
     ]),
 
-    # Store for holding loaded CSV data
+    # Handle of the loaded spectrum in the server-side store
     dcc.Store(id="csv-data-store"),
+    # Figure of the processed spectrum as sent by the server; the displayed
+    # figure is derived from it in the browser
+    dcc.Store(id="csv-base-figure"),
+    # Visible window at higher resolution, spliced into the base figure in the browser
+    dcc.Store(id="csv-zoom-detail"),
+    # Shape of the base figure, so option changes can patch it
+    dcc.Store(id="csv-graph-shape"),
 ])
 
 # Initialize file picker setup when the page loads
@@ -98,13 +167,14 @@ clientside_callback(
     prevent_initial_call=False
 )
 
-# Add client-side callback for file selection
+# Upload the selected file in chunks; only the handle of the parsed spectrum
+# comes back (assets/chunked_upload.js, utils/chunked_upload.py)
 clientside_callback(
-    """
-    window.dash_clientside.file_selector.openFilePicker
-    """,
+    ClientsideFunction(namespace="chunked_upload", function_name="uploadCsv"),
     Output("csv-data-store", "data"),
     Input("load-csv-button", "n_clicks"),
+    State("csv-data-store", "data"),
+    State("session-id", "data"),
     prevent_initial_call=True
 )
 
@@ -122,87 +192,153 @@ def update_file_info(data):
         html.Span(data.get("name", "Desconocido"))
     ]
 
-# Callback to process and display the CSV data
+def load_csv_spectrum(data, session_id, smoothing_method, smoothing_window):
+    """
+    Get the smoothed spectrum behind a handle.
+
+    Args:
+        data (dict): Handle of the loaded spectrum
+        session_id (str): Browser session id
+        smoothing_method (str): Smoothing method
+        smoothing_window (int): Smoothing window
+
+    Returns:
+        tuple: Wavelength and intensity arrays
+
+    Raises:
+        HandleExpired: If the spectrum is no longer on the server
+    """
+    arrays, _ = get_session_store().get(data["handle"], session_id)
+    return processed_spectrum(
+        data["key"], arrays["wavelength"], arrays["intensity"],
+        smoothing_method=smoothing_method,
+        smoothing_window=smoothing_window
+    )
+
+def csv_view_key(data, smoothing_method, smoothing_window):
+    """
+    Build the cache key of the displayed spectrum.
+
+    Args:
+        data (dict): Handle of the loaded spectrum
+        smoothing_method (str): Smoothing method
+        smoothing_window (int): Smoothing window
+
+    Returns:
+        tuple: Key identifying the content and processing options
+    """
+    if not smoothing_method or smoothing_method == "none":
+        smoothing_method, smoothing_window = None, None
+    return ("csv", data["key"], smoothing_method, smoothing_window)
+
+# Callback to process the CSV data; normalization and the other view
+# transforms are applied in the browser by the clientside callback below
 @callback(
-    Output("csv-graph", "figure"),
+    Output("csv-base-figure", "data"),
     Output("csv-load-status", "children"),
+    Output("csv-graph-shape", "data"),
+    Output("csv-zoom-detail", "data"),
     Input("csv-data-store", "data"),
-    Input("normalize-data-checkbox", "value")
+    Input("smoothing-method", "value"),
+    Input("smoothing-window", "value"),
+    State("csv-graph-shape", "data"),
+    State("session-id", "data")
 )
-def update_graph(data, normalize):
-    if not data or not data.get("content"):
+def update_graph(data, smoothing_method, smoothing_window, shown_shape=None, session_id=None):
+    if not data:
         # Return empty figure if no data
-        fig = go.Figure()
-        fig.update_layout(
-            title="No hay datos para mostrar",
-            xaxis_title="Longitud de onda (nm)",
-            yaxis_title="Intensidad (u.a.)",
-            template="plotly_white"
-        )
-        return fig, ""
+        return create_message_figure("No hay datos para mostrar"), "", None, None
 
     try:
-        # Load CSV data
-        from utils.data_processing import load_csv_file, normalize_data
-
-        # Parse CSV content
-        df = load_csv_file(data["content"])
-
-        # Apply normalization if requested
-        if normalize:
-            df = normalize_data(df)
-            title_suffix = " (Normalizado)"
-        else:
-            title_suffix = ""
-
-        # Create figure
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=df['wavelength'],
-            y=df['intensity'],
-            mode='lines',
-            name='Espectro',
-            line=dict(color='blue', width=2)
-        ))
-
-        # Update layout
-        fig.update_layout(
-            title=f"Espectro cargado desde {data['name']}{title_suffix}",
-            xaxis_title="Longitud de onda (nm)",
-            yaxis_title="Intensidad (u.a.)",
-            template="plotly_white",
-            margin=dict(l=50, r=50, t=80, b=50),
-            height=600,
-            hovermode="closest",
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
-        )
-
-        # Add grid lines
-        fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-        fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-
-        return fig, create_info_alert("Datos cargados correctamente")
+        if "error" in data:
+            raise ValueError(data["error"])
+
+        # Process the stored spectrum (memoized by content hash and options)
+        wavelength, intensity = load_csv_spectrum(data, session_id, smoothing_method, smoothing_window)
+
+        # Long spectra are decimated for display; zooming fetches more detail
+        view_key = csv_view_key(data, smoothing_method, smoothing_window)
+        display_x, display_y = downsample_view(wavelength, intensity, key=view_key)
+
+        title_suffix = ""
+        if smoothing_method and smoothing_method != "none":
+            title_suffix += " (Suavizado)"
+        title = f"Espectro cargado desde {data['name']}{title_suffix}"
+        # The figure is expanded by applyTransforms, which decodes decimated x as grid steps
+        traces = [spectrum_trace(display_x, display_y, grid_steps=True)]
+        shape = figure_shape(traces)
+        # The browser normalizes with the extremes of the whole spectrum, not of the decimated trace
+        extremes = [float(np.nanmin(intensity)), float(np.nanmax(intensity))]
 
+        # A new option on the displayed file only changes the intensities and the
+        # title; the wavelengths change too when the spectrum is decimated.
+        # The zoom detail of the previous options is dropped
+        if shape == shown_shape and ctx.triggered_id != "csv-data-store":
+            decimated = display_x.shape[0] != wavelength.shape[0]
+            figure = patch_spectrum_figure(traces, title, update_x=decimated)
+            figure["extremes"] = extremes
+            return figure, create_info_alert("Datos cargados correctamente"), no_update, None
+
+        # uirevision keeps the zoom while options change or traces are patched
+        figure = create_spectrum_figure(traces, title, uirevision=view_key[1])
+        figure["extremes"] = extremes
+        return figure, create_info_alert("Datos cargados correctamente"), shape, None
+
+    except HandleExpired:
+        message = "Los datos del archivo expiraron en el servidor. Vuelva a cargar el archivo."
+        return create_message_figure(message, color="red"), create_error_alert(message), None, None
     except Exception as e:
-        # Create error figure
-        error_fig = go.Figure()
-        error_fig.add_annotation(
-            text=f"Error al procesar datos: {str(e)}",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False,
-            font=dict(size=14, color="red")
-        )
-        error_fig.update_layout(
-            xaxis_title="Longitud de onda (nm)",
-            yaxis_title="Intensidad (u.a.)",
-            template="plotly_white"
-        )
-
-        return error_fig, create_error_alert(f"Error al procesar datos: {str(e)}")
+        message = f"Error al procesar datos: {str(e)}"
+        return create_message_figure(message, color="red"), create_error_alert(message), None, None
+
+# Apply the view transforms in the browser, without a server request
+clientside_callback(
+    ClientsideFunction(namespace="spectral_transforms", function_name="applyTransforms"),
+    Output("csv-graph", "figure"),
+    Input("csv-base-figure", "data"),
+    Input("csv-zoom-detail", "data"),
+    Input("normalize-data-checkbox", "value"),
+    Input("y-scale", "value"),
+    Input("x-unit", "value"),
+    Input("crop-start", "value"),
+    Input("crop-end", "value")
+)
+
+# Callback to refine the displayed points when zooming; the base figure keeps
+# the whole spectrum, so later unit or crop changes still show all of it
+@callback(
+    Output("csv-zoom-detail", "data", allow_duplicate=True),
+    Input("csv-graph", "relayoutData"),
+    State("csv-data-store", "data"),
+    State("smoothing-method", "value"),
+    State("smoothing-window", "value"),
+    State("x-unit", "value"),
+    State("session-id", "data"),
+    prevent_initial_call=True
+)
+def zoom_csv_graph(relayout_data, data, smoothing_method, smoothing_window, x_unit="nm", session_id=None):
+    changed, x_range = relayout_x_range(relayout_data)
+    if not changed or not data or "handle" not in data:
+        return no_update
+    if x_range is None:
+        # Autoscale: the base figure alone covers the whole spectrum
+        return None
+    if x_unit == "cm-1":
+        # The graph shows wavenumbers; the stored spectrum is in nm
+        if min(float(v) for v in x_range) <= 0:
+            return no_update
+        x_range = tuple(1e7 / float(v) for v in x_range)
+
+    try:
+        wavelength, intensity = load_csv_spectrum(data, session_id, smoothing_method, smoothing_window)
+    except Exception:
+        return no_update
+    if wavelength.shape[0] <= MIN_DECIMATION_POINTS:
+        # The base figure already has every point
+        return None
+
+    x, y = downsample_view(
+        wavelength, intensity, x_range,
+        key=csv_view_key(data, smoothing_method, smoothing_window)
+    )
+    return spectrum_trace(x, y, grid_steps=True)
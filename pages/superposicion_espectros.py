@@ -0,0 +1,348 @@
+import dash
+from dash import html, dcc, callback, ctx, Input, Output, State, no_update, Patch
+import dash_bootstrap_components as dbc
+import plotly.express as px
+
+# Import reusable components
+from components.alerts import create_info_alert, create_error_alert
+from components.buttons import create_primary_button, create_button
+from components.forms import create_form_card, create_dropdown_field, create_input_field
+from components.graphs import (
+    create_graph_component, create_spectrum_figure, create_message_figure, spectrum_trace,
+    WAVELENGTH_TITLE, WAVENUMBER_TITLE,
+)
+from utils.downsampling import relayout_x_range
+from utils.overlay import (
+    list_archive_spectra, spectrum_sources, overlay_series, points_per_trace, MAX_OVERLAY_TRACES,
+)
+
+# Register the page
+dash.register_page(__name__, path='/superposicion-espectros', name='Superposición de espectros', order=3, icon='layers')
+
+# Trace colors, chosen from the spectrum key so a trace keeps its color while others are toggled
+OVERLAY_COLORS = px.colors.qualitative.Dark24 + px.colors.qualitative.Light24
+
+# X axis title by archive kind
+AXIS_TITLES = {"csv": WAVELENGTH_TITLE, "dpt": WAVENUMBER_TITLE}
+
+# Layout for the overlay page
+layout = html.Div([
+    dbc.Row([
+        dbc.Col([
+            html.H2("Superposición de espectros"),
+            html.Hr(),
+            html.P("Esta página permite comparar muchos espectros del archivo binario en un mismo gráfico."),
+
+            create_form_card(
+                title="Espectros",
+                children=[
+                    dbc.Row([
+                        create_input_field(
+                            id="overlay-archive-dir",
+                            label="Archivo binario",
+                            value="./archivo_espectros",
+                            width=12
+                        ),
+                    ], className="mb-3"),
+                    dbc.Row([
+                        create_dropdown_field(
+                            id="overlay-kind",
+                            label="Tipo",
+                            options=[
+                                {"label": "Mediciones CSV (nm)", "value": "csv"},
+                                {"label": "Referencias DPT (cm⁻¹)", "value": "dpt"},
+                            ],
+                            value="csv",
+                            width=12
+                        ),
+                    ], className="mb-3"),
+                    create_primary_button(
+                        "Abrir archivo",
+                        id="overlay-open-button",
+                        icon="folder2-open",
+                        className="w-100 mb-3"
+                    ),
+
+                    # Spectra shown; each one is loaded when it is selected
+                    html.Label("Espectros mostrados"),
+                    dcc.Dropdown(id="overlay-select", multi=True, options=[], value=[], className="mb-3"),
+
+                    dbc.Row([
+                        create_input_field(
+                            id="overlay-filter",
+                            label="Agregar los que contienen",
+                            placeholder="Texto del nombre",
+                            width=12
+                        ),
+                    ], className="mb-2"),
+                    dbc.Row([
+                        dbc.Col(create_button("Agregar", id="overlay-add-button", icon="plus-lg", className="w-100"), width=6),
+                        dbc.Col(create_button("Quitar todos", id="overlay-clear-button", color="secondary",
+                                              outline=True, icon="x-lg", className="w-100"), width=6),
+                    ], className="mb-3"),
+
+                    html.Div(id="overlay-status"),
+                    html.Div(id="overlay-info", className="text-muted small"),
+                ]
+            ),
+        ], width=4),
+
+        dbc.Col([
+            create_graph_component(
+                id="overlay-graph",
+                figure=create_message_figure("Seleccione espectros para superponer"),
+                height="80vh"
+            ),
+        ], width=8),
+    ]),
+
+    # Archive opened with the button ({"root", "kind"})
+    dcc.Store(id="overlay-archive"),
+    # Traces in the figure: keys in display order, legend-hidden keys, keys whose
+    # data is for an older window, visible x range and points per trace
+    dcc.Store(id="overlay-state"),
+])
+
+
+@callback(
+    Output("overlay-select", "options"),
+    Output("overlay-select", "value"),
+    Output("overlay-archive", "data"),
+    Output("overlay-status", "children"),
+    Input("overlay-open-button", "n_clicks"),
+    State("overlay-archive-dir", "value"),
+    State("overlay-kind", "value"),
+    prevent_initial_call=True
+)
+def open_overlay_archive(n_clicks, root, kind):
+    """
+    List the spectra of an archive as options of the selector.
+
+    Args:
+        n_clicks (int): Number of button clicks
+        root (str): Archive directory
+        kind (str): Kind of spectra to list ("csv" or "dpt")
+
+    Returns:
+        tuple: Options, cleared selection, opened archive and status message
+    """
+    try:
+        entries = list_archive_spectra(root, kind)
+    except Exception as e:
+        return [], [], None, create_error_alert(str(e))
+    options = [{"label": entry["source"], "value": entry["key"]} for entry in entries]
+    return options, [], {"root": root, "kind": kind}, create_info_alert(f"{len(options)} espectros en el archivo")
+
+
+@callback(
+    Output("overlay-select", "value", allow_duplicate=True),
+    Input("overlay-add-button", "n_clicks"),
+    Input("overlay-clear-button", "n_clicks"),
+    State("overlay-filter", "value"),
+    State("overlay-select", "options"),
+    State("overlay-select", "value"),
+    prevent_initial_call=True
+)
+def add_matching_spectra(add_clicks, clear_clicks, text, options, selected):
+    """
+    Add every spectrum whose name contains a text, or clear the selection.
+
+    Args:
+        add_clicks (int): Clicks of the add button
+        clear_clicks (int): Clicks of the clear button
+        text (str): Text searched in the spectrum names
+        options (list): Options of the selector
+        selected (list): Keys selected so far
+
+    Returns:
+        list: New selection, limited to ``MAX_OVERLAY_TRACES`` spectra
+    """
+    if ctx.triggered_id == "overlay-clear-button":
+        return []
+    selected = list(selected or [])
+    text = (text or "").strip().lower()
+    chosen = set(selected)
+    for option in options or []:
+        if len(selected) >= MAX_OVERLAY_TRACES:
+            break
+        if text in option["label"].lower() and option["value"] not in chosen:
+            selected.append(option["value"])
+            chosen.add(option["value"])
+    return selected
+
+
+def overlay_trace(key, series, name):
+    """
+    Create the WebGL trace of one spectrum of the overlay.
+
+    Args:
+        key (str): Spectrum key
+        series (tuple): Decimated x and y arrays
+        name (str): Legend name
+
+    Returns:
+        dict: Plotly trace
+    """
+    color = OVERLAY_COLORS[int(key[:8], 16) % len(OVERLAY_COLORS)]
+    return spectrum_trace(series[0], series[1], name=name, color=color, width=1, webgl=True)
+
+
+def legend_visibility(restyle_data, shown, hidden):
+    """
+    Apply a legend click to the set of hidden traces.
+
+    Args:
+        restyle_data (list): ``restyleData`` event of the graph ([changes, indices])
+        shown (list): Keys of the traces, in display order
+        hidden (list): Keys hidden so far
+
+    Returns:
+        tuple: Hidden keys and keys that became visible, or (None, None) if
+        the event does not change visibility
+    """
+    if not restyle_data or "visible" not in restyle_data[0]:
+        return None, None
+    values = restyle_data[0]["visible"]
+    indices = restyle_data[1] if len(restyle_data) > 1 else range(len(shown))
+    hidden = set(hidden)
+    shown_again = []
+    for position, index in enumerate(indices):
+        if index >= len(shown):
+            continue
+        value = values[position % len(values)] if isinstance(values, list) else values
+        key = shown[index]
+        if value is True:
+            if key in hidden:
+                shown_again.append(key)
+            hidden.discard(key)
+        else:
+            hidden.add(key)
+    return [key for key in shown if key in hidden], shown_again
+
+
+@callback(
+    Output("overlay-graph", "figure"),
+    Output("overlay-state", "data"),
+    Output("overlay-info", "children"),
+    Input("overlay-select", "value"),
+    Input("overlay-graph", "relayoutData"),
+    Input("overlay-graph", "restyleData"),
+    State("overlay-state", "data"),
+    State("overlay-archive", "data"),
+    prevent_initial_call=True
+)
+def update_overlay(selected, relayout_data, restyle_data, state, archive):
+    """
+    Keep the overlay figure in sync with the selection, the zoom and the legend.
+
+    Traces are added and removed with partial updates, so toggling one spectrum
+    only sends that spectrum, unless adding it lowers the points per trace and
+    the other visible traces must be decimated again. Zooming re-decimates the
+    visible traces for the new window; traces hidden in the legend are
+    refreshed when shown again.
+
+    Args:
+        selected (list): Selected spectrum keys
+        relayout_data (dict): Last zoom event of the graph
+        restyle_data (list): Last legend event of the graph
+        state (dict): Traces in the figure
+        archive (dict): Opened archive
+
+    Returns:
+        tuple: Figure (or partial update), new state and information text
+    """
+    selected = list(selected or [])[:MAX_OVERLAY_TRACES]
+    if not archive or not selected:
+        return create_message_figure("Seleccione espectros para superponer"), None, ""
+
+    root = archive["root"]
+    points = points_per_trace(len(selected))
+    trigger = ctx.triggered[0]["prop_id"] if ctx.triggered else ""
+    try:
+        if not state or state.get("archive") != archive:
+            series = overlay_series(root, selected, None, points)
+            names = spectrum_sources(root, selected)
+            traces = [overlay_trace(key, series[key], names.get(key, key)) for key in selected]
+            figure = create_spectrum_figure(
+                traces, f"{len(selected)} espectros superpuestos",
+                uirevision=f"{root}|{archive['kind']}", height=750
+            )
+            figure["layout"]["xaxis"]["title"]["text"] = AXIS_TITLES.get(archive["kind"], "X")
+            figure["layout"]["legend"] = {"orientation": "v", "x": 1.02, "xanchor": "left", "y": 1, "yanchor": "top"}
+            state = {"archive": archive, "shown": selected, "hidden": [], "stale": [], "range": None, "points": points}
+            return figure, state, overlay_info(state)
+
+        shown, x_range = state["shown"], state["range"]
+        patched = Patch()
+
+        if trigger == "overlay-graph.relayoutData":
+            changed, x_range = relayout_x_range(relayout_data)
+            if not changed:
+                return no_update, no_update, no_update
+            # Hidden traces keep their data until they are shown again
+            refresh = [key for key in shown if key not in state["hidden"]]
+            state = dict(state, range=x_range, points=points, stale=list(state["hidden"]))
+
+        elif trigger == "overlay-graph.restyleData":
+            hidden, shown_again = legend_visibility(restyle_data, shown, state["hidden"])
+            if hidden is None:
+                return no_update, no_update, no_update
+            refresh = [key for key in shown_again if key in state["stale"]]
+            state = dict(state, hidden=hidden, stale=[key for key in state["stale"] if key not in refresh])
+            if not refresh:
+                return no_update, state, overlay_info(state)
+
+        else:
+            removed = [index for index, key in enumerate(shown) if key not in selected]
+            added = [key for key in selected if key not in shown]
+            if not removed and not added:
+                return no_update, no_update, no_update
+            for index in reversed(removed):
+                del patched["data"][index]
+            if added:
+                series = overlay_series(root, added, x_range, points)
+                names = spectrum_sources(root, added)
+                for key in added:
+                    patched["data"].append(overlay_trace(key, series[key], names.get(key, key)))
+            kept = [key for key in shown if key in selected]
+            shown = kept + added
+            patched["layout"]["title"]["text"] = f"{len(shown)} espectros superpuestos"
+            hidden = [key for key in state["hidden"] if key in selected]
+            stale = [key for key in state["stale"] if key in selected]
+            refresh = []
+            if points < state["points"]:
+                # More traces share the point budget: the kept ones are decimated
+                # again (hidden ones when they are shown) so the figure stays within it
+                refresh = [key for key in kept if key not in hidden]
+                stale = [key for key in kept if key in hidden]
+            state = dict(state, shown=shown, points=points, hidden=hidden, stale=stale)
+            if not refresh:
+                return patched, state, overlay_info(state)
+
+        series = overlay_series(root, refresh, x_range, points)
+        for key in refresh:
+            index = shown.index(key)
+            x, y = series[key]
+            trace = spectrum_trace(x, y)
+            for prop in ("x", "x0", "dx", "y"):
+                if prop in trace:
+                    patched["data"][index][prop] = trace[prop]
+        return patched, state, overlay_info(state)
+
+    except Exception as e:
+        message = f"Error al cargar los espectros: {str(e)}"
+        return create_message_figure(message, color="red"), None, message
+
+
+def overlay_info(state):
+    """
+    Describe the traces of the overlay.
+
+    Args:
+        state (dict): Traces in the figure
+
+    Returns:
+        str: Information text
+    """
+    visible = len(state["shown"]) - len(state["hidden"])
+    return f"{len(state['shown'])} espectros ({visible} visibles), hasta {state['points']} puntos por traza"
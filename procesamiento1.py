@@ -1,6 +1,8 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from utils.spectral_ops import batch_ratio
+
 # Load the CSV file
 source = pd.read_csv("./OSA_Data/source_lin_plate_smallband1_hi3.csv")  # Replace with your file path
 data1 = pd.read_csv("./OSA_Data/muestra_lin_smallband1_hi3.csv")  # Replace with your file path
@@ -46,8 +48,11 @@ dn = normalize_signal_lin(data1)
 
 #plot_2data(sn, dn)
 
+# Same ratio (normalized source / normalized sample) computed with the batch API,
+# which also accepts stacks of samples and references
+ratio, reflectance, absorbance = batch_ratio(data1['Intensity'].to_numpy(), source['Intensity'].to_numpy())
 absorption = source.copy()
-absorption['Intensity'] = sn['Intensity'] / dn['Intensity']
+absorption['Intensity'] = ratio[0]
 
 #absorption_nn = source.copy()
 #absorption_nn['Intensity'] = source['Intensity'] / data1['Intensity']
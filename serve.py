@@ -0,0 +1,118 @@
+"""
+Production server: several worker processes sharing the application state.
+
+Usage:
+    python serve.py [--host 0.0.0.0] [--port 8050] [--workers N] [--quiet]
+
+The application is loaded once and the listening socket is shared by N forked
+worker processes, each serving requests in threads (Werkzeug), without the
+debugger or the reloader of ``python app.py``. With more than one worker the
+stores run in multi-worker mode (see ``utils/shared_state.py``), and a worker
+that dies is replaced. Where gunicorn is installed,
+``gunicorn -c gunicorn.conf.py app:server`` serves the same application.
+Forking is not available on Windows, where only ``--workers 1`` is supported.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from utils.shared_state import MULTI_WORKER_ENV
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sirve la aplicación con varios procesos de trabajo.")
+    parser.add_argument("--host", default="0.0.0.0", help="Dirección en la que escuchar")
+    parser.add_argument("--port", type=int, default=8050, help="Puerto en el que escuchar")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Número de procesos")
+    parser.add_argument("--quiet", action="store_true", help="No registrar cada solicitud")
+    return parser.parse_args()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+def serve_worker(listener, application, host, port, quiet):
+    """
+    Serve requests from a shared listening socket until the process is stopped.
+
+    Args:
+        listener (socket.socket): Listening socket created by the parent
+        application: WSGI application
+        host (str): Listening address, for the server environment
+        port (int): Listening port, for the server environment
+        quiet (bool): Do not log every request
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = make_server(
+        host, port, application, threaded=True, fd=listener.fileno(),
+        request_handler=QuietRequestHandler if quiet else None,
+    )
+    server.serve_forever()
+
+
+def main():
+    args = parse_args()
+    if args.workers > 1:
+        if not hasattr(os, "fork"):
+            raise SystemExit("Varios procesos requieren Linux o macOS; use --workers 1.")
+        # Read by the stores when the application is imported
+        os.environ[MULTI_WORKER_ENV] = "1"
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    # The application is loaded once, before forking
+    from app import server as application
+
+    print(f"Sirviendo en http://{args.host}:{args.port} con {args.workers} proceso(s)")
+    if args.workers == 1:
+        serve_worker(listener, application, args.host, args.port, args.quiet)
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve_worker(listener, application, args.host, args.port, args.quiet)
+            finally:
+                os._exit(1)
+        children.add(pid)
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    for _ in range(args.workers):
+        spawn()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"El proceso {pid} terminó (estado {status}); iniciando otro", file=sys.stderr)
+            spawn()
+
+
+if __name__ == "__main__":
+    main()
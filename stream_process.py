@@ -0,0 +1,99 @@
+"""
+Apply a processing recipe to a dataset of any size with bounded memory.
+
+Usage:
+    python stream_process.py <dir_or_glob_or_archive> <output_archive> --recipe "to_nm; baseline; normalize_max"
+    python stream_process.py ./archivo_espectros ./procesados --recipe receta.json --chunk-size 512
+
+Spectra are read in blocks of ``--chunk-size`` spectra that share the same
+x axis, processed together and written to the output archive before the next
+block is read. The input can be a folder or glob of .dpt/.csv files, or a
+binary archive created with bulk_convert.py.
+"""
+
+import argparse
+import os
+
+from utils.batch_runner import Throughput, collect_inputs, format_timings
+from utils.chunked_runner import (
+    DEFAULT_CHUNK_SIZE, iter_file_spectra, iter_archive_spectra, run_recipe_chunked,
+)
+from utils.recipes import parse_recipe, recipe_changed, save_recipe, discard_recipe
+from utils.spectrum_archive import SpectrumArchive, CATALOG_NAME
+
+REPORT_EVERY_BLOCKS = 20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Procesa por bloques conjuntos de espectros de cualquier tamaño.")
+    parser.add_argument("inputs", help="Directorio, patrón glob o archivo binario de entrada")
+    parser.add_argument("output_dir", help="Archivo binario de salida")
+    parser.add_argument("--recipe", required=True, help="Receta en línea o archivo .json")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Espectros por bloque")
+    parser.add_argument("--force", action="store_true", help="Reprocesar aunque el espectro no haya cambiado")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    recipe = parse_recipe(args.recipe)
+    output = SpectrumArchive(args.output_dir)
+    changed = recipe_changed(args.output_dir, recipe)
+    force = args.force or changed
+    if changed:
+        # The recipe is recorded again only once every output comes from it
+        discard_recipe(args.output_dir)
+
+    errors = []
+    source_archive = None
+    if os.path.exists(os.path.join(args.inputs, CATALOG_NAME)):
+        source_archive = SpectrumArchive(args.inputs)
+        entries = [
+            e for e in source_archive.entries()
+            if force or not output.is_current(e["source"], e["size"], e["mtime_ns"])
+        ]
+        total = len(entries)
+        spectra = iter_archive_spectra(source_archive, entries)
+    else:
+        source_root, files = collect_inputs(args.inputs)
+        pending = [f for f in files if force or not output.is_current(*f)]
+        total = len(pending)
+        spectra = iter_file_spectra(source_root, pending, errors)
+    print(f"{total} espectros por procesar en bloques de {args.chunk_size}")
+
+    progress = Throughput(total)
+    timings = {}
+    blocks = [0]
+
+    def on_block(n_spectra, n_bytes):
+        progress.add(n_bytes, n_spectra)
+        blocks[0] += 1
+        if blocks[0] % REPORT_EVERY_BLOCKS == 0:
+            print(progress.report())
+
+    stats = {"spectra": 0, "blocks": 0, "max_block_bytes": 0}
+    interrupted = False
+    try:
+        stats = run_recipe_chunked(recipe, spectra, output, args.chunk_size, timings, on_block, errors)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Procesamiento interrumpido; los bloques escritos se conservan.")
+    finally:
+        output.close()
+        if source_archive is not None:
+            source_archive.close()
+    if not interrupted and not errors:
+        save_recipe(args.output_dir, recipe)
+
+    print(progress.report())
+    print(f"Bloques: {stats['blocks']} | bloque más grande en memoria: {stats['max_block_bytes'] / 1e6:.1f} MB")
+    if timings:
+        print("Tiempo por etapa:")
+        print("\n".join(format_timings(timings)))
+    for source, message in errors:
+        print(f"Error en {source}: {message}")
+    print(f"Procesamiento terminado: {progress.done} procesados, {len(errors)} errores")
+
+
+if __name__ == "__main__":
+    main()
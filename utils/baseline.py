@@ -0,0 +1,382 @@
+"""
+Baseline estimation and correction for stacks of spectra.
+
+Three estimators are available, all working along the last (wavelength) axis
+so a whole ``(k, n)`` stack is corrected at once:
+
+- ``als``: asymmetric least squares (Eilers & Boelens). Each iteration solves
+  the pentadiagonal system ``(W + lam * D'D) z = W y`` with a banded LDL'
+  factorization vectorized across spectra. The penalty bands are cached per
+  (n, lam), and the first iteration, where all weights are equal, shares a
+  single factorization for the whole stack.
+- ``rolling_min``: morphological opening (rolling minimum followed by a
+  rolling maximum) smoothed with a moving average.
+- ``polynomial``: polynomial fit with iterative masking of the points above
+  the fit (ModPoly). The pseudo-inverse of the design matrix is cached per
+  grid and reused for every spectrum and iteration.
+"""
+
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from utils.smoothing import moving_average
+
+BASELINE_METHODS = ("als", "rolling_min", "polynomial")
+
+# Design matrices kept for the polynomial fit (one per grid and degree)
+_POLY_CACHE_SIZE = 32
+_poly_cache = OrderedDict()
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=32)
+def difference_penalty(n_points, lam):
+    """
+    Bands of ``lam * D'D`` for the second-difference matrix ``D``.
+
+    Args:
+        n_points (int): Number of points of the spectra
+        lam (float): Smoothness penalty
+
+    Returns:
+        tuple: Read-only diagonal, first and second off-diagonal bands
+    """
+    if n_points < 3:
+        raise ValueError("Asymmetric least squares needs at least three points")
+    diag = np.zeros(n_points)
+    off1 = np.zeros(n_points - 1)
+    off2 = np.zeros(n_points - 2)
+    # Row i of D is [1, -2, 1] at columns i, i + 1, i + 2
+    diag[:-2] += 1.0
+    diag[1:-1] += 4.0
+    diag[2:] += 1.0
+    off1[:-1] -= 2.0
+    off1[1:] -= 2.0
+    off2 += 1.0
+    return tuple(_read_only(band * lam) for band in (diag, off1, off2))
+
+
+def _factor_loop(diag, off1, off2, d, l1, l2):
+    # Banded LDL' recurrences; works on lists of floats (one system) or on
+    # arrays whose rows hold the same entry of many systems
+    n = len(d)
+    for i in range(n):
+        value = diag[i]
+        if i > 0:
+            value = value - l1[i - 1] * l1[i - 1] * d[i - 1]
+        if i > 1:
+            value = value - l2[i - 2] * l2[i - 2] * d[i - 2]
+        d[i] = value
+        if i < n - 1:
+            value = off1[i]
+            if i > 0:
+                value = value - l2[i - 1] * l1[i - 1] * d[i - 1]
+            l1[i] = value / d[i]
+        if i < n - 2:
+            l2[i] = off2[i] / d[i]
+
+
+def _solve_loop(d, l1, l2, x):
+    n = len(x)
+    for i in range(1, n):
+        value = x[i] - l1[i - 1] * x[i - 1]
+        if i > 1:
+            value = value - l2[i - 2] * x[i - 2]
+        x[i] = value
+    x[n - 1] = x[n - 1] / d[n - 1]
+    for i in range(n - 2, -1, -1):
+        value = x[i] / d[i] - l1[i] * x[i + 1]
+        if i < n - 2:
+            value = value - l2[i] * x[i + 2]
+        x[i] = value
+
+
+def pentadiagonal_factor(diag, off1, off2):
+    """
+    LDL' factorization of symmetric pentadiagonal matrices.
+
+    Bands have the matrix index on the first axis; any trailing axes hold
+    independent systems that are factorized together. A single system (1D
+    bands) is factorized with plain floats, which avoids the per-element
+    overhead of NumPy scalars.
+
+    Args:
+        diag (numpy.ndarray): Diagonal, shape ``(n, ...)``
+        off1 (numpy.ndarray): First off-diagonal, shape ``(n - 1, ...)``
+        off2 (numpy.ndarray): Second off-diagonal, shape ``(n - 2, ...)``
+
+    Returns:
+        tuple: ``d``, ``l1`` and ``l2`` arrays for ``pentadiagonal_solve``
+    """
+    n = np.shape(diag)[0]
+    trailing = np.broadcast_shapes(np.shape(diag)[1:], np.shape(off1)[1:], np.shape(off2)[1:])
+    if not trailing:
+        d, l1, l2 = [0.0] * n, [0.0] * (n - 1), [0.0] * (n - 2)
+        _factor_loop(np.asarray(diag).tolist(), np.asarray(off1).tolist(), np.asarray(off2).tolist(), d, l1, l2)
+        return np.array(d), np.array(l1), np.array(l2)
+    d = np.empty((n,) + trailing)
+    l1 = np.empty((n - 1,) + trailing)
+    l2 = np.empty((n - 2,) + trailing)
+    _factor_loop(diag, off1, off2, d, l1, l2)
+    return d, l1, l2
+
+
+def pentadiagonal_solve(factors, b, out=None):
+    """
+    Solve systems factorized with ``pentadiagonal_factor``.
+
+    Args:
+        factors (tuple): Result of ``pentadiagonal_factor``
+        b (numpy.ndarray): Right-hand sides, shape ``(n, ...)`` broadcastable with the factors
+        out (numpy.ndarray): Optional output array (may be ``b``)
+
+    Returns:
+        numpy.ndarray: Solutions, shape of ``b``
+    """
+    d, l1, l2 = factors
+    if np.ndim(b) == 1 and d.ndim == 1:
+        x = np.asarray(b, dtype=np.float64).tolist()
+        _solve_loop(d.tolist(), l1.tolist(), l2.tolist(), x)
+        if out is None:
+            return np.array(x)
+        out[...] = x
+        return out
+    if out is None:
+        x = np.array(b, dtype=np.float64)
+    else:
+        x = out
+        if x is not b:
+            np.copyto(x, b)
+    _solve_loop(d, l1, l2, x)
+    return x
+
+
+# Stacks up to this size are corrected one spectrum at a time with plain
+# floats; larger stacks are vectorized across spectra
+_SCALAR_MAX_SPECTRA = 8
+
+
+def _als_columns(columns, diag, off1, off2, p, niter):
+    # columns: (n, k) for the vectorized path or (n,) for a single spectrum
+    bands = (diag, off1, off2) if columns.ndim == 1 else (diag[:, None], off1[:, None], off2[:, None])
+    # First pass: all weights are one, so one factorization serves every spectrum
+    factors = pentadiagonal_factor(bands[0] + 1.0, bands[1], bands[2])
+    z = pentadiagonal_solve(factors, columns)
+
+    weights = np.ones_like(columns)
+    new_weights = np.empty_like(columns)
+    for _ in range(max(0, int(niter) - 1)):
+        np.copyto(new_weights, 1.0 - p)
+        new_weights[columns > z] = p
+        if np.array_equal(new_weights, weights):
+            break
+        weights, new_weights = new_weights, weights
+        factors = pentadiagonal_factor(bands[0] + weights, bands[1], bands[2])
+        z = pentadiagonal_solve(factors, weights * columns, out=z)
+    return z
+
+
+def als_baseline(y, lam=1e5, p=0.01, niter=10, out=None):
+    """
+    Asymmetric least squares baseline along the last axis.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        lam (float): Smoothness penalty (larger gives stiffer baselines)
+        p (float): Weight of points above the baseline (0 < p < 1)
+        niter (int): Maximum number of reweighting iterations
+        out (numpy.ndarray): Optional output array
+
+    Returns:
+        numpy.ndarray: Baseline, same shape as ``y``
+    """
+    if not 0 < p < 1:
+        raise ValueError("p must be between 0 and 1")
+    y = np.asarray(y, dtype=np.float64)
+    rows = y.reshape(-1, y.shape[-1])
+    diag, off1, off2 = difference_penalty(rows.shape[1], float(lam))
+
+    if rows.shape[0] <= _SCALAR_MAX_SPECTRA:
+        result = np.empty_like(rows)
+        for i, row in enumerate(rows):
+            result[i] = _als_columns(row, diag, off1, off2, p, niter)
+    else:
+        # Work on (n, k) so every step of the banded recurrences is one vector op
+        result = _als_columns(rows.T, diag, off1, off2, p, niter).T
+
+    result = result.reshape(y.shape)
+    if out is None:
+        return np.ascontiguousarray(result)
+    out[...] = result
+    return out
+
+
+def _sliding_extreme(y, window, function):
+    # Centered sliding minimum/maximum with edge replication, computed by
+    # doubling the covered span (log2(window) passes over the data)
+    h = window // 2
+    padded = np.concatenate(
+        [np.repeat(y[..., :1], h, axis=-1), y, np.repeat(y[..., -1:], h, axis=-1)], axis=-1
+    )
+    n = y.shape[-1]
+    span = 1
+    result = padded
+    while span * 2 <= window:
+        function(result[..., :-span], result[..., span:], out=result[..., :-span])
+        span *= 2
+    if span < window:
+        rest = window - span
+        function(result[..., :-rest], result[..., rest:], out=result[..., :-rest])
+    return result[..., :n]
+
+
+def rolling_min_baseline(y, window=101, smooth_window=None, out=None):
+    """
+    Rolling-minimum baseline along the last axis.
+
+    The baseline is the morphological opening of the spectrum (rolling minimum
+    followed by rolling maximum), smoothed with a moving average.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        window (int): Odd window length in points, wider than the peaks
+        smooth_window (int): Moving average window, defaults to ``window``
+        out (numpy.ndarray): Optional output array
+
+    Returns:
+        numpy.ndarray: Baseline, same shape as ``y``
+    """
+    window = int(window)
+    if window < 1 or window % 2 == 0:
+        raise ValueError("Window must be a positive odd number")
+    y = np.asarray(y, dtype=np.float64)
+    opened = _sliding_extreme(_sliding_extreme(y, window, np.minimum), window, np.maximum)
+    return moving_average(opened, int(smooth_window or window), out=out)
+
+
+def _grid_digest(x):
+    return hashlib.blake2b(np.ascontiguousarray(x, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+def polynomial_design(x, degree):
+    """
+    Design matrix and pseudo-inverse for a polynomial fit on a grid.
+
+    The grid is scaled to [-1, 1] for conditioning. Results are cached per
+    grid and degree.
+
+    Args:
+        x (numpy.ndarray): X axis
+        degree (int): Polynomial degree
+
+    Returns:
+        tuple: Read-only design matrix ``(n, degree + 1)`` and its pseudo-inverse
+    """
+    key = (_grid_digest(x), int(degree))
+    design = _poly_cache.get(key)
+    if design is not None:
+        _poly_cache.move_to_end(key)
+        return design
+    x = np.asarray(x, dtype=np.float64)
+    low, high = x.min(), x.max()
+    scaled = (2 * x - (high + low)) / (high - low) if high > low else np.zeros_like(x)
+    vander = np.vander(scaled, int(degree) + 1, increasing=True)
+    design = (_read_only(vander), _read_only(np.linalg.pinv(vander)))
+    _poly_cache[key] = design
+    while len(_poly_cache) > _POLY_CACHE_SIZE:
+        _poly_cache.popitem(last=False)
+    return design
+
+
+def polynomial_baseline(x, y, degree=3, niter=100, tol=1e-3, out=None):
+    """
+    Polynomial baseline with iterative masking of peaks (ModPoly).
+
+    At each iteration the spectrum is clipped to the current fit, so points on
+    peaks stop pulling the polynomial up. The same pseudo-inverse is used for
+    every spectrum and iteration.
+
+    Args:
+        x (numpy.ndarray): X axis
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        degree (int): Polynomial degree
+        niter (int): Maximum number of iterations
+        tol (float): Relative change of the fit below which iteration stops
+        out (numpy.ndarray): Optional output array
+
+    Returns:
+        numpy.ndarray: Baseline, same shape as ``y``
+    """
+    vander, pinv = polynomial_design(x, degree)
+    y = np.asarray(y, dtype=np.float64)
+    work = y.reshape(-1, y.shape[-1]).copy()
+
+    def fit_rows(rows):
+        return (rows @ pinv.T) @ vander.T
+
+    fit = fit_rows(work)
+    # Only spectra whose fit is still changing are refitted
+    active = np.arange(work.shape[0])
+    for _ in range(int(niter)):
+        if active.size == 0:
+            break
+        rows = np.minimum(work[active], fit[active])
+        work[active] = rows
+        new_fit = fit_rows(rows)
+        change = np.linalg.norm(new_fit - fit[active], axis=-1)
+        change /= np.maximum(np.linalg.norm(new_fit, axis=-1), 1e-12)
+        fit[active] = new_fit
+        active = active[change >= tol]
+    fit = fit.reshape(y.shape)
+    if out is None:
+        return fit
+    out[...] = fit
+    return out
+
+
+def baseline(x, y, method="als", **params):
+    """
+    Estimate the baseline of one spectrum or a stack of spectra.
+
+    Args:
+        x (numpy.ndarray): X axis (used by the polynomial method)
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        method (str): One of ``BASELINE_METHODS``
+        **params: Parameters of the estimator
+
+    Returns:
+        numpy.ndarray: Baseline, same shape as ``y``
+    """
+    if method == "als":
+        return als_baseline(y, **params)
+    if method == "rolling_min":
+        return rolling_min_baseline(y, **params)
+    if method == "polynomial":
+        return polynomial_baseline(x, y, **params)
+    raise ValueError(f"Unknown baseline method: {method}")
+
+
+def correct_baseline(x, y, method="als", **params):
+    """
+    Subtract the estimated baseline from one spectrum or a stack of spectra.
+
+    Args:
+        x (numpy.ndarray): X axis (used by the polynomial method)
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        method (str): One of ``BASELINE_METHODS``
+        **params: Parameters of the estimator
+
+    Returns:
+        numpy.ndarray: Corrected spectra, same shape as ``y``
+    """
+    y = np.asarray(y, dtype=np.float64)
+    corrected = baseline(x, y, method, **params)
+    np.subtract(y, corrected, out=corrected)
+    return corrected
@@ -0,0 +1,234 @@
+"""
+Process-pool batch execution of processing recipes over spectrum files.
+
+Workers parse each file, apply the recipe and place the resulting arrays in a
+shared memory block; only the block name and a few metadata fields are sent
+back to the parent, which copies the arrays into the output archive and
+releases the block. On Windows a block is freed as soon as its last handle is
+closed, before the parent could attach, so the arrays are returned pickled.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.recipes import apply_recipe
+from utils.spectrum_archive import SOURCE_KINDS, find_source_files, read_spectrum_file
+
+
+def run_in_pool(function, items, workers, on_result, on_error, in_flight_per_worker=4):
+    """
+    Run ``function(*item)`` for every item in a process pool.
+
+    The number of pending tasks is bounded so very large inputs do not fill
+    memory with futures. Callbacks run in the calling process.
+
+    Args:
+        function (callable): Picklable top-level function
+        items (iterable): Argument tuples
+        workers (int): Number of worker processes
+        on_result (callable): Called as ``on_result(item, result)``
+        on_error (callable): Called as ``on_error(item, exception)``
+        in_flight_per_worker (int): Pending tasks allowed per worker
+    """
+    queue = iter(items)
+    workers = max(1, workers or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            item = next(queue, None)
+            if item is not None:
+                in_flight[executor.submit(function, *item)] = item
+
+        for _ in range(workers * in_flight_per_worker):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    on_error(item, e)
+                else:
+                    on_result(item, result)
+                submit_next()
+
+
+class Throughput:
+    """
+    Counter of processed files and bytes with rate reporting.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.start_time = time.perf_counter()
+
+    def add(self, n_bytes, n_files=1):
+        self.done += n_files
+        self.bytes += n_bytes
+
+    def report(self):
+        """
+        Format the current progress and throughput.
+
+        Returns:
+            str: Progress line with files/s and MB/s
+        """
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return (
+            f"{self.done}/{self.total} archivos | "
+            f"{self.done / elapsed:.1f} archivos/s | "
+            f"{self.bytes / elapsed / 1e6:.2f} MB/s"
+        )
+
+
+def format_timings(timings):
+    """
+    Format accumulated per-step timings as a table.
+
+    Args:
+        timings (dict): Seconds by step label
+
+    Returns:
+        list: Lines with the seconds and share of each step
+    """
+    total = sum(timings.values()) or 1e-9
+    return [
+        f"  {label:24s} {seconds:8.3f} s ({100 * seconds / total:5.1f} %)"
+        for label, seconds in timings.items()
+    ]
+
+
+def collect_inputs(spec):
+    """
+    Collect DPT/CSV files from a directory or a glob pattern.
+
+    Args:
+        spec (str): Directory (scanned recursively) or glob pattern
+
+    Returns:
+        tuple: Root directory and a list of (relative path, size, mtime_ns)
+    """
+    if os.path.isdir(spec):
+        return spec, find_source_files(spec)
+
+    paths = sorted(
+        p for p in glob.glob(spec, recursive=True)
+        if os.path.isfile(p) and os.path.splitext(p)[1].lower() in SOURCE_KINDS
+    )
+    if not paths:
+        return spec, []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append((os.path.relpath(os.path.abspath(path), root), stat.st_size, stat.st_mtime_ns))
+    return root, files
+
+
+def output_kind(kind, recipe):
+    """
+    Work out the axis kind of a processed spectrum.
+
+    Each ``to_nm`` step swaps the axis between cm^-1 ("dpt") and nm ("csv").
+
+    Args:
+        kind (str): Kind of the source file
+        recipe (list): Parsed recipe
+
+    Returns:
+        str: Kind of the processed spectrum
+    """
+    swaps = sum(1 for step in recipe if step["step"] == "to_nm")
+    if swaps % 2 == 0:
+        return kind
+    return "csv" if kind == "dpt" else "dpt"
+
+
+def process_file(source_root, source, recipe):
+    """
+    Parse a file, apply a recipe and publish the result in shared memory.
+
+    Runs inside the worker processes. The caller must attach to the returned
+    block with ``take_shared_result`` so it is released. On Windows the arrays
+    are returned in the result instead.
+
+    Args:
+        source_root (str): Root directory of the inputs
+        source (str): Path relative to ``source_root``
+        recipe (list): Parsed recipe
+
+    Returns:
+        dict: Shared memory name and array shape (or the array itself on
+        Windows), axis kind and per-step timings
+    """
+    kind, x, y = read_spectrum_file(os.path.join(source_root, source))
+    timings = {}
+    x, y = apply_recipe(recipe, x, y, timings)
+    if np.ndim(y) != 1 or y.shape[0] != x.shape[0]:
+        raise ValueError("The recipe must produce one intensity value per wavelength")
+
+    if os.name == "nt":
+        return {
+            "array": np.vstack([x, y]).astype(np.float64, copy=False),
+            "kind": output_kind(kind, recipe),
+            "timings": timings,
+        }
+
+    shape = (2, x.shape[0])
+    block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    try:
+        array = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        array[0] = x
+        array[1] = y
+        del array
+    finally:
+        block.close()
+    return {
+        "shm": block.name,
+        "shape": shape,
+        "kind": output_kind(kind, recipe),
+        "timings": timings,
+    }
+
+
+def take_shared_result(result):
+    """
+    Copy a worker result out of shared memory and release the block.
+
+    Args:
+        result (dict): Value returned by ``process_file``
+
+    Returns:
+        numpy.ndarray: ``(2, n)`` array with the x axis and the processed values
+    """
+    if "array" in result:
+        return result["array"]
+    block = shared_memory.SharedMemory(name=result["shm"])
+    try:
+        array = np.ndarray(result["shape"], dtype=np.float64, buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+    return array
+
+
+def ensure_shared_memory_tracking():
+    """
+    Start the resource tracker before the pool so workers and parent share it.
+
+    Blocks created in the workers are then unregistered when the parent
+    unlinks them, instead of being reported as leaked when a worker exits.
+    """
+    if os.name != "nt":
+        from multiprocessing import resource_tracker
+        resource_tracker.ensure_running()
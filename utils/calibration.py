@@ -0,0 +1,363 @@
+"""
+Calibration store for dark, reference and instrument-response correction.
+
+The latest dark and reference spectra are kept per (instrument, sensitivity,
+wavelength range), both in memory and on disk, so a sample measurement can be
+corrected without reacquiring the reference first:
+
+    corrected = (sample - dark) / (reference - dark)
+
+The OSA reports powers in dBm, so spectra in dB are converted to linear power
+before the subtraction and the division; the result is the linear ratio
+(transmittance or reflectance). Calibrations expire after a TTL and are checked before use (finite values,
+enough signal above the dark level, a grid covering the sample). The inverse
+instrument response is cached per sample grid, so repeated corrections only
+cost a subtraction and a multiplication.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.resampling import get_resampler
+from utils.spectral_ops import db_to_linear
+from utils.spectrum_archive import write_array
+
+CALIBRATION_KINDS = ("dark", "reference")
+
+# Directory where calibrations are persisted between application restarts
+CALIBRATION_DIR = ".osa_calibration"
+
+# Seconds a calibration stays valid after it was acquired
+DEFAULT_TTL = 3600
+
+# Minimum fraction of points where the reference must be above the dark level
+MIN_VALID_FRACTION = 0.9
+
+# Instrument responses kept in memory (one per configuration and sample grid)
+MAX_RESPONSES = 32
+
+
+class CalibrationUnavailable(Exception):
+    """Raised when there is no valid calibration for a measurement."""
+
+
+def calibration_key(instrument, sensitivity, wavelength_start, wavelength_end):
+    """
+    Compute the key identifying a calibration slot.
+
+    Args:
+        instrument (str): Instrument identifier (e.g. "ip:port")
+        sensitivity (str): Sensitivity setting
+        wavelength_start (float): Start wavelength in nm
+        wavelength_end (float): End wavelength in nm
+
+    Returns:
+        str: Hex digest of the slot
+    """
+    text = f"{instrument}|{sensitivity}|{float(wavelength_start)!r}|{float(wavelength_end)!r}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def check_spectrum(wavelengths, intensities):
+    """
+    Validate a calibration spectrum.
+
+    Args:
+        wavelengths (numpy.ndarray): Wavelength values
+        intensities (numpy.ndarray): Intensity values
+
+    Returns:
+        str: Description of the problem, or None if the spectrum is usable
+    """
+    if wavelengths.ndim != 1 or wavelengths.shape != intensities.shape:
+        return "las longitudes de onda y las intensidades no coinciden"
+    if wavelengths.shape[0] < 2:
+        return "el espectro tiene menos de dos puntos"
+    if not (np.isfinite(wavelengths).all() and np.isfinite(intensities).all()):
+        return "el espectro contiene valores no finitos"
+    return None
+
+
+class CalibrationStore:
+    """
+    Latest dark and reference spectra per instrument configuration.
+    """
+
+    def __init__(self, root=CALIBRATION_DIR, ttl=DEFAULT_TTL):
+        self.root = root
+        self.ttl = ttl
+        self.records = {}
+        self.responses = {}
+        self.lock = threading.Lock()
+
+    def _paths(self, key, kind):
+        base = os.path.join(self.root, key, kind)
+        return f"{base}.npy", f"{base}.json"
+
+    def put(self, kind, instrument, sensitivity, wavelength_start, wavelength_end,
+            wavelengths, intensities, timestamp=None, db=True):
+        """
+        Store a dark or reference spectrum, replacing the previous one.
+
+        Args:
+            kind (str): "dark" or "reference"
+            instrument (str): Instrument identifier
+            sensitivity (str): Sensitivity setting
+            wavelength_start (float): Start wavelength in nm
+            wavelength_end (float): End wavelength in nm
+            wavelengths (array-like): Wavelength values
+            intensities (array-like): Intensity values
+            timestamp (float): Acquisition time, defaults to now
+            db (bool): Whether the intensities are in dB (e.g. dBm) rather than linear
+
+        Returns:
+            dict: Stored calibration record
+
+        Raises:
+            ValueError: If the kind is unknown or the spectrum is not usable
+        """
+        if kind not in CALIBRATION_KINDS:
+            raise ValueError(f"Unknown calibration kind: {kind}")
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        intensities = np.asarray(intensities, dtype=np.float64)
+        problem = check_spectrum(wavelengths, intensities)
+        if problem:
+            raise ValueError(f"Calibración no válida: {problem}")
+
+        key = calibration_key(instrument, sensitivity, wavelength_start, wavelength_end)
+        record = {
+            "kind": kind,
+            "instrument": instrument,
+            "sensitivity": sensitivity,
+            "wavelength_start": float(wavelength_start),
+            "wavelength_end": float(wavelength_end),
+            "timestamp": time.time() if timestamp is None else float(timestamp),
+            "db": bool(db),
+        }
+        array_path, meta_path = self._paths(key, kind)
+        write_array(array_path, np.vstack([wavelengths, intensities]))
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, meta_path)
+
+        record = dict(record, wavelengths=wavelengths, intensities=intensities)
+        with self.lock:
+            self.records[(key, kind)] = (os.stat(meta_path).st_mtime_ns, record)
+            self.responses = {k: v for k, v in self.responses.items() if k[0] != key}
+        return record
+
+    def _load(self, key, kind):
+        # The files are the reference: another worker process may have
+        # replaced or removed the calibration since it was cached here
+        array_path, meta_path = self._paths(key, kind)
+        try:
+            mtime_ns = os.stat(meta_path).st_mtime_ns
+        except OSError:
+            with self.lock:
+                self.records.pop((key, kind), None)
+            return None
+        with self.lock:
+            cached = self.records.get((key, kind))
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        if not os.path.exists(array_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            record = json.load(f)
+        array = np.load(array_path)
+        # Calibrations stored before the unit was recorded come from the OSA, in dBm
+        record.setdefault("db", True)
+        record.update(wavelengths=array[0], intensities=array[1])
+        with self.lock:
+            self.records[(key, kind)] = (mtime_ns, record)
+        return record
+
+    def get(self, kind, instrument, sensitivity, wavelength_start, wavelength_end, now=None):
+        """
+        Get a calibration spectrum if it exists and has not expired.
+
+        Args:
+            kind (str): "dark" or "reference"
+            instrument (str): Instrument identifier
+            sensitivity (str): Sensitivity setting
+            wavelength_start (float): Start wavelength in nm
+            wavelength_end (float): End wavelength in nm
+            now (float): Current time, defaults to ``time.time()``
+
+        Returns:
+            dict: Calibration record, or None if missing or expired
+        """
+        key = calibration_key(instrument, sensitivity, wavelength_start, wavelength_end)
+        record = self._load(key, kind)
+        if record is None:
+            return None
+        now = time.time() if now is None else now
+        if now - record["timestamp"] > self.ttl:
+            return None
+        return record
+
+    def status(self, instrument, sensitivity, wavelength_start, wavelength_end, now=None):
+        """
+        Describe the calibrations available for a configuration.
+
+        Args:
+            instrument (str): Instrument identifier
+            sensitivity (str): Sensitivity setting
+            wavelength_start (float): Start wavelength in nm
+            wavelength_end (float): End wavelength in nm
+            now (float): Current time, defaults to ``time.time()``
+
+        Returns:
+            dict: For each kind, None if missing or a dict with "age" (s) and "expired"
+        """
+        key = calibration_key(instrument, sensitivity, wavelength_start, wavelength_end)
+        now = time.time() if now is None else now
+        status = {}
+        for kind in CALIBRATION_KINDS:
+            record = self._load(key, kind)
+            if record is None:
+                status[kind] = None
+            else:
+                age = now - record["timestamp"]
+                status[kind] = {"age": age, "expired": age > self.ttl}
+        return status
+
+    def invalidate(self, instrument, sensitivity, wavelength_start, wavelength_end):
+        """
+        Remove the calibrations of a configuration from memory and disk.
+
+        Args:
+            instrument (str): Instrument identifier
+            sensitivity (str): Sensitivity setting
+            wavelength_start (float): Start wavelength in nm
+            wavelength_end (float): End wavelength in nm
+        """
+        key = calibration_key(instrument, sensitivity, wavelength_start, wavelength_end)
+        with self.lock:
+            for kind in CALIBRATION_KINDS:
+                self.records.pop((key, kind), None)
+            self.responses = {k: v for k, v in self.responses.items() if k[0] != key}
+        for kind in CALIBRATION_KINDS:
+            for path in self._paths(key, kind):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _on_grid(self, record, wavelengths):
+        # Linear power on the sample grid
+        source = record["wavelengths"]
+        values = db_to_linear(record["intensities"]) if record.get("db", True) else record["intensities"]
+        if source.shape == wavelengths.shape and np.array_equal(source, wavelengths):
+            return values
+        low, high = np.min(source), np.max(source)
+        if wavelengths.min() < low or wavelengths.max() > high:
+            raise CalibrationUnavailable(
+                "El rango de la calibración no cubre la medición; adquiera una nueva referencia."
+            )
+        return get_resampler(source, wavelengths).apply(values)
+
+    def _response(self, key, reference, dark, wavelengths):
+        cache_key = (
+            key,
+            reference["timestamp"],
+            dark["timestamp"] if dark is not None else None,
+            wavelengths.shape[0],
+            float(wavelengths[0]),
+            float(wavelengths[-1]),
+        )
+        with self.lock:
+            cached = self.responses.get(cache_key)
+        if cached is not None and np.array_equal(cached[0], wavelengths):
+            return cached[1], cached[2]
+
+        reference_y = self._on_grid(reference, wavelengths)
+        offset = self._on_grid(dark, wavelengths) if dark is not None else np.zeros_like(wavelengths)
+        response = reference_y - offset
+        valid = response > np.finfo(np.float64).eps * np.maximum(np.abs(reference_y), 1.0)
+        if np.count_nonzero(valid) < MIN_VALID_FRACTION * response.shape[0]:
+            raise CalibrationUnavailable(
+                "La referencia no supera el nivel de oscuridad; adquiera una nueva referencia."
+            )
+        inverse = np.full_like(response, np.nan)
+        np.divide(1.0, response, out=inverse, where=valid)
+        offset.flags.writeable = False
+        inverse.flags.writeable = False
+        with self.lock:
+            self.responses[cache_key] = (wavelengths.copy(), offset, inverse)
+            while len(self.responses) > MAX_RESPONSES:
+                del self.responses[next(iter(self.responses))]
+        return offset, inverse
+
+    def correct(self, wavelengths, intensities, instrument, sensitivity, wavelength_start, wavelength_end,
+                now=None, out=None, db=True):
+        """
+        Apply the dark and reference correction to a measurement.
+
+        The dark spectrum is optional; without it only the reference is used.
+        Spectra in dB are converted to linear power first, and the result is
+        the linear ratio to the reference. Points where the reference does
+        not rise above the dark level are NaN.
+
+        Args:
+            wavelengths (array-like): Wavelength values of the measurement
+            intensities (array-like): Measured intensities (one spectrum or a stack)
+            instrument (str): Instrument identifier
+            sensitivity (str): Sensitivity setting
+            wavelength_start (float): Start wavelength in nm
+            wavelength_end (float): End wavelength in nm
+            now (float): Current time, defaults to ``time.time()``
+            out (numpy.ndarray): Optional output array
+            db (bool): Whether the intensities are in dB (e.g. dBm) rather than linear
+
+        Returns:
+            tuple: Corrected intensities and a dict with the calibration timestamps
+
+        Raises:
+            CalibrationUnavailable: If there is no valid reference for the configuration
+        """
+        reference = self.get("reference", instrument, sensitivity, wavelength_start, wavelength_end, now)
+        if reference is None:
+            raise CalibrationUnavailable("No hay una referencia vigente para esta configuración.")
+        dark = self.get("dark", instrument, sensitivity, wavelength_start, wavelength_end, now)
+
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        key = calibration_key(instrument, sensitivity, wavelength_start, wavelength_end)
+        offset, inverse = self._response(key, reference, dark, wavelengths)
+
+        intensities = np.asarray(intensities, dtype=np.float64)
+        if db:
+            intensities = db_to_linear(intensities, out=out)
+        out = np.subtract(intensities, offset, out=out)
+        np.multiply(out, inverse, out=out)
+        info = {
+            "reference_timestamp": reference["timestamp"],
+            "dark_timestamp": dark["timestamp"] if dark is not None else None,
+        }
+        return out, info
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_calibration_store(root=CALIBRATION_DIR, ttl=DEFAULT_TTL):
+    """
+    Get the shared calibration store, creating it on first use.
+
+    Args:
+        root (str): Directory used if the store is created
+        ttl (float): Validity in seconds used if the store is created
+
+    Returns:
+        CalibrationStore: The process-wide calibration store
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CalibrationStore(root=root, ttl=ttl)
+        return _store
@@ -0,0 +1,629 @@
+"""
+Chemometrics over spectrum archives: incremental PCA and PLS regression.
+
+Spectra are read from a ``SpectrumArchive`` in chunks, resampled onto a
+canonical wavelength grid and preprocessed (SNV, MSC or none) before being fed
+to the models, so memory use is bounded by the chunk size and never by the
+size of the archive:
+
+- ``IncrementalPCA`` updates a truncated SVD of the mean-centred data with
+  every chunk (Ross et al., "Incremental learning for robust visual tracking").
+- ``IncrementalPLS`` accumulates the cross-product matrices ``X'X`` and
+  ``X'Y`` and fits them with the kernel PLS algorithm (Dayal & MacGregor), so
+  the result is the same as a PLS fit on the whole matrix.
+
+Fitted models are saved to disk and project new spectra with one resampling
+and one matrix product, which is cheap enough to run on every acquisition.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.resampling import common_grid, get_resampler
+from utils.spectral_ops import wavenumber_to_wavelength
+from utils.spectrum_archive import write_array
+
+PREPROCESSING_METHODS = ("none", "snv", "msc")
+
+# Quantity the model is fitted on: the measured intensities or the spectra
+# corrected with the dark/reference calibration (linear ratio)
+INPUT_DOMAINS = ("raw", "corrected")
+
+MODEL_FILE = "model.json"
+
+# Model used to project spectra as they are acquired, if it exists
+DEFAULT_MODEL_DIR = ".osa_models"
+
+# Spectra read from the archive and processed together
+DEFAULT_CHUNK_SIZE = 512
+
+
+def snv(y, out=None):
+    """
+    Standard normal variate: centre and scale each spectrum.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        out (numpy.ndarray): Optional output array (may be ``y``)
+
+    Returns:
+        numpy.ndarray: Transformed spectra, same shape as ``y``
+    """
+    y = np.asarray(y, dtype=np.float64)
+    mean = y.mean(axis=-1, keepdims=True)
+    std = y.std(axis=-1, ddof=1, keepdims=True) if y.shape[-1] > 1 else np.ones_like(mean)
+    std[std == 0] = 1.0
+    out = np.subtract(y, mean, out=out)
+    return np.divide(out, std, out=out)
+
+
+def msc(y, reference, out=None):
+    """
+    Multiplicative scatter correction against a reference spectrum.
+
+    Each spectrum is regressed on the reference (``y = a + b * reference``)
+    and corrected as ``(y - a) / b``.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        reference (numpy.ndarray): Reference spectrum, usually the mean of the training set
+        out (numpy.ndarray): Optional output array (may be ``y``)
+
+    Returns:
+        numpy.ndarray: Corrected spectra, same shape as ``y``
+    """
+    y = np.asarray(y, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    centred_reference = reference - reference.mean()
+    denominator = centred_reference @ centred_reference
+    if denominator == 0:
+        raise ValueError("The MSC reference spectrum is flat")
+    slope = (y @ centred_reference) / denominator
+    intercept = y.mean(axis=-1) - slope * reference.mean()
+    slope = np.where(slope == 0, 1.0, slope)
+    out = np.subtract(y, intercept[..., None], out=out)
+    return np.divide(out, slope[..., None], out=out)
+
+
+def _preprocess(y, method, reference):
+    if method == "snv":
+        return snv(y, out=y)
+    if method == "msc":
+        return msc(y, reference, out=y)
+    if method == "none":
+        return y
+    raise ValueError(f"Unknown preprocessing method: {method}")
+
+
+def iter_archive_chunks(archive, grid, chunk_size=DEFAULT_CHUNK_SIZE, entries=None):
+    """
+    Read spectra from an archive in chunks resampled onto a grid.
+
+    DPT entries are converted to nm first. Spectra that do not cover the whole
+    grid are skipped, since the models need complete rows.
+
+    Args:
+        archive (SpectrumArchive): Source archive
+        grid (numpy.ndarray): Target wavelength grid in nm
+        chunk_size (int): Maximum number of spectra per chunk
+        entries (list): Catalog entries to read, defaults to the whole archive
+
+    Yields:
+        tuple: Sources of the rows, ``(k, len(grid))`` array and number of skipped spectra
+    """
+    entries = archive.entries() if entries is None else entries
+    for start in range(0, len(entries), chunk_size):
+        batch = entries[start:start + chunk_size]
+        block = np.empty((len(batch), grid.shape[0]))
+        sources = []
+        skipped = 0
+        for entry in batch:
+            x, y = archive.load(entry["key"])
+            if entry["kind"] == "dpt":
+                x = wavenumber_to_wavelength(x)
+            row = block[len(sources)]
+            get_resampler(x, grid).apply(np.asarray(y, dtype=np.float64), out=row)
+            if np.isnan(row).any():
+                skipped += 1
+                continue
+            sources.append(entry["source"])
+        yield sources, block[:len(sources)], skipped
+
+
+class _ArchiveModel:
+    """
+    Shared grid handling, preprocessing and persistence of the models.
+
+    Subclasses define ``kind`` and ``_arrays``, which returns the fitted
+    arrays to save by name.
+    """
+
+    kind = None
+
+    def __init__(self, n_components, grid_start=900.0, grid_stop=2500.0, n_points=1601, preprocessing="snv",
+                 input_domain="raw"):
+        if preprocessing not in PREPROCESSING_METHODS:
+            raise ValueError(f"Unknown preprocessing method: {preprocessing}")
+        if input_domain not in INPUT_DOMAINS:
+            raise ValueError(f"Unknown input domain: {input_domain}")
+        self.n_components = int(n_components)
+        self.grid = common_grid(grid_start, grid_stop, n_points)
+        self.preprocessing = preprocessing
+        self.input_domain = input_domain
+        self.reference = None
+        self.n_samples_seen = 0
+
+    def set_reference(self, reference):
+        """
+        Set the mean training spectrum, used as the MSC reference.
+
+        Args:
+            reference (numpy.ndarray): Reference spectrum on the model grid
+        """
+        self.reference = np.asarray(reference, dtype=np.float64)
+
+    def prepare(self, x, y, kind="csv"):
+        """
+        Resample and preprocess spectra the same way as the training data.
+
+        Points of the grid not covered by the spectrum are filled with the
+        mean training spectrum (or the nearest measured value if the model has
+        none), which keeps their contribution to the projection small.
+
+        Args:
+            x (array-like): X axis (nm, or cm^-1 if ``kind`` is "dpt")
+            y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+            kind (str): "dpt" for wavenumber axes, "csv" for wavelength axes
+
+        Returns:
+            numpy.ndarray: Preprocessed spectra on the model grid, shape ``(k, n_points)``
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if kind == "dpt":
+            x = wavenumber_to_wavelength(x)
+        rows = np.atleast_2d(get_resampler(x, self.grid).apply(np.asarray(y, dtype=np.float64)))
+        missing = np.isnan(rows)
+        if missing.any():
+            if self.reference is not None:
+                rows[missing] = np.broadcast_to(self.reference, rows.shape)[missing]
+            else:
+                index = np.arange(rows.shape[1])
+                for row, row_missing in zip(rows, missing):
+                    if row_missing.all():
+                        raise ValueError("The spectrum does not overlap the model grid")
+                    row[row_missing] = np.interp(index[row_missing], index[~row_missing], row[~row_missing])
+        return self.preprocess(rows)
+
+    def preprocess(self, rows):
+        """
+        Apply the model preprocessing to spectra already on the model grid.
+
+        Args:
+            rows (numpy.ndarray): Spectra on the model grid (modified in place if float64)
+
+        Returns:
+            numpy.ndarray: Preprocessed spectra
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if self.preprocessing == "msc" and self.reference is None:
+            raise ValueError("MSC preprocessing needs a reference spectrum")
+        return _preprocess(rows, self.preprocessing, self.reference)
+
+    def _metadata(self):
+        return {}
+
+    def save(self, directory):
+        """
+        Persist the model to a directory.
+
+        Args:
+            directory (str): Destination directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = dict(self._arrays())
+        if self.reference is not None:
+            arrays["reference"] = self.reference
+        for name, array in arrays.items():
+            write_array(os.path.join(directory, f"{name}.npy"), array)
+        metadata = {
+            "kind": self.kind,
+            "n_components": self.n_components,
+            "grid": [float(self.grid[0]), float(self.grid[-1]), int(self.grid.shape[0])],
+            "preprocessing": self.preprocessing,
+            "input_domain": self.input_domain,
+            "n_samples_seen": self.n_samples_seen,
+            "arrays": sorted(arrays),
+            "saved_at": time.time(),
+        }
+        metadata.update(self._metadata())
+        tmp_path = os.path.join(directory, MODEL_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, os.path.join(directory, MODEL_FILE))
+
+
+class IncrementalPCA(_ArchiveModel):
+    """
+    Principal component analysis fitted chunk by chunk.
+    """
+
+    kind = "pca"
+
+    def __init__(self, n_components, grid_start=900.0, grid_stop=2500.0, n_points=1601, preprocessing="snv",
+                 input_domain="raw"):
+        super().__init__(n_components, grid_start, grid_stop, n_points, preprocessing, input_domain)
+        self.mean = None
+        self.components = None
+        self.singular_values = None
+        self.total_variance = 0.0
+        self._sum_squares = None
+
+    def partial_fit(self, rows):
+        """
+        Update the model with a chunk of preprocessed spectra.
+
+        Args:
+            rows (numpy.ndarray): Preprocessed spectra on the model grid, shape ``(k, n_points)``
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        n_batch = rows.shape[0]
+        if n_batch == 0:
+            return
+        n_total = self.n_samples_seen + n_batch
+        batch_mean = rows.mean(axis=0)
+        centred = rows - batch_mean
+
+        if self.mean is None:
+            stacked = centred
+            self.mean = batch_mean
+            self._sum_squares = (centred * centred).sum(axis=0)
+        else:
+            # Previous basis scaled by its singular values, the new centred
+            # rows and a row accounting for the shift of the mean
+            shift = np.sqrt(self.n_samples_seen * n_batch / n_total) * (self.mean - batch_mean)
+            stacked = np.vstack([self.singular_values[:, None] * self.components, centred, shift])
+            self._sum_squares += (centred * centred).sum(axis=0) + shift * shift
+            self.mean = self.mean + (batch_mean - self.mean) * (n_batch / n_total)
+
+        _, singular_values, vt = np.linalg.svd(stacked, full_matrices=False)
+        keep = min(self.n_components, vt.shape[0])
+        # Fix the sign so that repeated fits give comparable scores
+        signs = np.sign(vt[:keep, np.argmax(np.abs(vt[:keep]), axis=1)].diagonal())
+        signs[signs == 0] = 1.0
+        self.components = vt[:keep] * signs[:, None]
+        self.singular_values = singular_values[:keep]
+        self.n_samples_seen = n_total
+        self.total_variance = float(self._sum_squares.sum() / max(n_total - 1, 1))
+
+    @property
+    def explained_variance(self):
+        """numpy.ndarray: Variance captured by each component."""
+        return self.singular_values ** 2 / max(self.n_samples_seen - 1, 1)
+
+    @property
+    def explained_variance_ratio(self):
+        """numpy.ndarray: Fraction of the total variance captured by each component."""
+        return self.explained_variance / (self.total_variance or 1.0)
+
+    def transform(self, rows):
+        """
+        Project preprocessed spectra onto the principal components.
+
+        Args:
+            rows (numpy.ndarray): Preprocessed spectra on the model grid
+
+        Returns:
+            numpy.ndarray: Scores, shape ``(k, n_components)``
+        """
+        return (np.atleast_2d(rows) - self.mean) @ self.components.T
+
+    def project(self, x, y, kind="csv"):
+        """
+        Compute the scores of raw spectra.
+
+        Args:
+            x (array-like): X axis (nm, or cm^-1 if ``kind`` is "dpt")
+            y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+            kind (str): "dpt" or "csv"
+
+        Returns:
+            numpy.ndarray: Scores, shape ``(k, n_components)``
+        """
+        return self.transform(self.prepare(x, y, kind))
+
+    def _arrays(self):
+        return {
+            "mean": self.mean,
+            "components": self.components,
+            "singular_values": self.singular_values,
+            "sum_squares": self._sum_squares,
+        }
+
+    def _metadata(self):
+        return {"total_variance": self.total_variance}
+
+
+class IncrementalPLS(_ArchiveModel):
+    """
+    Partial least squares regression fitted from accumulated cross-products.
+    """
+
+    kind = "pls"
+
+    def __init__(self, n_components, grid_start=900.0, grid_stop=2500.0, n_points=1601, preprocessing="snv",
+                 target_names=None, input_domain="raw"):
+        super().__init__(n_components, grid_start, grid_stop, n_points, preprocessing, input_domain)
+        self.target_names = list(target_names or [])
+        self._sum_x = None
+        self._sum_y = None
+        self._sum_xx = None
+        self._sum_xy = None
+        self.x_mean = None
+        self.y_mean = None
+        self.coefficients = None
+        self.weights = None
+
+    def partial_fit(self, rows, targets):
+        """
+        Accumulate a chunk of preprocessed spectra and their target values.
+
+        Args:
+            rows (numpy.ndarray): Preprocessed spectra on the model grid, shape ``(k, n_points)``
+            targets (numpy.ndarray): Target values, shape ``(k,)`` or ``(k, n_targets)``
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        targets = np.asarray(targets, dtype=np.float64).reshape(rows.shape[0], -1)
+        if rows.shape[0] == 0:
+            return
+        if self._sum_x is None:
+            self._sum_x = np.zeros(rows.shape[1])
+            self._sum_y = np.zeros(targets.shape[1])
+            self._sum_xx = np.zeros((rows.shape[1], rows.shape[1]))
+            self._sum_xy = np.zeros((rows.shape[1], targets.shape[1]))
+        self._sum_x += rows.sum(axis=0)
+        self._sum_y += targets.sum(axis=0)
+        self._sum_xx += rows.T @ rows
+        self._sum_xy += rows.T @ targets
+        self.n_samples_seen += rows.shape[0]
+
+    def finalize(self):
+        """
+        Compute the regression from the accumulated statistics (kernel PLS).
+        """
+        n = self.n_samples_seen
+        if n < 2:
+            raise ValueError("PLS needs at least two spectra")
+        self.x_mean = self._sum_x / n
+        self.y_mean = self._sum_y / n
+        xtx = self._sum_xx - n * np.outer(self.x_mean, self.x_mean)
+        xty = self._sum_xy - n * np.outer(self.x_mean, self.y_mean)
+
+        n_features, n_targets = xty.shape
+        n_components = min(self.n_components, n_features, n - 1)
+        weights = np.zeros((n_features, n_components))
+        loadings = np.zeros((n_features, n_components))
+        y_loadings = np.zeros((n_targets, n_components))
+        for a in range(n_components):
+            if n_targets == 1:
+                w = xty[:, 0].copy()
+            else:
+                _, vectors = np.linalg.eigh(xty.T @ xty)
+                w = xty @ vectors[:, -1]
+            norm = np.linalg.norm(w)
+            if norm == 0:
+                n_components = a
+                break
+            w /= norm
+            r = w - weights[:, :a] @ (loadings[:, :a].T @ w)
+            xtx_r = xtx @ r
+            tt = r @ xtx_r
+            if tt <= 0:
+                n_components = a
+                break
+            p = xtx_r / tt
+            q = (r @ xty) / tt
+            xty = xty - tt * np.outer(p, q)
+            weights[:, a] = r
+            loadings[:, a] = p
+            y_loadings[:, a] = q
+
+        self.n_components = n_components
+        self.weights = weights[:, :n_components]
+        self.coefficients = self.weights @ y_loadings[:, :n_components].T
+
+    def transform(self, rows):
+        """
+        Compute the latent scores of preprocessed spectra.
+
+        Args:
+            rows (numpy.ndarray): Preprocessed spectra on the model grid
+
+        Returns:
+            numpy.ndarray: Scores, shape ``(k, n_components)``
+        """
+        return (np.atleast_2d(rows) - self.x_mean) @ self.weights
+
+    def predict(self, rows):
+        """
+        Predict the targets of preprocessed spectra.
+
+        Args:
+            rows (numpy.ndarray): Preprocessed spectra on the model grid
+
+        Returns:
+            numpy.ndarray: Predictions, shape ``(k, n_targets)``
+        """
+        return (np.atleast_2d(rows) - self.x_mean) @ self.coefficients + self.y_mean
+
+    def project(self, x, y, kind="csv"):
+        """
+        Predict the targets of raw spectra.
+
+        Args:
+            x (array-like): X axis (nm, or cm^-1 if ``kind`` is "dpt")
+            y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+            kind (str): "dpt" or "csv"
+
+        Returns:
+            numpy.ndarray: Predictions, shape ``(k, n_targets)``
+        """
+        return self.predict(self.prepare(x, y, kind))
+
+    def _arrays(self):
+        return {
+            "x_mean": self.x_mean,
+            "y_mean": self.y_mean,
+            "coefficients": self.coefficients,
+            "weights": self.weights,
+        }
+
+    def _metadata(self):
+        return {"target_names": self.target_names}
+
+
+def mean_spectrum(archive, grid, chunk_size=DEFAULT_CHUNK_SIZE, entries=None):
+    """
+    Mean spectrum of an archive on a grid, used as the MSC reference.
+
+    Args:
+        archive (SpectrumArchive): Source archive
+        grid (numpy.ndarray): Wavelength grid in nm
+        chunk_size (int): Spectra read per chunk
+        entries (list): Catalog entries to use, defaults to the whole archive
+
+    Returns:
+        numpy.ndarray: Mean spectrum
+    """
+    total = np.zeros(grid.shape[0])
+    count = 0
+    for _, block, _ in iter_archive_chunks(archive, grid, chunk_size, entries):
+        total += block.sum(axis=0)
+        count += block.shape[0]
+    if count == 0:
+        raise ValueError("No spectrum in the archive covers the model grid")
+    return total / count
+
+
+def fit_pca_archive(archive, model, chunk_size=DEFAULT_CHUNK_SIZE, entries=None):
+    """
+    Fit an ``IncrementalPCA`` over an archive, one chunk at a time.
+
+    Args:
+        archive (SpectrumArchive): Source archive
+        model (IncrementalPCA): Model to fit
+        chunk_size (int): Spectra read per chunk
+        entries (list): Catalog entries to use, defaults to the whole archive
+
+    Returns:
+        int: Number of spectra skipped because they do not cover the grid
+    """
+    if model.preprocessing == "msc" and model.reference is None:
+        model.set_reference(mean_spectrum(archive, model.grid, chunk_size, entries))
+    skipped = 0
+    raw_total = np.zeros(model.grid.shape[0])
+    for _, block, n_skipped in iter_archive_chunks(archive, model.grid, chunk_size, entries):
+        raw_total += block.sum(axis=0)
+        model.partial_fit(model.preprocess(block))
+        skipped += n_skipped
+    if model.reference is None and model.n_samples_seen:
+        model.set_reference(raw_total / model.n_samples_seen)
+    return skipped
+
+
+def fit_pls_archive(archive, model, targets, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fit an ``IncrementalPLS`` over the archive spectra that have target values.
+
+    Args:
+        archive (SpectrumArchive): Source archive
+        model (IncrementalPLS): Model to fit
+        targets (dict): Target values by source path
+        chunk_size (int): Spectra read per chunk
+
+    Returns:
+        int: Number of labelled spectra skipped because they do not cover the grid
+    """
+    entries = [entry for entry in archive.entries() if entry["source"] in targets]
+    if model.preprocessing == "msc" and model.reference is None:
+        model.set_reference(mean_spectrum(archive, model.grid, chunk_size, entries))
+    skipped = 0
+    raw_total = np.zeros(model.grid.shape[0])
+    for sources, block, n_skipped in iter_archive_chunks(archive, model.grid, chunk_size, entries):
+        raw_total += block.sum(axis=0)
+        model.partial_fit(model.preprocess(block), np.array([targets[s] for s in sources]))
+        skipped += n_skipped
+    if model.reference is None and model.n_samples_seen:
+        model.set_reference(raw_total / model.n_samples_seen)
+    model.finalize()
+    return skipped
+
+
+def load_model(directory):
+    """
+    Load a model saved with ``save``.
+
+    Args:
+        directory (str): Model directory
+
+    Returns:
+        IncrementalPCA or IncrementalPLS: The loaded model
+    """
+    with open(os.path.join(directory, MODEL_FILE), encoding="utf-8") as f:
+        metadata = json.load(f)
+    start, stop, n_points = metadata["grid"]
+    # Models saved before the input domain was recorded were fitted on raw spectra
+    input_domain = metadata.get("input_domain", "raw")
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy")) for name in metadata["arrays"]}
+    if metadata["kind"] == "pca":
+        model = IncrementalPCA(metadata["n_components"], start, stop, n_points, metadata["preprocessing"],
+                               input_domain)
+        model.mean = arrays["mean"]
+        model.components = arrays["components"]
+        model.singular_values = arrays["singular_values"]
+        model._sum_squares = arrays["sum_squares"]
+        model.total_variance = metadata["total_variance"]
+    elif metadata["kind"] == "pls":
+        model = IncrementalPLS(metadata["n_components"], start, stop, n_points, metadata["preprocessing"],
+                               metadata["target_names"], input_domain)
+        model.x_mean = arrays["x_mean"]
+        model.y_mean = arrays["y_mean"]
+        model.coefficients = arrays["coefficients"]
+        model.weights = arrays["weights"]
+    else:
+        raise ValueError(f"Unknown model kind: {metadata['kind']}")
+    model.n_samples_seen = metadata["n_samples_seen"]
+    if "reference" in arrays:
+        model.reference = arrays["reference"]
+    return model
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(directory):
+    """
+    Get a saved model, reloading it only when its files change.
+
+    Args:
+        directory (str): Model directory
+
+    Returns:
+        IncrementalPCA or IncrementalPLS: The model, or None if the directory has no model
+    """
+    path = os.path.join(directory, MODEL_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _models_lock:
+        cached = _models.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+    model = load_model(directory)
+    with _models_lock:
+        _models[directory] = (mtime_ns, model)
+    return model
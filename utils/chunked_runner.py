@@ -0,0 +1,164 @@
+"""
+Out-of-core execution of processing recipes over very large datasets.
+
+Spectra are streamed from DPT/CSV files or from a binary archive, grouped into
+blocks of at most ``chunk_size`` spectra that share the same x axis, processed
+as one ``(k, n)`` stack by ``apply_recipe`` and written to the output archive
+block by block. Only one block is held in memory at a time, so memory use
+depends on the chunk size and not on the size of the dataset.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from utils.batch_runner import output_kind
+from utils.recipes import apply_recipe
+from utils.spectrum_archive import read_spectrum_file
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Labels used for the I/O stages in the timing report
+READ_LABEL = "lectura"
+WRITE_LABEL = "escritura"
+
+
+def iter_file_spectra(source_root, files, errors=None):
+    """
+    Stream spectra from DPT/CSV files.
+
+    Args:
+        source_root (str): Root directory of the inputs
+        files (list): Tuples of (relative path, size, mtime_ns)
+        errors (list): Optional list collecting (source, message) for unreadable files
+
+    Yields:
+        tuple: Source, kind, x array, intensity array, size and mtime_ns
+    """
+    for source, size, mtime_ns in files:
+        try:
+            kind, x, y = read_spectrum_file(os.path.join(source_root, source))
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append((source, str(e)))
+            continue
+        yield source, kind, x, y, size, mtime_ns
+
+
+def iter_archive_spectra(archive, entries=None):
+    """
+    Stream spectra from a binary archive (memory-mapped).
+
+    Args:
+        archive (SpectrumArchive): Source archive
+        entries (list): Catalog entries to read, defaults to the whole archive
+
+    Yields:
+        tuple: Source, kind, x array, intensity array, size and mtime_ns
+    """
+    for entry in archive.entries() if entries is None else entries:
+        x, y = archive.load(entry["key"])
+        yield entry["source"], entry["kind"], x, y, entry["size"], entry["mtime_ns"]
+
+
+def iter_blocks(spectra, chunk_size=DEFAULT_CHUNK_SIZE, timings=None):
+    """
+    Group a stream of spectra into stacks sharing the same x axis.
+
+    A block ends when it is full or when the next spectrum has a different
+    kind or x axis. The stack buffer is reused between blocks, so each block
+    must be consumed before the next one is requested.
+
+    Args:
+        spectra (iterable): Tuples as yielded by ``iter_file_spectra``
+        chunk_size (int): Maximum number of spectra per block
+        timings (dict): Optional dictionary accumulating the reading time
+
+    Yields:
+        dict: Block with "kind", "x", "y" (``(k, n)`` stack) and "items" (source, size, mtime_ns)
+    """
+    iterator = iter(spectra)
+    buffer = None
+    block_x = None
+    block_kind = None
+    items = []
+
+    def flush():
+        return {"kind": block_kind, "x": block_x, "y": buffer[:len(items)], "items": list(items)}
+
+    while True:
+        start = time.perf_counter()
+        spectrum = next(iterator, None)
+        if timings is not None:
+            timings[READ_LABEL] = timings.get(READ_LABEL, 0.0) + time.perf_counter() - start
+        if spectrum is None:
+            break
+        source, kind, x, y, size, mtime_ns = spectrum
+
+        same_grid = (
+            items and kind == block_kind and x.shape == block_x.shape and np.array_equal(x, block_x)
+        )
+        if items and (not same_grid or len(items) == chunk_size):
+            yield flush()
+            items.clear()
+        if not items:
+            block_kind = kind
+            block_x = np.array(x, dtype=np.float64)
+            if buffer is None or buffer.shape[1] != x.shape[0]:
+                buffer = np.empty((chunk_size, x.shape[0]))
+        buffer[len(items)] = y
+        items.append((source, size, mtime_ns))
+
+    if items:
+        yield flush()
+
+
+def run_recipe_chunked(recipe, spectra, output, chunk_size=DEFAULT_CHUNK_SIZE, timings=None, on_block=None,
+                       errors=None):
+    """
+    Apply a recipe to a stream of spectra block by block.
+
+    Args:
+        recipe (list): Parsed recipe
+        spectra (iterable): Tuples as yielded by ``iter_file_spectra`` or ``iter_archive_spectra``
+        output (SpectrumArchive): Archive receiving the processed spectra
+        chunk_size (int): Maximum number of spectra per block
+        timings (dict): Optional dictionary accumulating seconds per stage
+        on_block (callable): Called as ``on_block(n_spectra, n_bytes)`` after each block is written
+        errors (list): Optional list collecting (source, message) for the spectra of failed
+            blocks; without it the first failure is raised
+
+    Returns:
+        dict: Number of spectra and blocks processed and the largest block size in bytes
+    """
+    timings = {} if timings is None else timings
+    stats = {"spectra": 0, "blocks": 0, "max_block_bytes": 0}
+    for block in iter_blocks(spectra, chunk_size, timings):
+        try:
+            x, y = apply_recipe(recipe, block["x"], block["y"], timings)
+            y = y.reshape(len(block["items"]), -1)
+            if y.shape[1] != x.shape[0] or x.shape[0] == 0:
+                raise ValueError("The recipe must produce one intensity value per wavelength")
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.extend((source, str(e)) for source, _, _ in block["items"])
+            continue
+
+        start = time.perf_counter()
+        kind = output_kind(block["kind"], recipe)
+        n_bytes = 0
+        for row, (source, size, mtime_ns) in zip(y, block["items"]):
+            output.add(source, kind, x, row, size=size, mtime_ns=mtime_ns, commit=False)
+            n_bytes += size
+        output.commit()
+        timings[WRITE_LABEL] = timings.get(WRITE_LABEL, 0.0) + time.perf_counter() - start
+
+        stats["spectra"] += y.shape[0]
+        stats["blocks"] += 1
+        stats["max_block_bytes"] = max(stats["max_block_bytes"], block["y"].nbytes + y.nbytes)
+        if on_block is not None:
+            on_block(y.shape[0], n_bytes)
+    return stats
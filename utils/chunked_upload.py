@@ -0,0 +1,431 @@
+"""
+Chunked upload of CSV spectra into the server-side session store.
+
+The browser sends the file as raw binary chunks (``Blob.slice`` + ``fetch``)
+instead of reading it into a string and passing it through a ``dcc.Store``.
+Each chunk is parsed as it arrives, so only the parsed float arrays are kept
+and the file content never goes back to the browser; finishing the upload
+stores the spectrum and returns the same handle the page callbacks use.
+
+In multi-worker mode the chunks of one upload may reach different worker
+processes, so they are appended to a spool file in the shared directory and
+parsed when the upload finishes (``SpooledUploadManager``).
+
+Routes (registered with ``register_upload_routes``):
+    POST /upload/start               JSON {"name", "size", "session", "replaces"} -> {"upload_id", "chunk_size"}
+    PUT  /upload/<id>/chunk?offset=  Raw bytes of the file from ``offset``      -> {"received", "rows"}
+    POST /upload/<id>/finish                                                    -> {"name", "handle", "key", "rows"}
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+from utils.session_store import get_session_store, session_key
+from utils.shared_state import FileLock, multi_worker, shared_dir
+
+# Size of the chunks sent by the browser
+CHUNK_SIZE = 1024 * 1024
+
+# Largest file accepted
+MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+# Uploads without a chunk for this many seconds are discarded
+UPLOAD_TIMEOUT = 600.0
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(ValueError):
+    """Raised when an upload cannot continue; the message is shown to the user."""
+
+
+class IncrementalCSVParser:
+    """
+    Parse a wavelength/intensity CSV file from consecutive byte chunks.
+
+    The first line is the header, as in ``load_csv_file``: the columns named
+    "wavelength" and "intensity" are used, or the two columns of a two-column
+    file. Only complete lines are parsed; a partial last line is kept until
+    the next chunk arrives.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.columns = None
+        self.tail = b""
+        self.wavelengths = []
+        self.intensities = []
+        self.rows = 0
+        self.received = 0
+        # Digest of the whole file, used as the key of the processed spectrum
+        self.digest = hashlib.blake2b(digest_size=20)
+
+    def feed(self, chunk):
+        """
+        Parse the complete lines of a chunk.
+
+        Args:
+            chunk (bytes): Next bytes of the file
+
+        Raises:
+            UploadError: If the header or a value cannot be parsed
+        """
+        self.digest.update(chunk)
+        self.received += len(chunk)
+        data = self.tail + chunk
+        end = data.rfind(b"\n")
+        if end < 0:
+            self.tail = data
+            return
+        self.tail = data[end + 1:]
+        self._parse(data[:end + 1])
+
+    def finish(self):
+        """
+        Parse the last line and get the spectrum.
+
+        Returns:
+            tuple: Wavelength and intensity arrays
+
+        Raises:
+            UploadError: If the file has no data rows
+        """
+        if self.tail.strip():
+            self._parse(self.tail)
+        self.tail = b""
+        if self.rows == 0:
+            raise UploadError("El archivo CSV no contiene datos.")
+        return np.concatenate(self.wavelengths), np.concatenate(self.intensities)
+
+    @property
+    def key(self):
+        return self.digest.hexdigest()
+
+    def _parse(self, block):
+        if self.header is None:
+            end = block.find(b"\n")
+            self._read_header(block[:end if end >= 0 else len(block)])
+            block = block[end + 1:] if end >= 0 else b""
+            if not block.strip():
+                return
+        try:
+            values = pd.read_csv(
+                io.BytesIO(block), header=None, usecols=self.columns, dtype=np.float64
+            )
+        except pd.errors.EmptyDataError:
+            return
+        except ValueError as e:
+            raise UploadError(f"Valor no numérico cerca de la fila {self.rows + 2}: {e}")
+        self.wavelengths.append(values[self.columns[0]].to_numpy())
+        self.intensities.append(values[self.columns[1]].to_numpy())
+        self.rows += values.shape[0]
+
+    def _read_header(self, line):
+        self.header = [
+            name.strip().strip('"')
+            for name in line.decode("utf-8-sig", errors="replace").strip().split(",")
+        ]
+        if "wavelength" in self.header and "intensity" in self.header:
+            self.columns = [self.header.index("wavelength"), self.header.index("intensity")]
+        elif len(self.header) == 2:
+            self.columns = [0, 1]
+        else:
+            raise UploadError("CSV format not recognized. Expected columns: wavelength, intensity")
+
+
+class UploadManager:
+    """
+    Uploads in progress, each with its own incremental parser.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_bytes=MAX_UPLOAD_BYTES, timeout=UPLOAD_TIMEOUT):
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def start(self, name, size, session_id, replaces=None):
+        """
+        Begin an upload.
+
+        Args:
+            name (str): File name
+            size (int): File size in bytes
+            session_id (str): Browser session id
+            replaces (str): Handle of the spectrum the upload replaces
+
+        Returns:
+            str: Upload id
+
+        Raises:
+            UploadError: If the file is too large
+        """
+        if int(size) > self.max_bytes:
+            raise UploadError(f"El archivo supera el tamaño máximo de {self.max_bytes // (1024 * 1024)} MB.")
+        upload_id = secrets.token_hex(16)
+        with self.lock:
+            self._expire(time.time())
+            self.uploads[upload_id] = {
+                "name": name,
+                "size": int(size),
+                "session": session_key(session_id),
+                "replaces": replaces,
+                "parser": IncrementalCSVParser(),
+                "lock": threading.Lock(),
+                "touched": time.time(),
+            }
+        return upload_id
+
+    def add_chunk(self, upload_id, offset, chunk):
+        """
+        Parse the next chunk of an upload.
+
+        Args:
+            upload_id (str): Upload id returned by ``start``
+            offset (int): Position of the chunk in the file
+            chunk (bytes): Chunk content
+
+        Returns:
+            dict: Bytes received and rows parsed so far
+
+        Raises:
+            UploadError: If the upload is unknown, the chunk is out of order or cannot be parsed
+        """
+        upload = self._get(upload_id)
+        with upload["lock"]:
+            parser = upload["parser"]
+            # A chunk resent after a lost answer was already parsed
+            if offset + len(chunk) <= parser.received:
+                return {"received": parser.received, "rows": parser.rows}
+            if offset != parser.received:
+                raise UploadError("Fragmento fuera de orden; vuelva a cargar el archivo.")
+            if parser.received + len(chunk) > upload["size"]:
+                raise UploadError("El archivo es más grande de lo anunciado.")
+            try:
+                parser.feed(chunk)
+            except UploadError:
+                self._discard(upload_id)
+                raise
+            upload["touched"] = time.time()
+            return {"received": parser.received, "rows": parser.rows}
+
+    def finish(self, upload_id, session_id):
+        """
+        Complete an upload and keep the spectrum in the session store.
+
+        Args:
+            upload_id (str): Upload id returned by ``start``
+            session_id (str): Browser session id
+
+        Returns:
+            dict: Name, handle, content key and rows of the stored spectrum
+
+        Raises:
+            UploadError: If the upload is unknown or incomplete
+        """
+        upload = self._get(upload_id)
+        if session_key(session_id) != upload["session"]:
+            raise UploadError("La carga pertenece a otra sesión.")
+        with upload["lock"]:
+            self._discard(upload_id)
+            parser = upload["parser"]
+            if parser.received != upload["size"]:
+                raise UploadError("La carga del archivo no se completó.")
+            wavelength, intensity = parser.finish()
+        handle = get_session_store().put(
+            session_id,
+            {"wavelength": wavelength, "intensity": intensity},
+            metadata={"name": upload["name"]},
+            replaces=upload["replaces"],
+        )
+        return {"name": upload["name"], "handle": handle, "key": parser.key, "rows": parser.rows}
+
+    def _get(self, upload_id):
+        with self.lock:
+            self._expire(time.time())
+            upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise UploadError("La carga expiró o no existe; vuelva a cargar el archivo.")
+        return upload
+
+    def _discard(self, upload_id):
+        with self.lock:
+            self.uploads.pop(upload_id, None)
+
+    def _expire(self, now):
+        for upload_id in [u for u, e in self.uploads.items() if now - e["touched"] > self.timeout]:
+            del self.uploads[upload_id]
+
+
+class SpooledUploadManager(UploadManager):
+    """
+    Uploads in progress kept in a shared directory, for multi-worker servers.
+
+    Each upload is a directory with its description (``upload.json``), the
+    bytes received so far (``data``) and a lock file, so any worker can take
+    the next chunk. The file is parsed in ``CHUNK_SIZE`` blocks when the
+    upload finishes; parse errors are reported then.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_bytes=MAX_UPLOAD_BYTES, timeout=UPLOAD_TIMEOUT, root=None):
+        super().__init__(chunk_size, max_bytes, timeout)
+        self.root = root or shared_dir("uploads")
+
+    def start(self, name, size, session_id, replaces=None):
+        if int(size) > self.max_bytes:
+            raise UploadError(f"El archivo supera el tamaño máximo de {self.max_bytes // (1024 * 1024)} MB.")
+        self._expire(time.time())
+        upload_id = secrets.token_hex(16)
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(directory)
+        open(os.path.join(directory, "data"), "wb").close()
+        self._write_state(directory, {
+            "name": name,
+            "size": int(size),
+            "session": session_key(session_id),
+            "replaces": replaces,
+            "lines": 0,
+        })
+        return upload_id
+
+    def add_chunk(self, upload_id, offset, chunk):
+        directory = self._directory(upload_id)
+        with FileLock(os.path.join(directory, "lock")):
+            upload = self._read_state(directory)
+            data_path = os.path.join(directory, "data")
+            received = os.path.getsize(data_path)
+            rows = max(upload["lines"] - 1, 0)
+            # A chunk resent after a lost answer was already written
+            if offset + len(chunk) <= received:
+                return {"received": received, "rows": rows}
+            if offset != received:
+                raise UploadError("Fragmento fuera de orden; vuelva a cargar el archivo.")
+            if received + len(chunk) > upload["size"]:
+                raise UploadError("El archivo es más grande de lo anunciado.")
+            with open(data_path, "ab") as f:
+                f.write(chunk)
+            # Rows are counted by line breaks; they are parsed at the end
+            upload["lines"] += chunk.count(b"\n")
+            self._write_state(directory, upload)
+            return {"received": received + len(chunk), "rows": max(upload["lines"] - 1, 0)}
+
+    def finish(self, upload_id, session_id):
+        directory = self._directory(upload_id)
+        with FileLock(os.path.join(directory, "lock")):
+            upload = self._read_state(directory)
+            if session_key(session_id) != upload["session"]:
+                raise UploadError("La carga pertenece a otra sesión.")
+            try:
+                data_path = os.path.join(directory, "data")
+                if os.path.getsize(data_path) != upload["size"]:
+                    raise UploadError("La carga del archivo no se completó.")
+                parser = IncrementalCSVParser()
+                with open(data_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        parser.feed(chunk)
+                wavelength, intensity = parser.finish()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        handle = get_session_store().put(
+            session_id,
+            {"wavelength": wavelength, "intensity": intensity},
+            metadata={"name": upload["name"]},
+            replaces=upload["replaces"],
+        )
+        return {"name": upload["name"], "handle": handle, "key": parser.key, "rows": parser.rows}
+
+    def _directory(self, upload_id):
+        if not _UPLOAD_ID_PATTERN.match(upload_id) or not os.path.isdir(os.path.join(self.root, upload_id)):
+            raise UploadError("La carga expiró o no existe; vuelva a cargar el archivo.")
+        return os.path.join(self.root, upload_id)
+
+    def _read_state(self, directory):
+        try:
+            with open(os.path.join(directory, "upload.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("La carga expiró o no existe; vuelva a cargar el archivo.")
+
+    def _write_state(self, directory, upload):
+        tmp_path = os.path.join(directory, f"upload.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(upload, f)
+        os.replace(tmp_path, os.path.join(directory, "upload.json"))
+
+    def _expire(self, now):
+        for entry in os.scandir(self.root):
+            try:
+                if now - os.path.getmtime(os.path.join(entry.path, "upload.json")) > self.timeout:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_upload_manager():
+    """
+    Get the shared upload manager, creating it on first use.
+
+    Returns:
+        UploadManager: The process-wide upload manager (spooled to disk in multi-worker mode)
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SpooledUploadManager() if multi_worker() else UploadManager()
+        return _manager
+
+
+def register_upload_routes(server):
+    """
+    Add the chunked upload routes to a Flask server.
+
+    Args:
+        server (flask.Flask): Server of the Dash application
+    """
+    def error(e, status=400):
+        return jsonify({"error": str(e)}), status
+
+    @server.route("/upload/start", methods=["POST"])
+    def upload_start():
+        body = request.get_json(silent=True) or {}
+        manager = get_upload_manager()
+        try:
+            upload_id = manager.start(
+                body.get("name", "Desconocido"), body.get("size", 0),
+                body.get("session"), body.get("replaces")
+            )
+        except (UploadError, TypeError, ValueError) as e:
+            return error(e)
+        return jsonify({"upload_id": upload_id, "chunk_size": manager.chunk_size})
+
+    @server.route("/upload/<upload_id>/chunk", methods=["PUT"])
+    def upload_chunk(upload_id):
+        try:
+            offset = int(request.args.get("offset", 0))
+            return jsonify(get_upload_manager().add_chunk(upload_id, offset, request.get_data()))
+        except (UploadError, ValueError) as e:
+            return error(e)
+
+    @server.route("/upload/<upload_id>/finish", methods=["POST"])
+    def upload_finish(upload_id):
+        body = request.get_json(silent=True) or {}
+        try:
+            return jsonify(get_upload_manager().finish(upload_id, body.get("session")))
+        except UploadError as e:
+            return error(e)
@@ -0,0 +1,119 @@
+"""
+Content-addressed storage for saved spectra.
+
+Spectra are identified by a hash of their quantized data plus acquisition
+settings. Each distinct payload is written once under an objects directory and
+saved files are hard links to it, so repeated saves of the same trace do not
+duplicate data on disk.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Name of the objects directory created inside each save directory
+OBJECTS_DIR = ".osa_objects"
+
+# Decimal places kept when quantizing values before hashing, so that float
+# noise from JSON round trips does not produce different digests
+HASH_DECIMALS = 9
+
+
+def spectrum_digest(wavelengths, intensities, settings=None, decimals=HASH_DECIMALS):
+    """
+    Compute the content hash of a spectrum.
+
+    Args:
+        wavelengths (array-like): Wavelength values
+        intensities (array-like): Intensity values
+        settings (dict): Acquisition/processing settings that affect the content
+        decimals (int): Decimal places kept when quantizing the data
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    h = hashlib.sha256()
+    for values in (wavelengths, intensities):
+        array = np.round(np.asarray(values, dtype=np.float64), decimals)
+        # Normalize negative zeros so they hash like positive zeros
+        array += 0.0
+        h.update(str(array.shape).encode())
+        h.update(np.ascontiguousarray(array).tobytes())
+    h.update(json.dumps(settings or {}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ContentStore:
+    """
+    Directory of payloads addressed by digest.
+    """
+
+    def __init__(self, root, extension=".csv"):
+        self.root = root
+        self.extension = extension
+
+    def object_path(self, digest):
+        """
+        Get the path where the payload of a digest is stored.
+
+        Args:
+            digest (str): Content digest
+
+        Returns:
+            str: Path of the payload file
+        """
+        return os.path.join(self.root, "objects", digest[:2], digest + self.extension)
+
+    def contains(self, digest):
+        """
+        Check whether a payload is already stored.
+
+        Args:
+            digest (str): Content digest
+
+        Returns:
+            bool: True if the payload exists
+        """
+        return os.path.exists(self.object_path(digest))
+
+    def put(self, digest, write_payload):
+        """
+        Store a payload unless an identical one already exists.
+
+        Args:
+            digest (str): Content digest
+            write_payload (callable): Function receiving an open binary file to write into
+
+        Returns:
+            bool: True if the payload was already present (deduplicated)
+        """
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write_payload(f)
+        os.replace(tmp_path, path)
+        return False
+
+    def link(self, digest, destination):
+        """
+        Make ``destination`` refer to a stored payload.
+
+        A hard link is used when possible; on file systems that do not support
+        them the payload is copied instead.
+
+        Args:
+            digest (str): Content digest
+            destination (str): Path of the file to create or replace
+        """
+        tmp_path = f"{destination}.{os.getpid()}.lnk"
+        try:
+            os.link(self.object_path(digest), tmp_path)
+        except OSError:
+            shutil.copyfile(self.object_path(digest), tmp_path)
+        os.replace(tmp_path, destination)
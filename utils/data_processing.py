@@ -7,6 +7,8 @@ import plotly.express as px
 import io
 import numpy as np
 
+from utils.spectral_ops import process_dpt_arrays, normalize_minmax
+
 def load_dpt_file(file_path):
     """
     Load data from a DPT file.
@@ -26,27 +28,33 @@ def process_dpt_dataframe(df):
     """
     Process a DataFrame containing DPT data.
 
+    This is a thin adapter over ``process_dpt_arrays``; the input DataFrame is
+    not modified.
+
     Args:
         df (pandas.DataFrame): DataFrame with Wavelength and Intensity columns
 
     Returns:
         pandas.DataFrame: Processed DataFrame with Wavelength_nm, Reflectance, and Absorbance columns
     """
-    # Step 1: Convert Wavelength from cm^-1 to nanometers
-    df['Wavelength_nm'] = 1e7 / df['Wavelength']
-
-    # Step 2: Take only data up to 2500 nanometers
-    df = df[df['Wavelength_nm'] <= 2500].copy()
-
-    # Step 3: Normalize Intensity with respect to its maximum value
-    max_intensity = df['Intensity'].max()
-    df['Absorbance'] = df['Intensity'] / max_intensity
-
-    # Step 4: Compute Reflectance as 1 - Normalized_Intensity
-    df['Reflectance'] = 1 - df['Absorbance']
-
-    # Return the processed DataFrame with the new columns
-    return df[['Wavelength_nm', 'Reflectance', 'Absorbance']]
+    wavenumber = df['Wavelength'].to_numpy(dtype=np.float64)
+    intensity = df['Intensity'].to_numpy(dtype=np.float64)
+
+    # Convert to nm, crop to 2500 nm, normalize and compute reflectance
+    wavelength_nm, reflectance, absorbance = process_dpt_arrays(wavenumber, intensity, max_wavelength=2500)
+
+    # Keep the index labels of the rows that survived the crop
+    index = df.index[1e7 / wavenumber <= 2500]
+
+    return pd.DataFrame(
+        {
+            'Wavelength_nm': wavelength_nm,
+            'Reflectance': reflectance,
+            'Absorbance': absorbance,
+        },
+        index=index,
+        copy=False
+    )
 
 
 def create_figure(df):
@@ -110,14 +118,10 @@ def normalize_data(df):
     Returns:
         pandas.DataFrame: DataFrame with normalized intensity
     """
-    # Create a copy to avoid modifying the original
-    df_normalized = df.copy()
-
-    # Normalize intensity to [0, 1] range
-    min_intensity = df['intensity'].min()
-    max_intensity = df['intensity'].max()
+    # Shallow copy: the other columns share memory with the original
+    df_normalized = df.copy(deep=False)
 
-    if max_intensity > min_intensity:  # Avoid division by zero
-        df_normalized['intensity'] = (df['intensity'] - min_intensity) / (max_intensity - min_intensity)
+    # Normalize intensity to [0, 1] range (flat spectra are left unchanged)
+    df_normalized['intensity'] = normalize_minmax(df['intensity'].to_numpy(dtype=np.float64))
 
     return df_normalized
@@ -0,0 +1,222 @@
+"""
+Zoom-aware downsampling of spectra for display.
+
+Long traces are reduced to a few thousand points before being sent to the
+browser. Each spectrum gets a pyramid of min-max decimation levels (each level
+keeps the minimum and maximum of every bucket of the level below, so peaks
+survive), cached per spectrum. A view request picks the coarsest level that
+still has enough points inside the visible window and decimates only that
+slice, so zooming in progressively reveals the full-resolution data.
+"""
+
+import numpy as np
+
+from utils.processing_cache import LRUCache
+
+DOWNSAMPLING_METHODS = ("minmax", "lttb")
+
+# Points sent to the browser per trace
+DEFAULT_MAX_POINTS = 4000
+
+# Traces shorter than this are never decimated
+MIN_DECIMATION_POINTS = 2 * DEFAULT_MAX_POINTS
+
+pyramid_cache = LRUCache(max_entries=32, max_bytes=512 * 1024 * 1024)
+
+
+def minmax_indices(y, n_out):
+    """
+    Indices of the minimum and maximum of ``n_out // 2`` equal buckets.
+
+    Args:
+        y (numpy.ndarray): Values (1D)
+        n_out (int): Maximum number of indices returned
+
+    Returns:
+        numpy.ndarray: Sorted unique indices into ``y``
+    """
+    n = y.shape[0]
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.empty(buckets * size)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    blocks = padded.reshape(buckets, size)
+    # NaN gaps are kept visible by treating them as neither min nor max
+    offsets = np.arange(buckets) * size
+    low = np.nanargmin(np.where(np.isnan(blocks), np.inf, blocks), axis=1) + offsets
+    high = np.nanargmax(np.where(np.isnan(blocks), -np.inf, blocks), axis=1) + offsets
+    indices = np.concatenate([low, high, [0, n - 1]])
+    return np.unique(np.minimum(indices, n - 1))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets selection of ``n_out`` points.
+
+    Args:
+        x (numpy.ndarray): X values (1D, increasing)
+        y (numpy.ndarray): Y values (1D)
+        n_out (int): Number of points to keep (at least 3)
+
+    Returns:
+        numpy.ndarray: Sorted indices into ``x`` and ``y``
+    """
+    n = x.shape[0]
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    # Mean point of every bucket, used as the third vertex of the triangles
+    cx = np.concatenate([[0.0], np.cumsum(x)])
+    cy = np.concatenate([[0.0], np.cumsum(np.nan_to_num(y))])
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    mean_x = ((cx[edges[1:]] - cx[edges[:-1]]) / counts).tolist() + [float(x[-1])]
+    mean_y = ((cy[edges[1:]] - cy[edges[:-1]]) / counts).tolist() + [float(y[-1])]
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = 0
+    for j in range(n_out - 2):
+        start, stop = edges[j], max(edges[j + 1], edges[j] + 1)
+        ax, ay = x[anchor], y[anchor]
+        area = np.abs((ax - mean_x[j + 1]) * (y[start:stop] - ay) - (ax - x[start:stop]) * (mean_y[j + 1] - ay))
+        anchor = start + int(np.nanargmax(area)) if not np.isnan(area).all() else start
+        selected[j + 1] = anchor
+    return selected
+
+
+class DecimationPyramid:
+    """
+    Min-max decimation levels of one spectrum.
+    """
+
+    def __init__(self, x, y, max_points=DEFAULT_MAX_POINTS):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.shape[0] > 1 and x[0] > x[-1]:
+            x, y = x[::-1], y[::-1]
+        self.x = x
+        self.y = y
+        # Level 0 is the full spectrum; each level halves the previous one
+        self.levels = [np.arange(x.shape[0])]
+        while self.levels[-1].shape[0] > max_points:
+            previous = self.levels[-1]
+            self.levels.append(previous[minmax_indices(y[previous], previous.shape[0] // 2)])
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + sum(level.nbytes for level in self.levels)
+
+    def view(self, x_range=None, max_points=DEFAULT_MAX_POINTS, method="minmax"):
+        """
+        Decimated points of a window of the spectrum.
+
+        Args:
+            x_range (tuple): Visible (min, max) x values, or None for the whole spectrum
+            max_points (int): Maximum number of points returned
+            method (str): Final decimation, "minmax" or "lttb"
+
+        Returns:
+            tuple: X and y arrays of the selected points
+        """
+        if method not in DOWNSAMPLING_METHODS:
+            raise ValueError(f"Unknown downsampling method: {method}")
+        if x_range is None:
+            low, high = -np.inf, np.inf
+        else:
+            low, high = sorted(float(v) for v in x_range)
+
+        # Coarsest level that still has enough points in the window
+        for level in reversed(self.levels):
+            level_x = self.x[level]
+            start = max(int(np.searchsorted(level_x, low, side="left")) - 1, 0)
+            stop = min(int(np.searchsorted(level_x, high, side="right")) + 1, level.shape[0])
+            if stop - start >= max_points or level is self.levels[0]:
+                break
+        indices = level[start:stop]
+
+        if indices.shape[0] > max_points:
+            if method == "lttb":
+                indices = indices[lttb_indices(self.x[indices], self.y[indices], max_points)]
+            else:
+                indices = indices[minmax_indices(self.y[indices], max_points)]
+        return self.x[indices], self.y[indices]
+
+
+def get_pyramid(key, x, y):
+    """
+    Get the cached decimation pyramid of a spectrum, building it on a miss.
+
+    Args:
+        key: Hashable identifier of the spectrum content
+        x (array-like): X values
+        y (array-like): Y values
+
+    Returns:
+        DecimationPyramid: Pyramid of the spectrum
+    """
+    return pyramid_cache.get_or_compute(key, lambda: DecimationPyramid(x, y))
+
+
+def downsample_view(x, y, x_range=None, max_points=DEFAULT_MAX_POINTS, key=None, method="minmax"):
+    """
+    Points of a spectrum to display for a window.
+
+    Short spectra are returned unchanged. With a ``key`` the pyramid is cached,
+    so later zoom requests on the same spectrum only slice it.
+
+    Args:
+        x (array-like): X values
+        y (array-like): Y values
+        x_range (tuple): Visible (min, max) x values, or None for the whole spectrum
+        max_points (int): Maximum number of points returned
+        key: Hashable identifier of the spectrum content (None disables caching)
+        method (str): Final decimation, "minmax" or "lttb"
+
+    Returns:
+        tuple: X and y arrays to plot
+    """
+    if np.shape(x)[0] <= MIN_DECIMATION_POINTS and x_range is None:
+        return np.asarray(x), np.asarray(y)
+    pyramid = get_pyramid(key, x, y) if key is not None else DecimationPyramid(x, y, max_points)
+    return pyramid.view(x_range, max_points, method)
+
+
+def relayout_axis_range(relayout_data, axis="xaxis"):
+    """
+    Extract the visible range of one axis from a Plotly ``relayoutData`` event.
+
+    Args:
+        relayout_data (dict): Event data of a ``dcc.Graph``
+        axis (str): Axis name ("xaxis", "yaxis", ...)
+
+    Returns:
+        tuple: ``(changed, axis_range)``; ``changed`` is False when the event does not
+        affect the axis, and ``axis_range`` is None when the axis was reset
+    """
+    if not relayout_data:
+        return False, None
+    if f"{axis}.range[0]" in relayout_data and f"{axis}.range[1]" in relayout_data:
+        return True, (relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"])
+    if f"{axis}.range" in relayout_data:
+        return True, tuple(relayout_data[f"{axis}.range"])
+    if relayout_data.get(f"{axis}.autorange"):
+        return True, None
+    return False, None
+
+
+def relayout_x_range(relayout_data):
+    """
+    Extract the visible x range from a Plotly ``relayoutData`` event.
+
+    Args:
+        relayout_data (dict): Event data of a ``dcc.Graph``
+
+    Returns:
+        tuple: ``(changed, x_range)``; ``changed`` is False when the event does not
+        affect the x axis, and ``x_range`` is None when the axis was reset
+    """
+    return relayout_axis_range(relayout_data, "xaxis")
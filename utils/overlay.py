@@ -0,0 +1,177 @@
+"""
+Decimated series for the multi-spectrum overlay view.
+
+Dozens to hundreds of spectra from the binary archive are drawn on one shared
+x axis. Each trace is reduced to its share of a total point budget for the
+visible window (min-max per x bucket, so peaks survive, on a bucket grid
+shared by all the traces so only ``x0``/``dx`` is sent), and the reduced series
+are cached by archive, spectrum (and its conversion time), window and
+resolution: toggling a trace or
+returning to a previous zoom does not touch the data files again.
+"""
+
+import os
+
+import numpy as np
+
+from utils.downsampling import DEFAULT_MAX_POINTS
+from utils.processing_cache import LRUCache
+from utils.shared_state import shared_cache
+from utils.spectrum_archive import SpectrumArchive, CATALOG_NAME
+
+# Points sent to the browser for all the traces of the overlay together
+OVERLAY_POINT_BUDGET = 300_000
+
+# Fewest points per trace, however many traces are shown
+MIN_TRACE_POINTS = 400
+
+# Largest number of traces shown at once
+MAX_OVERLAY_TRACES = 500
+
+# Window limits are rounded to this many significant digits in cache keys
+RANGE_DIGITS = 7
+
+# With several workers, decimated series are shared through disk
+overlay_cache = LRUCache(max_entries=4096, max_bytes=256 * 1024 * 1024, shared=shared_cache("overlay"))
+
+
+def points_per_trace(n_traces, budget=OVERLAY_POINT_BUDGET):
+    """
+    Share of the point budget for each trace.
+
+    Args:
+        n_traces (int): Number of traces shown
+        budget (int): Total number of points
+
+    Returns:
+        int: Maximum points per trace
+    """
+    return int(min(DEFAULT_MAX_POINTS, max(MIN_TRACE_POINTS, budget // max(1, n_traces))))
+
+
+def list_archive_spectra(root, kind=None):
+    """
+    List the spectra of an archive without creating it.
+
+    Args:
+        root (str): Archive directory
+        kind (str): Restrict the listing to one kind ("dpt" or "csv")
+
+    Returns:
+        list: Catalog entries ordered by source path
+
+    Raises:
+        FileNotFoundError: If the directory has no archive catalog
+    """
+    if not root or not os.path.isfile(os.path.join(root, CATALOG_NAME)):
+        raise FileNotFoundError(f"No se encontró un archivo de espectros en '{root}'.")
+    with SpectrumArchive(root) as archive:
+        return archive.entries(kind)
+
+
+def spectrum_sources(root, keys):
+    """
+    Get the source paths used as trace names.
+
+    Args:
+        root (str): Archive directory
+        keys (list): Spectrum keys
+
+    Returns:
+        dict: Source path by key
+    """
+    with SpectrumArchive(root) as archive:
+        return archive.sources(keys)
+
+
+def window_view(x, y, x_range=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Decimated points of a window of one spectrum on a shared bucket grid.
+
+    The window is split into ``max_points // 2`` equal x buckets and each
+    bucket contributes its minimum and maximum, placed at fixed positions
+    inside the bucket. All the traces of a window therefore share one evenly
+    spaced x grid, which is sent as ``x0``/``dx`` instead of an array per trace.
+
+    Args:
+        x (numpy.ndarray): X values, increasing or decreasing
+        y (numpy.ndarray): Intensity values
+        x_range (tuple): Visible (min, max) x values, or None for the whole spectrum
+        max_points (int): Maximum number of points returned
+
+    Returns:
+        tuple: X and y arrays (copies, in increasing x order)
+    """
+    if x.shape[0] > 1 and x[0] > x[-1]:
+        x, y = x[::-1], y[::-1]
+    if x.shape[0] == 0:
+        return np.empty(0), np.empty(0)
+    low, high = (float(x[0]), float(x[-1])) if x_range is None else sorted(float(v) for v in x_range)
+    start = int(np.searchsorted(x, low, side="left"))
+    stop = int(np.searchsorted(x, high, side="right"))
+    if stop - start <= max_points:
+        # Few enough points: full resolution, one point beyond each edge so
+        # the lines run to the border of the window
+        start, stop = max(start - 1, 0), min(stop + 1, x.shape[0])
+        return np.array(x[start:stop], dtype=np.float64), np.array(y[start:stop], dtype=np.float64)
+
+    buckets = max(1, max_points // 2)
+    edges = np.linspace(low, high, buckets + 1)
+    bounds = np.searchsorted(x, edges, side="left")
+    bounds[-1] = stop
+    filled = np.flatnonzero(np.diff(bounds) > 0)
+    values = np.asarray(y[bounds[0]:stop], dtype=np.float64)
+    offsets = bounds[filled] - bounds[0]
+    # fmin/fmax skip NaN values unless the whole bucket is NaN
+    minima = np.fmin.reduceat(values, offsets)
+    maxima = np.fmax.reduceat(values, offsets)
+
+    width = (high - low) / buckets
+    out_x = np.empty(2 * filled.shape[0])
+    out_y = np.empty(2 * filled.shape[0])
+    out_x[0::2] = low + (filled + 0.25) * width
+    out_x[1::2] = low + (filled + 0.75) * width
+    out_y[0::2] = minima
+    out_y[1::2] = maxima
+    return out_x, out_y
+
+
+def _range_key(x_range):
+    if x_range is None:
+        return None
+    return tuple(float(f"{float(v):.{RANGE_DIGITS}g}") for v in sorted(x_range))
+
+
+def overlay_series(root, keys, x_range=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Decimated series of several archive spectra for a shared window.
+
+    The catalog is read for the conversion time of each spectrum, which is
+    part of the cache key so a converted-again source is not served from the
+    cache. Only the series not cached yet are read, from memory-mapped data
+    files, so only the visible window is touched.
+
+    Args:
+        root (str): Archive directory
+        keys (list): Spectrum keys
+        x_range (tuple): Visible (min, max) x values, or None for the whole spectra
+        max_points (int): Maximum points per spectrum
+
+    Returns:
+        dict: ``(x, y)`` arrays by spectrum key
+    """
+    window = _range_key(x_range)
+    series = {}
+    with SpectrumArchive(root) as archive:
+        versions = archive.versions(keys)
+        for key in keys:
+            cache_key = (root, key, versions.get(key), window, max_points)
+            view = overlay_cache.get(cache_key)
+            if view is None:
+                x, y = archive.load(key)
+                view = window_view(x, y, window, max_points)
+                for array in view:
+                    array.setflags(write=False)
+                overlay_cache.put(cache_key, view)
+            series[key] = view
+    return series
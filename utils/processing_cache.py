@@ -0,0 +1,188 @@
+"""
+Server-side memoization of processed spectra.
+
+Results are keyed by an identifier of the raw spectrum plus the processing
+parameters, and kept in bounded LRU caches, so toggling processing options on
+a spectrum that is already loaded skips reprocessing.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.shared_state import shared_cache
+from utils.smoothing import smooth
+
+
+def value_nbytes(value):
+    """
+    Estimate the memory used by a cached value.
+
+    Args:
+        value: NumPy array, bytes, tuple/list of arrays or object with an ``nbytes`` attribute
+
+    Returns:
+        int: Size in bytes
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(value_nbytes(v) for v in value)
+    return int(getattr(value, "nbytes", 64))
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by number of entries and total bytes.
+
+    With a ``shared`` disk tier (``utils.shared_state.SharedCache``), values
+    are also written to disk and memory misses are looked up there, so the
+    worker processes of a production server reuse each other's results.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 * 1024, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached value and mark it as recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if missing
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        value = self.shared.get(key) if self.shared is not None else None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._put_memory(key, value)
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if needed.
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        self._put_memory(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def _put_memory(self, key, value):
+        size = value_nbytes(value)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def get_or_compute(self, key, compute):
+        """
+        Get a cached value, computing and storing it on a miss.
+
+        Args:
+            key: Cache key
+            compute (callable): Function without arguments returning the value
+
+        Returns:
+            The cached or computed value
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Remove every entry held in memory."""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """
+        Get usage statistics.
+
+        Returns:
+            dict: Entries, bytes, hits, hits in the shared disk tier and misses
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+            }
+
+
+# Processed spectra keyed by spectrum key plus parameters.
+# With several workers they are shared through disk
+processed_cache = LRUCache(max_entries=128, shared=shared_cache("processed"))
+
+
+def _read_only(*arrays):
+    for array in arrays:
+        array.setflags(write=False)
+    return arrays
+
+
+def processed_spectrum(key, wavelength, intensity, smoothing_method=None, smoothing_window=None):
+    """
+    Smooth a spectrum as the preprocessing page does, with memoization.
+
+    Min-max normalization is a view transform applied in the browser.
+
+    Args:
+        key (str): Identifier of the raw spectrum (e.g. the digest of the uploaded file)
+        wavelength (numpy.ndarray): Wavelength values
+        intensity (numpy.ndarray): Raw intensity values
+        smoothing_method (str): Smoothing method name, or None/"none" to skip
+        smoothing_window (int): Smoothing window in points
+
+    Returns:
+        tuple: Read-only wavelength and intensity arrays
+    """
+    if not smoothing_method or smoothing_method == "none":
+        smoothing_method, smoothing_window = None, None
+    params = (key, smoothing_method, smoothing_window)
+
+    def process():
+        processed = intensity
+        if smoothing_method:
+            window = min(max(int(smoothing_window or 3), 3), processed.shape[0])
+            processed = smooth(processed, smoothing_method, window)
+        if processed is intensity:
+            return wavelength, intensity
+        return wavelength, _read_only(processed)[0]
+
+    return processed_cache.get_or_compute(params, process)
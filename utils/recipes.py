@@ -0,0 +1,236 @@
+"""
+Processing recipes: ordered lists of processing steps applied to spectra.
+
+A recipe is a list of ``{"step": name, **params}`` dictionaries. It can be
+loaded from a JSON file or written inline as
+``"to_nm; crop:high=2500; smooth:method=savgol,window=11; normalize_max"``.
+Every step receives and returns ``(x, y)``, where ``y`` is one spectrum (1D)
+or a stack of spectra on the same grid (2D).
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.baseline import correct_baseline
+from utils.resampling import common_grid, resample
+from utils.smoothing import smooth
+from utils.spectral_ops import (
+    wavenumber_to_wavelength, crop_range, normalize_max, normalize_minmax,
+    reflectance_from_absorbance, db_to_linear, linear_to_db, batch_ratio,
+)
+from utils.spectrum_archive import read_spectrum_file
+
+# Name of the file recording the recipe used to produce an output archive
+RECIPE_FILE = "recipe.json"
+
+
+def _to_nm(x, y):
+    return wavenumber_to_wavelength(x), y
+
+
+def _crop(x, y, low=None, high=None):
+    x, y = crop_range(x, y, low, high)
+    if x.shape[0] == 0:
+        raise ValueError(f"The crop range [{low}, {high}] contains no points of the spectrum")
+    return x, y
+
+
+def _normalize_max(x, y):
+    return x, normalize_max(y)
+
+
+def _normalize_minmax(x, y):
+    return x, normalize_minmax(y)
+
+
+def _reflectance(x, y):
+    return x, reflectance_from_absorbance(y)
+
+
+def _db_to_linear(x, y):
+    return x, db_to_linear(y)
+
+
+def _linear_to_db(x, y):
+    return x, linear_to_db(y)
+
+
+def _smooth(x, y, method="savgol", window=11, order=2, deriv=0):
+    delta = abs(float(x[1] - x[0])) if deriv and x.shape[0] > 1 else 1.0
+    return x, smooth(y, method, int(window), int(order), int(deriv), delta)
+
+
+def _baseline(x, y, method="als", **params):
+    return x, correct_baseline(x, y, method, **params)
+
+
+def _resample(x, y, start, stop, n_points, method="linear"):
+    grid = common_grid(start, stop, n_points)
+    return grid, resample(x, y, grid, method)
+
+
+_reference_cache = {}
+
+
+def _load_reference(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _reference_cache:
+        kind, x, y = read_spectrum_file(path)
+        if kind == "dpt":
+            x = wavenumber_to_wavelength(x)
+        _reference_cache[key] = (x, y)
+    return _reference_cache[key]
+
+
+def _ratio(x, y, reference, output="ratio"):
+    ref_x, ref_y = _load_reference(reference)
+    if ref_x.shape != x.shape or not np.array_equal(ref_x, x):
+        ref_y = resample(ref_x, ref_y, x)
+    ratio, reflectance, absorbance = batch_ratio(y, ref_y)
+    result = {"ratio": ratio, "reflectance": reflectance, "absorbance": absorbance}[output]
+    return x, result[0] if np.ndim(y) == 1 else result
+
+
+# Registry of available steps; later modules can register more with ``register_step``
+STEPS = {
+    "to_nm": _to_nm,
+    "crop": _crop,
+    "normalize_max": _normalize_max,
+    "normalize_minmax": _normalize_minmax,
+    "reflectance": _reflectance,
+    "db_to_linear": _db_to_linear,
+    "linear_to_db": _linear_to_db,
+    "smooth": _smooth,
+    "baseline": _baseline,
+    "resample": _resample,
+    "ratio": _ratio,
+}
+
+
+def register_step(name, function):
+    """
+    Register a processing step.
+
+    Args:
+        name (str): Step name used in recipes
+        function (callable): Function ``(x, y, **params) -> (x, y)``
+    """
+    STEPS[name] = function
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_recipe(spec):
+    """
+    Parse a recipe from a JSON file path, an inline string or a list.
+
+    Args:
+        spec (str or list): Path to a ``.json`` file, inline recipe or list of steps
+
+    Returns:
+        list: Validated list of step dictionaries
+    """
+    if isinstance(spec, str) and spec.endswith(".json") and os.path.exists(spec):
+        with open(spec, encoding="utf-8") as f:
+            spec = json.load(f)
+    if isinstance(spec, str):
+        steps = []
+        for part in filter(None, (p.strip() for p in spec.split(";"))):
+            name, _, params = part.partition(":")
+            step = {"step": name.strip()}
+            for item in filter(None, (p.strip() for p in params.split(","))):
+                key, _, value = item.partition("=")
+                step[key.strip()] = _parse_value(value.strip())
+            steps.append(step)
+        spec = steps
+
+    for step in spec:
+        if step.get("step") not in STEPS:
+            raise ValueError(f"Unknown processing step: {step.get('step')}")
+    return [dict(step) for step in spec]
+
+
+def apply_recipe(recipe, x, y, timings=None):
+    """
+    Apply a recipe to a spectrum or a stack of spectra.
+
+    Args:
+        recipe (list): Parsed recipe
+        x (numpy.ndarray): X axis
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        timings (dict): Optional dictionary accumulating seconds spent per step
+
+    Returns:
+        tuple: Processed x and y
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    for position, step in enumerate(recipe):
+        params = {k: v for k, v in step.items() if k != "step"}
+        start = time.perf_counter()
+        x, y = STEPS[step["step"]](x, y, **params)
+        if timings is not None:
+            label = f"{position + 1}. {step['step']}"
+            timings[label] = timings.get(label, 0.0) + time.perf_counter() - start
+    return x, y
+
+
+def recipe_changed(output_dir, recipe):
+    """
+    Check whether an output archive was produced with a different recipe.
+
+    Args:
+        output_dir (str): Output archive directory
+        recipe (list): Parsed recipe
+
+    Returns:
+        bool: True if the stored recipe differs (or does not exist)
+    """
+    path = os.path.join(output_dir, RECIPE_FILE)
+    if not os.path.exists(path):
+        return True
+    with open(path, encoding="utf-8") as f:
+        return json.load(f) != recipe
+
+
+def save_recipe(output_dir, recipe):
+    """
+    Record the recipe used to produce an output archive.
+
+    Only called after a complete run without errors, when every output in
+    the archive comes from this recipe.
+
+    Args:
+        output_dir (str): Output archive directory
+        recipe (list): Parsed recipe
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, RECIPE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(recipe, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def discard_recipe(output_dir):
+    """
+    Forget the recipe recorded for an output archive.
+
+    Called before reprocessing with a new recipe, so an interrupted run
+    leaves the archive marked as stale instead of current for the old recipe.
+
+    Args:
+        output_dir (str): Output archive directory
+    """
+    path = os.path.join(output_dir, RECIPE_FILE)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,231 @@
+"""
+Resampling of spectra onto a common wavelength grid.
+
+A ``Resampler`` precomputes, for a (source grid, target grid) pair, the source
+indices and weights contributing to each target point. This is a sparse matrix
+stored in ELLPACK form (a fixed number of entries per target row), so
+resampling a stack of spectra is a single sparse matrix product. Resamplers
+are cached per grid pair, which makes repeated comparisons against the same
+reference cheap.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+RESAMPLING_METHODS = ("linear", "cubic", "bin")
+
+# Number of resamplers kept in the cache
+CACHE_SIZE = 64
+
+
+def _increasing_order(x):
+    """Return the permutation that sorts ``x``, or None if it is already increasing."""
+    if np.all(x[1:] > x[:-1]):
+        return None
+    if np.all(x[1:] < x[:-1]):
+        return np.arange(x.shape[0] - 1, -1, -1)
+    order = np.argsort(x, kind="stable")
+    if np.any(np.diff(x[order]) == 0):
+        raise ValueError("Source grid contains duplicated values")
+    return order
+
+
+def _linear_weights(x, target):
+    n = x.shape[0]
+    i = np.clip(np.searchsorted(x, target, side="right") - 1, 0, n - 2)
+    t = (target - x[i]) / (x[i + 1] - x[i])
+    indices = np.stack([i, i + 1], axis=1)
+    weights = np.stack([1.0 - t, t], axis=1)
+    return indices, weights
+
+
+def _cubic_weights(x, target):
+    # Local cubic Lagrange interpolation through the four nearest source points;
+    # exact for cubic polynomials and valid on non-uniform grids
+    n = x.shape[0]
+    if n < 4:
+        return _linear_weights(x, target)
+    i = np.clip(np.searchsorted(x, target, side="right") - 2, 0, n - 4)
+    indices = i[:, np.newaxis] + np.arange(4)
+    nodes = x[indices]
+    weights = np.ones(indices.shape)
+    for j in range(4):
+        for m in range(4):
+            if m != j:
+                weights[:, j] *= (target - nodes[:, m]) / (nodes[:, j] - nodes[:, m])
+    return indices, weights
+
+
+def _bin_weights(x, target):
+    # Each target point owns the interval between the midpoints to its neighbours
+    m = target.shape[0]
+    if m > 1:
+        midpoints = 0.5 * (target[1:] + target[:-1])
+        edges = np.concatenate([
+            [target[0] - (midpoints[0] - target[0])],
+            midpoints,
+            [target[-1] + (target[-1] - midpoints[-1])],
+        ])
+    else:
+        edges = np.array([-np.inf, np.inf])
+    starts = np.searchsorted(x, edges[:-1], side="left")
+    stops = np.searchsorted(x, edges[1:], side="left")
+    counts = stops - starts
+    width = max(int(counts.max()), 1)
+
+    offsets = np.arange(width)
+    indices = np.minimum(starts[:, np.newaxis] + offsets, x.shape[0] - 1)
+    used = offsets < counts[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(used, 1.0 / counts[:, np.newaxis], 0.0)
+    return indices, weights, counts == 0
+
+
+class Resampler:
+    """
+    Precomputed resampling operator from a source grid to a target grid.
+    """
+
+    def __init__(self, source_x, target_x, method="linear", fill_value=np.nan):
+        """
+        Build the operator.
+
+        Args:
+            source_x (array-like): Source grid (monotonic or unsorted, without duplicates)
+            target_x (array-like): Target grid (increasing)
+            method (str): "linear", "cubic" or "bin" (average of the source points in each target bin)
+            fill_value (float): Value for target points outside the source range or with empty bins
+        """
+        if method not in RESAMPLING_METHODS:
+            raise ValueError(f"Unknown resampling method: {method}")
+        source_x = np.asarray(source_x, dtype=np.float64)
+        target_x = np.asarray(target_x, dtype=np.float64)
+        if source_x.shape[0] < 2:
+            raise ValueError("Source grid needs at least two points")
+
+        order = _increasing_order(source_x)
+        x = source_x if order is None else source_x[order]
+
+        if method == "bin":
+            indices, weights, outside = _bin_weights(x, target_x)
+        else:
+            if method == "linear":
+                indices, weights = _linear_weights(x, target_x)
+            else:
+                indices, weights = _cubic_weights(x, target_x)
+            outside = (target_x < x[0]) | (target_x > x[-1])
+
+        # Map positions in the sorted grid back to positions in the original grid
+        if order is not None:
+            indices = order[indices]
+
+        self.method = method
+        self.fill_value = fill_value
+        self.n_source = source_x.shape[0]
+        self.n_target = target_x.shape[0]
+        self.indices = np.ascontiguousarray(indices.T)
+        self.weights = np.ascontiguousarray(weights.T)
+        self.outside = outside if np.any(outside) else None
+
+    def apply(self, y, out=None):
+        """
+        Resample one spectrum or a stack of spectra.
+
+        Args:
+            y (numpy.ndarray): Values on the source grid, shape ``(n,)`` or ``(k, n)``
+            out (numpy.ndarray): Optional output array, shape ``(m,)`` or ``(k, m)``
+
+        Returns:
+            numpy.ndarray: Values on the target grid
+        """
+        y = np.asarray(y, dtype=np.float64)
+        if y.shape[-1] != self.n_source:
+            raise ValueError(f"Expected {self.n_source} points on the source grid, got {y.shape[-1]}")
+        shape = y.shape[:-1] + (self.n_target,)
+        if out is None:
+            out = np.empty(shape)
+        scratch = np.empty(shape) if self.indices.shape[0] > 1 else None
+
+        np.take(y, self.indices[0], axis=-1, out=out)
+        out *= self.weights[0]
+        for indices, weights in zip(self.indices[1:], self.weights[1:]):
+            np.take(y, indices, axis=-1, out=scratch)
+            scratch *= weights
+            out += scratch
+
+        if self.outside is not None:
+            out[..., self.outside] = self.fill_value
+        return out
+
+    __call__ = apply
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _grid_key(x):
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    return hashlib.blake2b(x.tobytes(), digest_size=16).hexdigest()
+
+
+def get_resampler(source_x, target_x, method="linear"):
+    """
+    Get a cached resampler for a pair of grids, building it if needed.
+
+    Args:
+        source_x (array-like): Source grid
+        target_x (array-like): Target grid
+        method (str): Resampling method
+
+    Returns:
+        Resampler: Resampler for the grid pair
+    """
+    key = (_grid_key(source_x), _grid_key(target_x), method)
+    with _cache_lock:
+        resampler = _cache.get(key)
+        if resampler is not None:
+            _cache.move_to_end(key)
+            return resampler
+
+    resampler = Resampler(source_x, target_x, method=method)
+    with _cache_lock:
+        _cache[key] = resampler
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return resampler
+
+
+def resample(source_x, y, target_x, method="linear", out=None):
+    """
+    Resample spectra onto a target grid using the resampler cache.
+
+    Args:
+        source_x (array-like): Source grid
+        y (numpy.ndarray): Values on the source grid, shape ``(n,)`` or ``(k, n)``
+        target_x (array-like): Target grid
+        method (str): "linear", "cubic" or "bin"
+        out (numpy.ndarray): Optional output array
+
+    Returns:
+        numpy.ndarray: Values on the target grid
+    """
+    return get_resampler(source_x, target_x, method).apply(y, out=out)
+
+
+def common_grid(start, stop, n_points):
+    """
+    Build a uniform wavelength grid.
+
+    Args:
+        start (float): First wavelength
+        stop (float): Last wavelength
+        n_points (int): Number of points
+
+    Returns:
+        numpy.ndarray: Uniform grid
+    """
+    return np.linspace(start, stop, int(n_points))
@@ -0,0 +1,268 @@
+"""
+Background writer for saving acquired spectra without blocking Dash callbacks.
+
+Callbacks submit a save job and immediately get a job id back; a single worker
+thread performs the disk I/O and the UI polls the job status. Payloads are
+stored content-addressed, so saving an identical trace twice only adds a link.
+
+In multi-worker mode the status poll may reach another worker process than
+the one writing the file, so job records are also published as small JSON
+files in the shared directory.
+"""
+
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import pandas as pd
+
+from utils.content_store import ContentStore, OBJECTS_DIR, spectrum_digest
+from utils.shared_state import multi_worker, shared_dir
+
+# fsync policies:
+#   "none"      - rely on the OS to flush the data eventually (fastest)
+#   "file"      - fsync the written file before reporting success
+#   "directory" - fsync the file and its parent directory (survives power loss)
+FSYNC_POLICIES = ("none", "file", "directory")
+
+# Finished jobs kept for status polls before the oldest ones are forgotten
+MAX_FINISHED_JOBS = 256
+
+_JOB_ID_PATTERN = re.compile(r"^save-\d+-\d+-\d+$")
+
+
+class SaveQueueFull(Exception):
+    """Raised when the writer queue is full and the save cannot be accepted."""
+
+
+class SaveWriter:
+    """
+    Background service that writes spectra to CSV files from a bounded queue.
+    """
+
+    def __init__(self, max_queue=16, fsync_policy="file", shared=False):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.fsync_policy = fsync_policy
+        self.jobs_dir = shared_dir("save_jobs") if shared else None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.thread = None
+
+    def start(self):
+        """Start the worker thread if it is not already running."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="osa-save-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, directory, filename, wavelengths, intensities, settings=None, corrected=None):
+        """
+        Queue a spectrum to be saved as CSV.
+
+        Args:
+            directory (str): Destination directory (created if missing)
+            filename (str): File name, ".csv" is appended if missing
+            wavelengths (list): Wavelength values
+            intensities (list): Intensity values
+            settings (dict): Acquisition settings included in the content hash. A
+                "calibration" entry is also written next to the CSV as
+                ``<name>.calibration.json``
+            corrected (list): Calibrated spectrum, saved as a third column
+
+        Returns:
+            str: Job id to use with ``status``
+
+        Raises:
+            SaveQueueFull: If the queue has no free slots
+        """
+        self.start()
+        if not filename.endswith(".csv"):
+            filename += ".csv"
+        job_id = f"save-{os.getpid()}-{next(self.counter)}-{int(time.time() * 1000)}"
+        file_path = os.path.join(directory, filename)
+        job = {
+            "id": job_id,
+            "state": "pending",
+            "path": file_path,
+            "message": "",
+            "digest": None,
+            "deduplicated": False,
+            "submitted": time.time(),
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._publish(job)
+        try:
+            self.queue.put_nowait((job_id, directory, file_path, wavelengths, intensities, settings, corrected))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+                self._unpublish(job_id)
+            raise SaveQueueFull("La cola de guardado está llena. Intente de nuevo en unos segundos.")
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get the status of a save job.
+
+        Args:
+            job_id (str): Job id returned by ``submit``
+
+        Returns:
+            dict: Copy of the job record, or None if the job is unknown
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        if self.jobs_dir is None or not isinstance(job_id, str) or not _JOB_ID_PATTERN.match(job_id):
+            return None
+        # Job of another worker process
+        try:
+            with open(os.path.join(self.jobs_dir, job_id + ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def wait(self, timeout=None):
+        """
+        Block until every queued job has been processed.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the queue drained before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        while True:
+            job_id, directory, file_path, wavelengths, intensities, settings, corrected = self.queue.get()
+            self._update(job_id, state="running")
+            try:
+                digest, deduplicated = self._write(
+                    directory, file_path, wavelengths, intensities, settings, corrected
+                )
+                self._update(job_id, state="done", digest=digest, deduplicated=deduplicated, finished=time.time())
+            except Exception as e:
+                self._update(job_id, state="error", message=str(e), finished=time.time())
+            finally:
+                self.queue.task_done()
+
+    def _update(self, job_id, **changes):
+        with self.lock:
+            self.jobs[job_id].update(changes)
+            self._publish(self.jobs[job_id])
+            finished = [j for j in self.jobs.values() if j["state"] in ("done", "error")]
+            for job in sorted(finished, key=lambda j: j["submitted"])[:-MAX_FINISHED_JOBS]:
+                del self.jobs[job["id"]]
+                self._unpublish(job["id"])
+
+    def _publish(self, job):
+        if self.jobs_dir is None:
+            return
+        path = os.path.join(self.jobs_dir, job["id"] + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(path + ".tmp", path)
+
+    def _unpublish(self, job_id):
+        if self.jobs_dir is None:
+            return
+        try:
+            os.remove(os.path.join(self.jobs_dir, job_id + ".json"))
+        except OSError:
+            pass
+
+    def _write(self, directory, file_path, wavelengths, intensities, settings, corrected=None):
+        os.makedirs(directory, exist_ok=True)
+        store = ContentStore(os.path.join(directory, OBJECTS_DIR))
+        # The calibration timestamps in the settings identify the corrected
+        # spectrum, so it does not need to be hashed itself
+        digest = spectrum_digest(wavelengths, intensities, settings)
+
+        def write_payload(f):
+            columns = {
+                "wavelength": wavelengths,
+                "intensity": intensities
+            }
+            if corrected is not None:
+                columns["corrected"] = corrected
+            df = pd.DataFrame(columns)
+            f.write(df.to_csv(index=False).encode("utf-8"))
+            if self.fsync_policy != "none":
+                f.flush()
+                os.fsync(f.fileno())
+
+        # The payload is written once (through a temporary file) and the
+        # requested file name becomes a link to it
+        deduplicated = store.put(digest, write_payload)
+        store.link(digest, file_path)
+
+        calibration = (settings or {}).get("calibration")
+        if calibration is not None:
+            self._write_calibration(os.path.splitext(file_path)[0] + ".calibration.json", calibration)
+
+        if self.fsync_policy == "directory":
+            fsync_directory(directory)
+
+        return digest, deduplicated
+
+    def _write_calibration(self, path, calibration):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(calibration, f, indent=2)
+            if self.fsync_policy != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+
+def fsync_directory(directory):
+    """
+    Flush a directory entry to disk. Not supported on Windows, where it is a no-op.
+
+    Args:
+        directory (str): Directory to flush
+    """
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_save_writer(max_queue=16, fsync_policy="file"):
+    """
+    Get the shared save writer, creating it on first use.
+
+    Args:
+        max_queue (int): Queue size used if the writer is created
+        fsync_policy (str): fsync policy used if the writer is created
+
+    Returns:
+        SaveWriter: The process-wide save writer (publishing job status in multi-worker mode)
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SaveWriter(max_queue=max_queue, fsync_policy=fsync_policy, shared=multi_worker())
+        return _writer
@@ -0,0 +1,319 @@
+"""
+Server-side store for the spectra shown in the web interface.
+
+Callbacks keep the arrays of acquired or loaded spectra here and put only a
+small handle in the browser (``dcc.Store``), so the data is not serialized to
+JSON and sent back on every interaction. Entries belong to a browser session,
+expire after a period without use and, when the memory budget is exceeded,
+the least recently used ones are spilled to disk as ``.npy`` files that are
+memory-mapped when read again.
+
+In multi-worker mode (``utils.shared_state``) every entry is also written to
+disk when it is stored, so a handle created by one worker process can be read
+by the others; reading an entry refreshes the modification time of its
+directory, which is what expiry is based on.
+"""
+
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.shared_state import multi_worker
+
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "osa_session_store")
+DEFAULT_TTL = 2 * 3600
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+# Seconds between sweeps of expired entries on disk in multi-worker mode
+SWEEP_INTERVAL = 600
+
+# Session ids come from the browser and are used as directory names
+ANONYMOUS_SESSION = "anonymous"
+_SESSION_PATTERN = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class HandleExpired(LookupError):
+    """Raised when a handle does not refer to live data of the session."""
+
+
+def session_key(session_id):
+    """
+    Validate a browser session id.
+
+    Args:
+        session_id (str): Session id sent by the browser
+
+    Returns:
+        str: The session id, or ``ANONYMOUS_SESSION`` when it is missing or invalid
+    """
+    if isinstance(session_id, str) and _SESSION_PATTERN.match(session_id):
+        return session_id
+    return ANONYMOUS_SESSION
+
+
+class SessionStore:
+    """
+    Per-session store of named arrays with TTL eviction and disk spill.
+
+    With ``shared=True`` entries are written through to disk and handles
+    unknown to this process are looked up there.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, ttl=DEFAULT_TTL, max_memory_bytes=DEFAULT_MAX_MEMORY, shared=False):
+        self.root = root
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.shared = shared
+        # handle -> {"session", "arrays" (None when spilled), "names" (when on disk), "metadata", "nbytes", "expires"}
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+        self.spilled = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._sweep_disk()
+        self.swept = time.time()
+
+    def put(self, session_id, arrays, metadata=None, replaces=None):
+        """
+        Store the arrays of a spectrum.
+
+        Args:
+            session_id (str): Browser session id
+            arrays (dict): Arrays by name (e.g. "wavelengths", "intensities")
+            metadata (dict): JSON-serializable metadata kept with the arrays
+            replaces (str): Handle of previous data of the session to drop
+
+        Returns:
+            str: Handle to keep in the browser
+        """
+        session = session_key(session_id)
+        stored = {}
+        for name, values in arrays.items():
+            array = np.array(values, dtype=np.float64)
+            array.setflags(write=False)
+            stored[name] = array
+        nbytes = sum(array.nbytes for array in stored.values())
+        handle = secrets.token_hex(16)
+        entry = {
+            "session": session,
+            "arrays": stored,
+            "metadata": metadata or {},
+            "nbytes": nbytes,
+        }
+        if self.shared:
+            # Written before the handle is returned, so any worker can read it
+            self._write_entry(handle, entry)
+
+        with self.lock:
+            now = time.time()
+            self._expire(now)
+            if replaces is not None:
+                self._drop(replaces, session)
+            entry["expires"] = now + self.ttl
+            self.entries[handle] = entry
+            self.memory_bytes += nbytes
+            self._spill()
+        return handle
+
+    def get(self, handle, session_id):
+        """
+        Get the arrays and metadata behind a handle, extending its lifetime.
+
+        Args:
+            handle (str): Handle returned by ``put``
+            session_id (str): Browser session id; handles of other sessions are rejected
+
+        Returns:
+            tuple: Dict of read-only arrays by name and the metadata dict
+
+        Raises:
+            HandleExpired: If the handle is unknown, expired or belongs to another session
+        """
+        session = session_key(session_id)
+        with self.lock:
+            now = time.time()
+            self._expire(now)
+            entry = self.entries.get(handle) if isinstance(handle, str) else None
+            if self.shared:
+                entry = self._shared_entry(handle, session, entry)
+            if entry is None or entry["session"] != session:
+                raise HandleExpired("Los datos ya no están disponibles en el servidor.")
+            entry["expires"] = now + self.ttl
+            self.entries.move_to_end(handle)
+            arrays = entry["arrays"]
+            if arrays is None:
+                directory = self._entry_dir(session, handle)
+                arrays = {
+                    name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                    for name in entry["names"]
+                }
+            return arrays, entry["metadata"]
+
+    def drop(self, handle, session_id):
+        """
+        Remove the data behind a handle.
+
+        Args:
+            handle (str): Handle returned by ``put``
+            session_id (str): Browser session id
+        """
+        with self.lock:
+            self._drop(handle, session_key(session_id))
+
+    def drop_session(self, session_id):
+        """
+        Remove all the data of a session.
+
+        Args:
+            session_id (str): Browser session id
+        """
+        session = session_key(session_id)
+        with self.lock:
+            for handle in [h for h, e in self.entries.items() if e["session"] == session]:
+                self._drop(handle, session)
+            shutil.rmtree(os.path.join(self.root, session), ignore_errors=True)
+
+    def stats(self):
+        """
+        Get usage statistics.
+
+        Returns:
+            dict: Entries, bytes held in memory and entries spilled to disk so far
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "memory_bytes": self.memory_bytes,
+                "spilled": self.spilled,
+            }
+
+    def _entry_dir(self, session, handle):
+        return os.path.join(self.root, session, handle)
+
+    def _write_entry(self, handle, entry):
+        """Write the arrays and metadata of an entry; metadata.json is written last and marks it complete."""
+        directory = self._entry_dir(entry["session"], handle)
+        os.makedirs(directory, exist_ok=True)
+        for name, array in entry["arrays"].items():
+            np.save(os.path.join(directory, name + ".npy"), array)
+        tmp_path = os.path.join(directory, f"metadata.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry["metadata"], f, default=str)
+        os.replace(tmp_path, os.path.join(directory, "metadata.json"))
+        entry["names"] = list(entry["arrays"])
+
+    def _shared_entry(self, handle, session, entry):
+        """
+        Check an entry against the disk in multi-worker mode.
+
+        Entries dropped by another worker are forgotten, entries stored by
+        another worker are loaded (memory-mapped), and the directory of the
+        entry is touched so no worker expires it while it is in use.
+        """
+        if not isinstance(handle, str) or not _HANDLE_PATTERN.match(handle):
+            return None
+        directory = self._entry_dir(session, handle)
+        try:
+            os.utime(directory)
+        except OSError:
+            if entry is not None and entry["session"] == session:
+                self._drop(handle, session)
+            return None
+        if entry is not None:
+            return entry
+        try:
+            with open(os.path.join(directory, "metadata.json"), encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = {
+            "session": session,
+            "arrays": None,
+            "names": [name[:-4] for name in os.listdir(directory) if name.endswith(".npy")],
+            "metadata": metadata,
+            "nbytes": 0,
+        }
+        self.entries[handle] = entry
+        return entry
+
+    def _drop(self, handle, session, keep_files=False):
+        entry = self.entries.get(handle) if isinstance(handle, str) else None
+        if entry is None or entry["session"] != session:
+            if self.shared and isinstance(handle, str) and _HANDLE_PATTERN.match(handle) and not keep_files:
+                # The entry may have been stored by another worker
+                shutil.rmtree(self._entry_dir(session, handle), ignore_errors=True)
+            return
+        del self.entries[handle]
+        if entry["arrays"] is not None:
+            self.memory_bytes -= entry["nbytes"]
+        if "names" in entry and not keep_files and _HANDLE_PATTERN.match(handle):
+            shutil.rmtree(self._entry_dir(session, handle), ignore_errors=True)
+
+    def _expire(self, now):
+        for handle in [h for h, e in self.entries.items() if e["expires"] <= now]:
+            # Other workers may still be using a shared entry; its files are
+            # removed by the disk sweep once nobody has read it for the TTL
+            self._drop(handle, self.entries[handle]["session"], keep_files=self.shared)
+        if self.shared and now - self.swept > SWEEP_INTERVAL:
+            self.swept = now
+            self._sweep_disk()
+
+    def _spill(self):
+        """Write the least recently used in-memory entries to disk until the budget is met."""
+        for handle, entry in self.entries.items():
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+            if entry["arrays"] is None:
+                continue
+            if "names" not in entry:
+                self._write_entry(handle, entry)
+            entry["arrays"] = None
+            self.memory_bytes -= entry["nbytes"]
+            self.spilled += 1
+
+    def _sweep_disk(self):
+        """Remove entries on disk (spilled, or left by earlier runs or other workers) unused for the TTL."""
+        cutoff = time.time() - self.ttl
+        for session in os.listdir(self.root):
+            session_dir = os.path.join(self.root, session)
+            if not os.path.isdir(session_dir):
+                continue
+            for handle in os.listdir(session_dir):
+                directory = os.path.join(session_dir, handle)
+                try:
+                    if os.path.getmtime(directory) < cutoff:
+                        shutil.rmtree(directory, ignore_errors=True)
+                except OSError:
+                    pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store(root=DEFAULT_STORE_DIR, ttl=DEFAULT_TTL, max_memory_bytes=DEFAULT_MAX_MEMORY):
+    """
+    Get the shared session store, creating it on first use.
+
+    Args:
+        root (str): Spill directory used if the store is created
+        ttl (float): Seconds without use before data expires, used if the store is created
+        max_memory_bytes (int): Memory budget used if the store is created
+
+    Returns:
+        SessionStore: The process-wide session store
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(root=root, ttl=ttl, max_memory_bytes=max_memory_bytes, shared=multi_worker())
+        return _store
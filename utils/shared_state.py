@@ -0,0 +1,298 @@
+"""
+State shared between the worker processes of a production server.
+
+With several workers (``serve.py`` or gunicorn), consecutive requests of one
+browser may be served by different processes, so whatever a later request
+needs has to be reachable from any of them. This module provides the common
+pieces: the directory where workers exchange state, exclusive file locks, a
+disk tier for the in-memory LRU caches and the per-instrument lock that keeps
+two requests from driving the same OSA at once.
+
+Multi-worker mode is enabled by the launchers through the ``OSA_MULTI_WORKER``
+environment variable; with the development server (``python app.py``) the
+stores keep their state in the process as before.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Environment variables read by the stores when they are created
+MULTI_WORKER_ENV = "OSA_MULTI_WORKER"
+SHARED_DIR_ENV = "OSA_SHARED_DIR"
+
+DEFAULT_SHARED_DIR = os.path.join(tempfile.gettempdir(), "osa_shared")
+
+# Puts between two size checks of a shared cache directory
+CACHE_CHECK_INTERVAL = 64
+
+
+class InstrumentBusy(RuntimeError):
+    """Raised when another request or live view is using the instrument."""
+
+
+def multi_worker():
+    """
+    Check whether the application runs with several worker processes.
+
+    Returns:
+        bool: True if ``OSA_MULTI_WORKER`` is set to a value other than "0"
+    """
+    return os.environ.get(MULTI_WORKER_ENV, "") not in ("", "0")
+
+
+def shared_dir(*parts):
+    """
+    Get (and create) a directory shared by the worker processes.
+
+    Args:
+        *parts (str): Subdirectory names
+
+    Returns:
+        str: Directory path under ``OSA_SHARED_DIR``
+    """
+    path = os.path.join(os.environ.get(SHARED_DIR_ENV, DEFAULT_SHARED_DIR), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def safe_name(name):
+    """
+    Turn an identifier (e.g. "ip:port") into a file name.
+
+    Args:
+        name (str): Identifier
+
+    Returns:
+        str: Name with only letters, digits, "_", "-" and "."
+    """
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", str(name))
+
+
+def pid_alive(pid):
+    """
+    Check whether a process exists.
+
+    Args:
+        pid (int): Process id
+
+    Returns:
+        bool: True if the process is running
+    """
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        return True
+    except (OSError, ValueError, TypeError):
+        return False
+    return True
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, held across processes.
+
+    Each instance opens its own descriptor, so two instances on the same path
+    also exclude each other within one process. An instance must not be shared
+    between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self, blocking=True, timeout=None):
+        """
+        Take the lock.
+
+        Args:
+            blocking (bool): Wait until the lock is free
+            timeout (float): Longest wait in seconds when blocking, None to wait forever
+
+        Returns:
+            bool: True if the lock was taken
+        """
+        if self.fd is not None:
+            raise RuntimeError("Lock already held")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    flags = fcntl.LOCK_EX if blocking and deadline is None else fcntl.LOCK_EX | fcntl.LOCK_NB
+                    fcntl.flock(fd, flags)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                self.fd = fd
+                return True
+            except OSError:
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    os.close(fd)
+                    return False
+                time.sleep(0.05)
+
+    def release(self):
+        """Release the lock if it is held."""
+        fd, self.fd = self.fd, None
+        if fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def instrument_lock(instrument):
+    """
+    Create the lock of an instrument.
+
+    Single acquisitions take it for the duration of the sweep and live views
+    for as long as they run, in whichever worker they are.
+
+    Args:
+        instrument (str): Instrument key (e.g. "ip:port")
+
+    Returns:
+        FileLock: New (not yet acquired) lock of the instrument
+    """
+    return FileLock(os.path.join(shared_dir("locks"), safe_name(instrument) + ".lock"))
+
+
+class SharedCache:
+    """
+    Disk cache of arrays shared by the worker processes, bounded by total bytes.
+
+    Values must be a NumPy array or a tuple of arrays; they are stored as
+    uncompressed ``.npz`` files named by a hash of the key, so the key must
+    have a stable ``repr`` (tuples of strings, numbers and None). The least
+    recently read files are removed when the directory exceeds its budget.
+    """
+
+    def __init__(self, name, max_bytes=1024 * 1024 * 1024):
+        self.directory = shared_dir("cache", safe_name(name))
+        self.max_bytes = max_bytes
+        self.puts = 0
+
+    def _path(self, key):
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=20).hexdigest()
+        return os.path.join(self.directory, digest + ".npz")
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Read-only array or tuple of arrays, or None if missing
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                names = sorted(data.files, key=lambda name: int(name.split("_")[1]))
+                arrays = tuple(data[name] for name in names)
+            os.utime(path)
+        except (OSError, ValueError, KeyError, IndexError):
+            return None
+        for array in arrays:
+            array.setflags(write=False)
+        return arrays[0] if names == ["array_0"] else arrays
+
+    def put(self, key, value):
+        """
+        Store a value; values that are not arrays are ignored.
+
+        Args:
+            key: Cache key
+            value: Array or tuple of arrays
+        """
+        if isinstance(value, np.ndarray):
+            arrays = {"array_0": value}
+        elif isinstance(value, tuple) and value and all(isinstance(v, np.ndarray) for v in value):
+            arrays = {f"item_{i}": v for i, v in enumerate(value)}
+        else:
+            return
+        if sum(array.nbytes for array in arrays.values()) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.puts += 1
+        if self.puts % CACHE_CHECK_INTERVAL == 1:
+            self.trim()
+
+    def trim(self):
+        """Remove the least recently used files until the directory fits its budget."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove every cached file."""
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def shared_cache(name, max_bytes=1024 * 1024 * 1024):
+    """
+    Get the disk tier of a cache in multi-worker mode.
+
+    Args:
+        name (str): Cache name, used as directory name
+        max_bytes (int): Disk budget of the cache
+
+    Returns:
+        SharedCache: Disk cache, or None when running in a single process
+    """
+    return SharedCache(name, max_bytes) if multi_worker() else None
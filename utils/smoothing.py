@@ -0,0 +1,263 @@
+"""
+Smoothing and derivative filters for stacks of spectra.
+
+Filters are applied as convolutions along the last (wavelength) axis, so a
+whole ``(k, n)`` stack is processed without per-spectrum Python loops.
+Convolution kernels are cached per (window, order, derivative) or per sigma.
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+SMOOTHING_METHODS = ("savgol", "moving_average", "gaussian")
+
+# Kernels longer than this are applied with an FFT instead of shifted sums
+FFT_KERNEL_THRESHOLD = 64
+
+# Number of values filtered per block in the shifted-sum path
+_BLOCK_ELEMENTS = 1 << 16
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=128)
+def _savgol_fit(window, order):
+    # Pseudo-inverse of the Vandermonde matrix on z = -h..h: maps a window of
+    # samples to the coefficients of the least-squares polynomial
+    h = window // 2
+    z = np.arange(-h, h + 1, dtype=np.float64)
+    return np.linalg.pinv(np.vander(z, order + 1, increasing=True))
+
+
+def _derivative_basis(z, order, deriv):
+    # Row j holds d^deriv/dz^deriv of z^j evaluated at each z
+    basis = np.zeros((order + 1, np.size(z)))
+    for j in range(deriv, order + 1):
+        basis[j] = math.factorial(j) / math.factorial(j - deriv) * np.asarray(z, dtype=np.float64) ** (j - deriv)
+    return basis
+
+
+@lru_cache(maxsize=128)
+def savgol_coefficients(window, order, deriv=0):
+    """
+    Savitzky–Golay weights for the center of a window.
+
+    Args:
+        window (int): Odd window length in points
+        order (int): Polynomial order (smaller than ``window``)
+        deriv (int): Derivative order (0 for smoothing)
+
+    Returns:
+        numpy.ndarray: Read-only weights, applied as ``sum(weights * window_values)``
+    """
+    _check_savgol(window, order, deriv)
+    weights = _derivative_basis([0.0], order, deriv).T @ _savgol_fit(window, order)
+    return _read_only(weights[0])
+
+
+@lru_cache(maxsize=128)
+def _savgol_edges(window, order, deriv):
+    # Weights evaluating the fitted polynomial at the first and last h positions,
+    # so edges are handled by fitting the first/last window ("interp" mode)
+    h = window // 2
+    fit = _savgol_fit(window, order)
+    left = (_derivative_basis(np.arange(-h, 0), order, deriv).T @ fit).T
+    right = (_derivative_basis(np.arange(1, h + 1), order, deriv).T @ fit).T
+    return _read_only(left), _read_only(right)
+
+
+def _check_savgol(window, order, deriv):
+    if window < 1 or window % 2 == 0:
+        raise ValueError("Savitzky-Golay window must be a positive odd number")
+    if order >= window:
+        raise ValueError("Polynomial order must be smaller than the window")
+    if deriv > order:
+        raise ValueError("Derivative order cannot exceed the polynomial order")
+
+
+@lru_cache(maxsize=128)
+def moving_average_kernel(window):
+    """
+    Moving average weights.
+
+    Args:
+        window (int): Window length in points
+
+    Returns:
+        numpy.ndarray: Read-only weights
+    """
+    if window < 1:
+        raise ValueError("Window must be positive")
+    return _read_only(np.full(window, 1.0 / window))
+
+
+@lru_cache(maxsize=128)
+def gaussian_kernel(sigma, truncate=4.0):
+    """
+    Normalized Gaussian weights.
+
+    Args:
+        sigma (float): Standard deviation in points
+        truncate (float): Kernel half width in standard deviations
+
+    Returns:
+        numpy.ndarray: Read-only weights
+    """
+    if sigma <= 0:
+        raise ValueError("Sigma must be positive")
+    h = max(1, int(truncate * sigma + 0.5))
+    z = np.arange(-h, h + 1, dtype=np.float64)
+    weights = np.exp(-0.5 * (z / sigma) ** 2)
+    return _read_only(weights / weights.sum())
+
+
+def correlate_stack(y, weights, out=None):
+    """
+    Apply a window of weights along the last axis with edge replication.
+
+    ``out[..., i] = sum_j weights[j] * y[..., i + j - len(weights) // 2]``
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        weights (numpy.ndarray): Window weights (odd or even length)
+        out (numpy.ndarray): Optional output array (must not be ``y``)
+
+    Returns:
+        numpy.ndarray: Filtered values, same shape as ``y``
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[-1]
+    w = weights.shape[0]
+    h = w // 2
+    padded = np.concatenate([
+        np.repeat(y[..., :1], h, axis=-1),
+        y,
+        np.repeat(y[..., -1:], w - 1 - h, axis=-1),
+    ], axis=-1)
+
+    result = out
+    if out is None or not out.flags.c_contiguous:
+        out = np.empty(y.shape)
+    if w > FFT_KERNEL_THRESHOLD:
+        size = padded.shape[-1] + w - 1
+        spectrum = np.fft.rfft(padded, size, axis=-1) * np.fft.rfft(weights[::-1], size)
+        out[...] = np.fft.irfft(spectrum, size, axis=-1)[..., w - 1:w - 1 + n]
+    else:
+        _shifted_sums(padded, weights, out)
+
+    if result is not None and result is not out:
+        result[...] = out
+        return result
+    return out
+
+
+def _shifted_sums(padded, weights, out):
+    # Shifted sums over blocks of rows keep the working set in cache
+    n = out.shape[-1]
+    w = weights.shape[0]
+    flat_padded = padded.reshape(-1, padded.shape[-1])
+    flat_out = out.reshape(-1, n)
+    block = max(1, _BLOCK_ELEMENTS // max(n, 1))
+    scratch = np.empty((min(block, flat_out.shape[0]), n))
+    for start in range(0, flat_out.shape[0], block):
+        rows = flat_padded[start:start + block]
+        target = flat_out[start:start + block]
+        tmp = scratch[:target.shape[0]]
+        np.multiply(rows[:, :n], weights[0], out=target)
+        for j in range(1, w):
+            np.multiply(rows[:, j:j + n], weights[j], out=tmp)
+            target += tmp
+
+
+def savgol_filter(y, window, order, deriv=0, delta=1.0, out=None):
+    """
+    Savitzky–Golay smoothing or derivative along the last axis.
+
+    Edges are computed from the polynomial fitted to the first and last windows.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        window (int): Odd window length in points
+        order (int): Polynomial order
+        deriv (int): Derivative order (0 for smoothing)
+        delta (float): Grid spacing, used to scale derivatives
+        out (numpy.ndarray): Optional output array (must not be ``y``)
+
+    Returns:
+        numpy.ndarray: Filtered values, same shape as ``y``
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[-1]
+    if window > n:
+        raise ValueError("Savitzky-Golay window is longer than the spectrum")
+    out = correlate_stack(y, savgol_coefficients(window, order, deriv), out=out)
+
+    h = window // 2
+    if h:
+        left, right = _savgol_edges(window, order, deriv)
+        out[..., :h] = y[..., :window] @ left
+        out[..., n - h:] = y[..., n - window:] @ right
+    if deriv:
+        out /= delta ** deriv
+    return out
+
+
+def moving_average(y, window, out=None):
+    """
+    Moving average along the last axis.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        window (int): Window length in points
+        out (numpy.ndarray): Optional output array (must not be ``y``)
+
+    Returns:
+        numpy.ndarray: Smoothed values, same shape as ``y``
+    """
+    return correlate_stack(y, moving_average_kernel(int(window)), out=out)
+
+
+def gaussian_filter(y, sigma, out=None):
+    """
+    Gaussian smoothing along the last axis.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        sigma (float): Standard deviation in points
+        out (numpy.ndarray): Optional output array (must not be ``y``)
+
+    Returns:
+        numpy.ndarray: Smoothed values, same shape as ``y``
+    """
+    return correlate_stack(y, gaussian_kernel(float(sigma)), out=out)
+
+
+def smooth(y, method, window, order=2, deriv=0, delta=1.0, out=None):
+    """
+    Apply a smoothing method by name, as used by processing recipes and the UI.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        method (str): "savgol", "moving_average" or "gaussian"
+        window (int): Window length in points (for "gaussian", sigma is ``window / 6``)
+        order (int): Polynomial order for "savgol"
+        deriv (int): Derivative order for "savgol"
+        delta (float): Grid spacing for "savgol" derivatives
+        out (numpy.ndarray): Optional output array (must not be ``y``)
+
+    Returns:
+        numpy.ndarray: Filtered values, same shape as ``y``
+    """
+    if method == "savgol":
+        window = int(window) | 1
+        return savgol_filter(y, window, min(int(order), window - 1), deriv, delta, out=out)
+    if method == "moving_average":
+        return moving_average(y, window, out=out)
+    if method == "gaussian":
+        return gaussian_filter(y, max(window / 6.0, 1e-3), out=out)
+    raise ValueError(f"Unknown smoothing method: {method}")
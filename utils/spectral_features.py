@@ -0,0 +1,266 @@
+"""
+Vectorized peak detection and spectral feature extraction.
+
+Functions accept one spectrum (1D) or a stack of spectra on a shared grid
+(2D, one per row) and return compact NumPy structured arrays, so they can be
+used on a live sweep stream as well as over a whole archive. Values are
+expected on a linear scale; pass ``db=True`` for traces in dB/dBm.
+"""
+
+import numpy as np
+
+from utils.resampling import get_resampler
+from utils.spectral_ops import db_to_linear
+
+PEAK_DTYPE = np.dtype([
+    ("spectrum", np.int32),     # Row of the spectrum in the input stack
+    ("index", np.int32),        # Index of the peak on the grid
+    ("wavelength", np.float64),
+    ("height", np.float64),
+    ("fwhm", np.float64),       # Full width at half maximum above the noise floor (NaN if not found)
+    ("centroid", np.float64),   # Intensity-weighted wavelength inside the FWHM
+    ("osnr_db", np.float64),    # Peak height over noise floor, in dB
+])
+
+SUMMARY_DTYPE = np.dtype([
+    ("noise_floor", np.float64),
+    ("n_peaks", np.int32),
+    ("peak_wavelength", np.float64),
+    ("peak_height", np.float64),
+    ("fwhm", np.float64),
+    ("centroid", np.float64),
+    ("osnr_db", np.float64),
+])
+
+# Maximum number of window elements processed at once when measuring widths
+_WINDOW_BLOCK = 1 << 22
+
+
+def _as_stack(x, y, db):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[np.newaxis]
+    if y.shape[-1] != x.shape[0]:
+        raise ValueError("Spectra and wavelength grid have different lengths")
+    if db:
+        y = db_to_linear(y)
+    return x, y
+
+
+def noise_floor(y, percentile=10):
+    """
+    Estimate the noise floor of each spectrum as a low percentile of its values.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row), linear scale
+        percentile (float): Percentile used as noise floor
+
+    Returns:
+        numpy.ndarray: Noise floor per spectrum
+    """
+    return np.percentile(y, percentile, axis=-1)
+
+
+def _local_maxima(y, threshold, min_distance):
+    if min_distance <= 1:
+        is_peak = np.zeros(y.shape, dtype=bool)
+        is_peak[:, 1:-1] = (y[:, 1:-1] > y[:, :-2]) & (y[:, 1:-1] >= y[:, 2:])
+    else:
+        # A peak must be the maximum of its +/- min_distance neighbourhood
+        window_max = y.copy()
+        for shift in range(1, min_distance + 1):
+            np.maximum(window_max[:, shift:], y[:, :-shift], out=window_max[:, shift:])
+            np.maximum(window_max[:, :-shift], y[:, shift:], out=window_max[:, :-shift])
+        is_peak = y >= window_max
+        is_peak[:, 1:] &= y[:, 1:] > y[:, :-1]
+        is_peak[:, [0, -1]] = False
+    is_peak &= y >= threshold[:, np.newaxis]
+    return np.nonzero(is_peak)
+
+
+def _measure_widths(x, y, rows, cols, levels, max_width):
+    """Measure FWHM and centroid for each peak using a window of +/- max_width points."""
+    n = y.shape[1]
+    offsets = np.arange(-max_width, max_width + 1)
+    fwhm = np.full(rows.shape[0], np.nan)
+    centroid = np.full(rows.shape[0], np.nan)
+    block = max(1, _WINDOW_BLOCK // offsets.shape[0])
+
+    for start in range(0, rows.shape[0], block):
+        r = rows[start:start + block, np.newaxis]
+        positions = cols[start:start + block, np.newaxis] + offsets
+        inside = (positions >= 0) & (positions < n)
+        positions = np.clip(positions, 0, n - 1)
+        values = np.where(inside, y[r, positions], np.inf)
+        level = levels[start:start + block, np.newaxis]
+        below = values < level
+
+        left_below = below[:, :max_width][:, ::-1]
+        right_below = below[:, max_width + 1:]
+        found = left_below.any(axis=1) & right_below.any(axis=1)
+        left = max_width - 1 - left_below.argmax(axis=1)
+        right = max_width + 1 + right_below.argmax(axis=1)
+
+        row_index = np.arange(values.shape[0])
+        xs = x[positions]
+        lv = level[:, 0]
+
+        # Interpolate the crossings between the last point below and the first above
+        y0, y1 = values[row_index, left], values[row_index, left + 1]
+        x0, x1 = xs[row_index, left], xs[row_index, left + 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_left = x0 + (lv - y0) * (x1 - x0) / (y1 - y0)
+            y0, y1 = values[row_index, right - 1], values[row_index, right]
+            x0, x1 = xs[row_index, right - 1], xs[row_index, right]
+            x_right = x0 + (lv - y0) * (x1 - x0) / (y1 - y0)
+
+            window = np.arange(offsets.shape[0])
+            core = (window > left[:, np.newaxis]) & (window < right[:, np.newaxis])
+            weights = np.where(core, values, 0.0)
+            c = (weights * xs).sum(axis=1) / weights.sum(axis=1)
+
+        fwhm[start:start + block] = np.where(found, np.abs(x_right - x_left), np.nan)
+        centroid[start:start + block] = np.where(found, c, np.nan)
+
+    return fwhm, centroid
+
+
+def find_peaks(x, y, min_height=None, rel_threshold=0.1, min_distance=1,
+               max_peaks=None, max_width=None, noise_percentile=10, db=False):
+    """
+    Find peaks and measure their width, centroid and OSNR.
+
+    Args:
+        x (numpy.ndarray): Wavelength grid shared by all spectra
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        min_height (float): Minimum peak height; by default ``rel_threshold`` is used
+        rel_threshold (float): Minimum height as a fraction of the range between noise floor and maximum
+        min_distance (int): Minimum separation between peaks, in points
+        max_peaks (int): Keep only the highest peaks of each spectrum
+        max_width (int): Half window, in points, searched for the half-maximum crossings
+        noise_percentile (float): Percentile used to estimate the noise floor
+        db (bool): Whether ``y`` is in dB (converted to linear before analysis)
+
+    Returns:
+        numpy.ndarray: Structured array with ``PEAK_DTYPE``, ordered by spectrum and descending height
+    """
+    x, y = _as_stack(x, y, db)
+    return _find_peaks(x, y, noise_floor(y, noise_percentile), min_height, rel_threshold,
+                       min_distance, max_peaks, max_width)
+
+
+def _find_peaks(x, y, floor, min_height=None, rel_threshold=0.1, min_distance=1,
+                max_peaks=None, max_width=None):
+    k, n = y.shape
+    if min_height is not None:
+        threshold = np.full(k, float(min_height))
+    else:
+        threshold = floor + rel_threshold * (y.max(axis=1) - floor)
+
+    rows, cols = _local_maxima(y, threshold, int(min_distance))
+    heights = y[rows, cols]
+
+    # Order by spectrum, then by descending height, and keep the top max_peaks
+    order = np.lexsort((-heights, rows))
+    rows, cols, heights = rows[order], cols[order], heights[order]
+    if max_peaks is not None and rows.size:
+        first = np.searchsorted(rows, rows, side="left")
+        keep = (np.arange(rows.size) - first) < max_peaks
+        rows, cols, heights = rows[keep], cols[keep], heights[keep]
+
+    levels = floor[rows] + 0.5 * (heights - floor[rows])
+    if max_width is None:
+        max_width = max(1, min(n // 4, 2048))
+    fwhm, centroid = _measure_widths(x, y, rows, cols, levels, int(max_width))
+
+    peaks = np.empty(rows.size, dtype=PEAK_DTYPE)
+    peaks["spectrum"] = rows
+    peaks["index"] = cols
+    peaks["wavelength"] = x[cols]
+    peaks["height"] = heights
+    peaks["fwhm"] = fwhm
+    peaks["centroid"] = centroid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peaks["osnr_db"] = np.where(floor[rows] > 0, 10 * np.log10(heights / floor[rows]), np.nan)
+    return peaks
+
+
+def band_integrals(x, y, bands, db=False):
+    """
+    Integrate spectra over wavelength bands with the trapezoidal rule.
+
+    Args:
+        x (numpy.ndarray): Wavelength grid shared by all spectra
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        bands (list): ``(start, stop)`` pairs; bands are clipped to the grid range
+        db (bool): Whether ``y`` is in dB (converted to linear before integrating)
+
+    Returns:
+        numpy.ndarray: Integrals with shape ``(k, len(bands))``
+    """
+    x, y = _as_stack(x, y, db)
+    if x[0] > x[-1]:
+        x, y = x[::-1], y[:, ::-1]
+
+    cumulative = np.empty(y.shape)
+    cumulative[:, 0] = 0.0
+    np.cumsum(0.5 * (y[:, 1:] + y[:, :-1]) * np.diff(x), axis=1, out=cumulative[:, 1:])
+
+    edges = np.clip(np.asarray(bands, dtype=np.float64).reshape(-1, 2), x[0], x[-1])
+    at_edges = get_resampler(x, edges.ravel(), "linear").apply(cumulative)
+    at_edges = at_edges.reshape(y.shape[0], -1, 2)
+    return at_edges[..., 1] - at_edges[..., 0]
+
+
+def summarize_peaks(peaks, n_spectra, floor):
+    """
+    Build the per-spectrum summary from a peak table.
+
+    Args:
+        peaks (numpy.ndarray): Output of ``find_peaks``
+        n_spectra (int): Number of spectra analysed
+        floor (numpy.ndarray): Noise floor per spectrum
+
+    Returns:
+        numpy.ndarray: Structured array with ``SUMMARY_DTYPE``, one row per spectrum
+    """
+    summary = np.zeros(n_spectra, dtype=SUMMARY_DTYPE)
+    summary["noise_floor"] = floor
+    summary["n_peaks"] = np.bincount(peaks["spectrum"], minlength=n_spectra)
+    for field in ("peak_wavelength", "peak_height", "fwhm", "centroid", "osnr_db"):
+        summary[field] = np.nan
+
+    # Peaks are sorted by descending height, so the first of each spectrum is the strongest
+    if peaks.size:
+        spectra, first = np.unique(peaks["spectrum"], return_index=True)
+        strongest = peaks[first]
+        summary["peak_wavelength"][spectra] = strongest["wavelength"]
+        summary["peak_height"][spectra] = strongest["height"]
+        summary["fwhm"][spectra] = strongest["fwhm"]
+        summary["centroid"][spectra] = strongest["centroid"]
+        summary["osnr_db"][spectra] = strongest["osnr_db"]
+    return summary
+
+
+def extract_features(x, y, bands=None, db=False, noise_percentile=10, **peak_options):
+    """
+    Extract peaks, a per-spectrum summary and optional band integrals.
+
+    Args:
+        x (numpy.ndarray): Wavelength grid shared by all spectra
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        bands (list): Optional ``(start, stop)`` pairs for band integrals
+        db (bool): Whether ``y`` is in dB
+        noise_percentile (float): Percentile used to estimate the noise floor
+        **peak_options: Extra options for ``find_peaks``
+
+    Returns:
+        tuple: Peak table, summary table and band integrals (None if no bands)
+    """
+    x, y = _as_stack(x, y, db)
+    floor = noise_floor(y, noise_percentile)
+    peaks = _find_peaks(x, y, floor, **peak_options)
+    summary = summarize_peaks(peaks, y.shape[0], floor)
+    integrals = band_integrals(x, y, bands) if bands else None
+    return peaks, summary, integrals
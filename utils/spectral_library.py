@@ -0,0 +1,287 @@
+"""
+Similarity-search index over a library of reference spectra.
+
+References are converted to nm, resampled onto a canonical wavelength grid and
+normalized for the chosen metric, so a query is a single matrix-vector
+product followed by a top-k selection. The index can optionally be compressed
+with PCA and is persisted to disk, where new references are added
+incrementally.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.resampling import common_grid, get_resampler
+from utils.spectral_ops import wavenumber_to_wavelength
+from utils.spectrum_archive import read_spectrum_file, SOURCE_KINDS
+
+# cosine: angle between intensity vectors; sam: spectral angle mapper (same
+# ranking as cosine, reported in radians); correlation: Pearson correlation
+LIBRARY_METRICS = ("cosine", "sam", "correlation")
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "library.json"
+
+
+def _to_wavelength(x, kind):
+    x = np.asarray(x, dtype=np.float64)
+    return wavenumber_to_wavelength(x) if kind == "dpt" else x
+
+
+class SpectralLibrary:
+    """
+    Nearest-neighbour index over reference spectra on a canonical grid.
+    """
+
+    def __init__(self, grid_start=900.0, grid_stop=2500.0, n_points=1601, metric="cosine", n_components=None):
+        """
+        Create an empty library.
+
+        Args:
+            grid_start (float): First wavelength of the canonical grid, in nm
+            grid_stop (float): Last wavelength of the canonical grid, in nm
+            n_points (int): Number of points of the canonical grid
+            metric (str): "cosine", "sam" or "correlation"
+            n_components (int): Number of PCA components used to compress the index (None to disable)
+        """
+        if metric not in LIBRARY_METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        self.grid = common_grid(grid_start, grid_stop, n_points)
+        self.metric = metric
+        self.n_components = n_components
+        self.names = []
+        self.sources = {}
+        self.vectors = np.empty((0, self.grid.shape[0]), dtype=np.float32)
+        self.components = None
+        self.projected = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def prepare(self, x, y, kind="csv"):
+        """
+        Resample and normalize spectra the same way as the library entries.
+
+        Args:
+            x (array-like): X axis (nm, or cm^-1 if ``kind`` is "dpt")
+            y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+            kind (str): "dpt" for wavenumber axes, "csv" for wavelength axes
+
+        Returns:
+            numpy.ndarray: Normalized vectors on the canonical grid, shape ``(k, n_points)``
+        """
+        vectors = get_resampler(_to_wavelength(x, kind), self.grid, "linear").apply(y)
+        vectors = np.atleast_2d(vectors)
+        valid = ~np.isnan(vectors)
+
+        if self.metric == "correlation":
+            # Center over the overlapping part of the grid only
+            counts = np.maximum(valid.sum(axis=1, keepdims=True), 1)
+            means = np.where(valid, vectors, 0.0).sum(axis=1, keepdims=True) / counts
+            vectors -= means
+        vectors[~valid] = 0.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        return vectors.astype(np.float32)
+
+    def add(self, name, x, y, kind="csv", source=None):
+        """
+        Add a reference spectrum to the library (replacing one with the same name).
+
+        Args:
+            name (str): Reference name
+            x (array-like): X axis (nm, or cm^-1 if ``kind`` is "dpt")
+            y (array-like): Intensity values
+            kind (str): "dpt" or "csv"
+            source (dict): Optional source information (path, size, mtime) for incremental updates
+        """
+        vector = self.prepare(x, np.asarray(y, dtype=np.float64), kind)
+        if name in self.names:
+            row = self.names.index(name)
+            self.vectors[row] = vector[0]
+            if self.projected is not None:
+                self.projected[row] = vector[0] @ self.components
+        else:
+            self.names.append(name)
+            self.vectors = np.concatenate([self.vectors, vector])
+            if self.projected is not None:
+                self.projected = np.concatenate([self.projected, vector @ self.components])
+        if source is not None:
+            self.sources[name] = source
+
+    def remove(self, names):
+        """
+        Remove references from the library.
+
+        Args:
+            names (iterable): Names of the references to remove (unknown names are ignored)
+        """
+        names = set(names)
+        keep = [row for row, name in enumerate(self.names) if name not in names]
+        if len(keep) == len(self.names):
+            return
+        self.names = [self.names[row] for row in keep]
+        self.vectors = self.vectors[keep]
+        if self.projected is not None:
+            self.projected = self.projected[keep]
+        for name in names:
+            self.sources.pop(name, None)
+
+    def fit_compression(self, n_components=None):
+        """
+        Compute the PCA basis used to compress the index.
+
+        The basis is the set of leading right singular vectors of the library
+        matrix; references added later are projected onto the existing basis.
+
+        Args:
+            n_components (int): Number of components (defaults to the library setting)
+        """
+        n_components = n_components or self.n_components
+        if not n_components or not len(self):
+            self.components = None
+            self.projected = None
+            return
+        n_components = min(n_components, len(self), self.grid.shape[0])
+        _, _, vt = np.linalg.svd(self.vectors.astype(np.float64), full_matrices=False)
+        self.n_components = n_components
+        self.components = np.ascontiguousarray(vt[:n_components].T, dtype=np.float32)
+        self.projected = self.vectors @ self.components
+
+    def query(self, x, y, kind="csv", k=5):
+        """
+        Find the references most similar to one or more spectra.
+
+        Args:
+            x (array-like): X axis of the query spectra
+            y (numpy.ndarray): Query spectrum (1D) or spectra (2D, one per row)
+            kind (str): "dpt" or "csv"
+            k (int): Number of matches returned per query
+
+        Returns:
+            list: One list per query of ``(name, score)`` tuples, best first. Scores are
+            similarities for "cosine"/"correlation" and angles in radians for "sam".
+        """
+        queries = self.prepare(x, np.asarray(y, dtype=np.float64), kind)
+        return self.query_vectors(queries, k)
+
+    def query_vectors(self, queries, k=5):
+        """
+        Find the references most similar to already prepared vectors.
+
+        Args:
+            queries (numpy.ndarray): Output of ``prepare``
+            k (int): Number of matches returned per query
+
+        Returns:
+            list: One list per query of ``(name, score)`` tuples, best first
+        """
+        if not len(self):
+            return [[] for _ in range(queries.shape[0])]
+        if self.projected is not None:
+            scores = (queries @ self.components) @ self.projected.T
+        else:
+            scores = queries @ self.vectors.T
+
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        if self.metric == "sam":
+            top_scores = np.arccos(np.clip(top_scores, -1.0, 1.0))
+        return [
+            [(self.names[i], float(s)) for i, s in zip(rows, row_scores)]
+            for rows, row_scores in zip(top, top_scores)
+        ]
+
+    def update_from_directory(self, directory):
+        """
+        Add new or modified DPT/CSV references found in a directory and remove
+        the ones whose files were deleted.
+
+        Args:
+            directory (str): Directory with reference files
+
+        Returns:
+            int: Number of references added, updated or removed
+        """
+        filenames = [
+            filename for filename in sorted(os.listdir(directory))
+            if os.path.splitext(filename)[1].lower() in SOURCE_KINDS
+        ]
+        # Only references read from files are removed, not ones added directly
+        deleted = set(self.sources) - set(filenames)
+        self.remove(deleted)
+        updated = len(deleted)
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if self.sources.get(filename) == source:
+                continue
+            kind, x, y = read_spectrum_file(path)
+            self.add(filename, x, y, kind=kind, source=source)
+            updated += 1
+        return updated
+
+    def save(self, directory):
+        """
+        Persist the library to a directory.
+
+        Args:
+            directory (str): Destination directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"vectors": self.vectors}
+        if self.components is not None:
+            arrays["components"] = self.components
+        for name, array in arrays.items():
+            tmp_path = os.path.join(directory, f"{name}.npy.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+
+        metadata = {
+            "grid": [float(self.grid[0]), float(self.grid[-1]), int(self.grid.shape[0])],
+            "metric": self.metric,
+            "n_components": self.n_components if self.components is not None else None,
+            "names": self.names,
+            "sources": self.sources,
+            "saved_at": time.time(),
+        }
+        tmp_path = os.path.join(directory, METADATA_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, os.path.join(directory, METADATA_FILE))
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a library saved with ``save``.
+
+        Args:
+            directory (str): Library directory
+
+        Returns:
+            SpectralLibrary: The loaded library
+        """
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+        start, stop, n_points = metadata["grid"]
+        library = cls(start, stop, n_points, metric=metadata["metric"], n_components=metadata["n_components"])
+        library.names = metadata["names"]
+        library.sources = metadata["sources"]
+        library.vectors = np.load(os.path.join(directory, VECTORS_FILE))
+        components_path = os.path.join(directory, "components.npy")
+        if metadata["n_components"] and os.path.exists(components_path):
+            library.components = np.load(components_path)
+            library.projected = library.vectors @ library.components
+        return library
@@ -0,0 +1,319 @@
+"""
+NumPy spectral processing engine for the OSA Remote Control application.
+
+All operations work on contiguous NumPy arrays and accept an optional ``out``
+array so callers that process many spectra can reuse buffers instead of
+allocating new ones. Operations reduce along the last axis, so they apply
+equally to a single spectrum (1D) or a stack of spectra (2D, one per row).
+"""
+
+import numpy as np
+
+# Conversion factor between wavenumbers (cm^-1) and wavelengths (nm)
+NM_PER_INVERSE_CM = 1e7
+
+
+def wavenumber_to_wavelength(wavenumber, out=None):
+    """
+    Convert wavenumbers in cm^-1 to wavelengths in nm.
+
+    The conversion is its own inverse, so it also converts nm to cm^-1.
+
+    Args:
+        wavenumber (numpy.ndarray): Wavenumbers in cm^-1
+        out (numpy.ndarray): Optional output array (may be ``wavenumber`` itself)
+
+    Returns:
+        numpy.ndarray: Wavelengths in nm
+    """
+    return np.divide(NM_PER_INVERSE_CM, wavenumber, out=out)
+
+
+wavelength_to_wavenumber = wavenumber_to_wavelength
+
+
+def range_slice(x, low=None, high=None):
+    """
+    Find the slice of a monotonic axis that lies within ``[low, high]``.
+
+    Args:
+        x (numpy.ndarray): Monotonic (increasing or decreasing) 1D axis
+        low (float): Lower bound, or None for no lower bound
+        high (float): Upper bound, or None for no upper bound
+
+    Returns:
+        slice: Slice selecting the values inside the range, or None if ``x`` is not monotonic
+    """
+    n = x.shape[0]
+    if n < 2:
+        return slice(0, n)
+    low = -np.inf if low is None else low
+    high = np.inf if high is None else high
+    if x[0] <= x[-1]:
+        if np.any(x[1:] < x[:-1]):
+            return None
+        return slice(np.searchsorted(x, low, side="left"), np.searchsorted(x, high, side="right"))
+    if np.any(x[1:] > x[:-1]):
+        return None
+    # Decreasing axis: search on the negated values
+    start = np.searchsorted(-x, -high, side="left")
+    stop = np.searchsorted(-x, -low, side="right")
+    return slice(start, stop)
+
+
+def crop_range(x, y, low=None, high=None):
+    """
+    Crop a spectrum to a range of its x axis.
+
+    For monotonic axes the result is a pair of views (no copy); otherwise a
+    boolean mask is applied.
+
+    Args:
+        x (numpy.ndarray): 1D x axis
+        y (numpy.ndarray): Values along the last axis (1D or 2D)
+        low (float): Lower bound, or None for no lower bound
+        high (float): Upper bound, or None for no upper bound
+
+    Returns:
+        tuple: Cropped x and y
+    """
+    selection = range_slice(x, low, high)
+    if selection is None:
+        selection = np.ones(x.shape, dtype=bool)
+        if low is not None:
+            selection &= x >= low
+        if high is not None:
+            selection &= x <= high
+    return x[selection], y[..., selection]
+
+
+def normalize_max(y, out=None):
+    """
+    Divide a spectrum by its maximum value.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        out (numpy.ndarray): Optional output array (may be ``y`` itself)
+
+    Returns:
+        numpy.ndarray: Normalized spectrum
+    """
+    return np.divide(y, y.max(axis=-1, keepdims=y.ndim > 1), out=out)
+
+
+def normalize_minmax(y, out=None):
+    """
+    Scale a spectrum to the ``[0, 1]`` range.
+
+    Flat spectra (max equal to min) are returned unchanged.
+
+    Args:
+        y (numpy.ndarray): Spectrum (1D) or spectra (2D, one per row)
+        out (numpy.ndarray): Optional output array (may be ``y`` itself)
+
+    Returns:
+        numpy.ndarray: Normalized spectrum
+    """
+    keepdims = y.ndim > 1
+    low = y.min(axis=-1, keepdims=keepdims)
+    span = y.max(axis=-1, keepdims=keepdims) - low
+    # Avoid division by zero: flat spectra keep their values
+    flat = span <= 0
+    if np.any(flat):
+        low = np.where(flat, 0, low)
+        span = np.where(flat, 1, span)
+    out = np.subtract(y, low, out=out)
+    return np.divide(out, span, out=out)
+
+
+def reflectance_from_absorbance(absorbance, out=None):
+    """
+    Compute reflectance as ``1 - absorbance`` for max-normalized spectra.
+
+    Args:
+        absorbance (numpy.ndarray): Normalized absorbance
+        out (numpy.ndarray): Optional output array (may be ``absorbance`` itself)
+
+    Returns:
+        numpy.ndarray: Reflectance
+    """
+    return np.subtract(1.0, absorbance, out=out)
+
+
+def db_to_linear(y, out=None):
+    """
+    Convert values in dB (e.g. dBm) to linear scale.
+
+    Args:
+        y (numpy.ndarray): Values in dB
+        out (numpy.ndarray): Optional output array (may be ``y`` itself)
+
+    Returns:
+        numpy.ndarray: Linear values
+    """
+    out = np.multiply(y, 0.1, out=out)
+    return np.power(10.0, out, out=out)
+
+
+def linear_to_db(y, out=None):
+    """
+    Convert linear values to dB.
+
+    Args:
+        y (numpy.ndarray): Linear values (must be positive)
+        out (numpy.ndarray): Optional output array (may be ``y`` itself)
+
+    Returns:
+        numpy.ndarray: Values in dB
+    """
+    out = np.log10(y, out=out)
+    return np.multiply(out, 10.0, out=out)
+
+
+def process_dpt_arrays(wavenumber, intensity, max_wavelength=2500, out=None):
+    """
+    Compute wavelength, reflectance and absorbance for a DPT reference.
+
+    This is the array version of ``process_dpt_dataframe``: wavenumbers are
+    converted to nm, data above ``max_wavelength`` is dropped, intensity is
+    normalized by its maximum (absorbance) and reflectance is ``1 - absorbance``.
+
+    Args:
+        wavenumber (numpy.ndarray): Wavenumbers in cm^-1
+        intensity (numpy.ndarray): Intensity values
+        max_wavelength (float): Largest wavelength kept, in nm
+        out (numpy.ndarray): Optional ``(3, n)`` buffer, with ``n`` at least the input length
+
+    Returns:
+        tuple: Wavelength (nm), reflectance and absorbance arrays (views into ``out``)
+    """
+    n = wavenumber.shape[0]
+    if out is None:
+        out = np.empty((3, n), dtype=np.float64)
+    wavelength = wavenumber_to_wavelength(wavenumber, out=out[0, :n])
+
+    selection = range_slice(wavelength, None, max_wavelength)
+    if selection is None:
+        mask = wavelength <= max_wavelength
+        m = int(np.count_nonzero(mask))
+        out[0, :m] = wavelength[mask]
+        out[2, :m] = intensity[mask]
+        wavelength = out[0, :m]
+        absorbance = out[2, :m]
+    else:
+        m = selection.stop - selection.start
+        wavelength = wavelength[selection]
+        absorbance = out[2, :m]
+        absorbance[:] = intensity[selection]
+
+    normalize_max(absorbance, out=absorbance)
+    reflectance = reflectance_from_absorbance(absorbance, out=out[1, :m])
+    return wavelength, reflectance, absorbance
+
+
+def _reference_rows(references, n_samples, reference_index):
+    """
+    Resolve which reference row applies to each sample.
+
+    Returns:
+        numpy.ndarray: Index array of length ``n_samples``, or None to broadcast a single reference
+    """
+    if reference_index is not None:
+        reference_index = np.asarray(reference_index, dtype=np.intp)
+        if reference_index.shape != (n_samples,):
+            raise ValueError("reference_index must have one entry per sample")
+        return reference_index
+    if references.shape[0] == 1:
+        return None
+    if references.shape[0] == n_samples:
+        return np.arange(n_samples)
+    raise ValueError(
+        "Cannot pair samples with references: pass one reference, one per sample, or a reference_index"
+    )
+
+
+def iter_batch_ratio(samples, references, reference_index=None, chunk_size=1024):
+    """
+    Compute ratio, reflectance and absorbance for sample/reference pairs in chunks.
+
+    Each spectrum is normalized by its maximum first, as in ``procesamiento1.py``.
+    For a sample ``s`` and its reference ``r`` (both normalized):
+
+    - ratio = r / s
+    - reflectance = s / r
+    - absorbance = -log10(reflectance)
+
+    The arrays yielded for each chunk are reused buffers; copy them if they
+    must outlive the next iteration. Memory use is bounded by ``chunk_size``.
+
+    Args:
+        samples (numpy.ndarray): Sample spectra, shape ``(k, n)``
+        references (numpy.ndarray): Reference spectra, shape ``(n,)`` or ``(m, n)``
+        reference_index (array-like): Reference row for each sample (length ``k``)
+        chunk_size (int): Maximum number of samples processed at once
+
+    Yields:
+        tuple: Start row, stop row, ratio, reflectance and absorbance for the chunk
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 1:
+        samples = samples[np.newaxis]
+    references = np.asarray(references, dtype=np.float64)
+    if references.ndim == 1:
+        references = references[np.newaxis]
+    if samples.shape[1] != references.shape[1]:
+        raise ValueError("Samples and references must share the same wavelength grid")
+
+    k, n = samples.shape
+    rows = _reference_rows(references, k, reference_index)
+    normalized_references = normalize_max(references)
+
+    chunk_size = max(1, min(chunk_size, k))
+    sample_buffer = np.empty((chunk_size, n))
+    reference_buffer = np.empty((chunk_size, n)) if rows is not None else None
+    ratio_buffer = np.empty((chunk_size, n))
+    reflectance_buffer = np.empty((chunk_size, n))
+    absorbance_buffer = np.empty((chunk_size, n))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start in range(0, k, chunk_size):
+            stop = min(start + chunk_size, k)
+            c = stop - start
+            normalized_samples = normalize_max(samples[start:stop], out=sample_buffer[:c])
+            if rows is None:
+                reference = normalized_references[0]
+            else:
+                reference = np.take(normalized_references, rows[start:stop], axis=0, out=reference_buffer[:c])
+
+            ratio = np.divide(reference, normalized_samples, out=ratio_buffer[:c])
+            reflectance = np.divide(normalized_samples, reference, out=reflectance_buffer[:c])
+            absorbance = np.log10(ratio, out=absorbance_buffer[:c])
+            yield start, stop, ratio, reflectance, absorbance
+
+
+def batch_ratio(samples, references, reference_index=None, chunk_size=1024):
+    """
+    Compute ratio, reflectance and absorbance for every sample/reference pair.
+
+    See ``iter_batch_ratio`` for the definitions and pairing rules.
+
+    Args:
+        samples (numpy.ndarray): Sample spectra, shape ``(k, n)``
+        references (numpy.ndarray): Reference spectra, shape ``(n,)`` or ``(m, n)``
+        reference_index (array-like): Reference row for each sample (length ``k``)
+        chunk_size (int): Maximum number of samples processed at once
+
+    Returns:
+        tuple: Ratio, reflectance and absorbance arrays, each of shape ``(k, n)``
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 1:
+        samples = samples[np.newaxis]
+    ratio = np.empty(samples.shape)
+    reflectance = np.empty(samples.shape)
+    absorbance = np.empty(samples.shape)
+    for start, stop, r, refl, a in iter_batch_ratio(samples, references, reference_index, chunk_size):
+        ratio[start:stop] = r
+        reflectance[start:stop] = refl
+        absorbance[start:stop] = a
+    return ratio, reflectance, absorbance
@@ -0,0 +1,336 @@
+"""
+Binary spectrum archive for the OSA Remote Control application.
+
+Spectra are stored as ``.npy`` files holding a ``(2, n)`` array (row 0 is the
+x axis, row 1 the intensity) so they can be memory-mapped without parsing.
+A SQLite catalog records where each spectrum came from, which allows bulk
+conversions to resume and skip files that have not changed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from utils.data_processing import load_dpt_file, load_csv_file
+
+# File extensions understood by the converter and the parser used for each one
+SOURCE_KINDS = {
+    ".dpt": "dpt",
+    ".csv": "csv",
+}
+
+CATALOG_NAME = "catalog.sqlite"
+DATA_DIR = "data"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spectra (
+    key TEXT PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    n_points INTEGER NOT NULL,
+    x_min REAL,
+    x_max REAL,
+    dtype TEXT NOT NULL,
+    converted_at REAL NOT NULL
+)
+"""
+
+_COLUMNS = ("key", "source", "kind", "size", "mtime_ns", "path",
+            "n_points", "x_min", "x_max", "dtype", "converted_at")
+
+
+def source_key(source):
+    """
+    Compute the archive key for a source file.
+
+    Args:
+        source (str): Source path relative to the converted tree
+
+    Returns:
+        str: Hex digest identifying the spectrum inside the archive
+    """
+    normalized = source.replace(os.sep, "/")
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def read_spectrum_file(file_path):
+    """
+    Parse a DPT or CSV file into x and intensity arrays.
+
+    The same parsing rules as ``load_dpt_file`` and ``load_csv_file`` are used,
+    so DPT files yield wavenumbers (cm^-1) and CSV files yield wavelengths (nm).
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        tuple: Kind ("dpt" or "csv"), x array and intensity array
+    """
+    kind = SOURCE_KINDS.get(os.path.splitext(file_path)[1].lower())
+    if kind == "dpt":
+        df = load_dpt_file(file_path)
+        return kind, df["Wavelength"].to_numpy(), df["Intensity"].to_numpy()
+    if kind == "csv":
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            df = load_csv_file(f.read())
+        return kind, df["wavelength"].to_numpy(), df["intensity"].to_numpy()
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def write_array(path, array):
+    """
+    Atomically write an array to a ``.npy`` file.
+
+    Args:
+        path (str): Destination path
+        array (numpy.ndarray): Array to write
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+class SpectrumArchive:
+    """
+    Directory of binary spectra indexed by a SQLite catalog.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, DATA_DIR), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, CATALOG_NAME))
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        """Close the catalog connection."""
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def relative_data_path(self, key):
+        """
+        Get the data file path of a key, relative to the archive root.
+
+        Args:
+            key (str): Spectrum key
+
+        Returns:
+            str: Relative path of the ``.npy`` file
+        """
+        return os.path.join(DATA_DIR, key[:2], f"{key}.npy")
+
+    def is_current(self, source, size, mtime_ns):
+        """
+        Check whether a source file is already converted and unchanged.
+
+        Args:
+            source (str): Source path relative to the converted tree
+            size (int): Current file size in bytes
+            mtime_ns (int): Current modification time in nanoseconds
+
+        Returns:
+            bool: True if the catalog entry matches and its data file exists
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, path FROM spectra WHERE source = ?", (source,)
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return False
+        return os.path.exists(os.path.join(self.root, row[2]))
+
+    def record(self, entry):
+        """
+        Insert or replace a catalog entry.
+
+        Args:
+            entry (dict): Entry with the catalog columns
+        """
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO spectra ({', '.join(_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+            tuple(entry[column] for column in _COLUMNS),
+        )
+
+    def commit(self):
+        """Flush pending catalog changes to disk."""
+        self.connection.commit()
+
+    def add(self, source, kind, x, intensity, size=0, mtime_ns=0, dtype=np.float64, commit=True):
+        """
+        Write a spectrum to the archive and record it in the catalog.
+
+        Args:
+            source (str): Identifier of the spectrum (usually its source path)
+            kind (str): Kind of x axis ("dpt" for cm^-1, "csv" for nm)
+            x (array-like): X axis values
+            intensity (array-like): Intensity values
+            size (int): Size of the source file in bytes
+            mtime_ns (int): Modification time of the source file
+            dtype: NumPy dtype used for storage
+            commit (bool): Whether to commit the catalog immediately
+
+        Returns:
+            str: Key of the stored spectrum
+        """
+        key = source_key(source)
+        path = self.relative_data_path(key)
+        array = np.vstack([np.asarray(x), np.asarray(intensity)]).astype(dtype, copy=False)
+        write_array(os.path.join(self.root, path), array)
+        self.record(_make_entry(key, source, kind, size, mtime_ns, path, array))
+        if commit:
+            self.commit()
+        return key
+
+    def load(self, key, mmap=True):
+        """
+        Load a spectrum from the archive.
+
+        Args:
+            key (str): Spectrum key
+            mmap (bool): Whether to memory-map the data file instead of reading it
+
+        Returns:
+            tuple: X axis array and intensity array
+        """
+        array = np.load(
+            os.path.join(self.root, self.relative_data_path(key)),
+            mmap_mode="r" if mmap else None,
+        )
+        return array[0], array[1]
+
+    def entries(self, kind=None):
+        """
+        List the catalog entries.
+
+        Args:
+            kind (str): Restrict the listing to one kind ("dpt" or "csv")
+
+        Returns:
+            list: Catalog entries as dictionaries, ordered by source path
+        """
+        query = f"SELECT {', '.join(_COLUMNS)} FROM spectra"
+        params = ()
+        if kind:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        query += " ORDER BY source"
+        return [dict(zip(_COLUMNS, row)) for row in self.connection.execute(query, params)]
+
+    def sources(self, keys):
+        """
+        Get the source path of some spectra.
+
+        Args:
+            keys (list): Spectrum keys
+
+        Returns:
+            dict: Source path by key, for the keys present in the catalog
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT key, source FROM spectra WHERE key IN ({', '.join('?' for _ in keys)})", keys
+        )
+        return dict(rows.fetchall())
+
+    def versions(self, keys):
+        """
+        Get the conversion time of some spectra, to tell apart successive
+        conversions of the same source (its key does not change).
+
+        Args:
+            keys (list): Spectrum keys
+
+        Returns:
+            dict: Conversion time by key, for the keys present in the catalog
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT key, converted_at FROM spectra WHERE key IN ({', '.join('?' for _ in keys)})", keys
+        )
+        return dict(rows.fetchall())
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM spectra").fetchone()[0]
+
+
+def _make_entry(key, source, kind, size, mtime_ns, path, array):
+    x = array[0]
+    return {
+        "key": key,
+        "source": source,
+        "kind": kind,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "path": path,
+        "n_points": int(array.shape[1]),
+        "x_min": float(x.min()) if x.size else None,
+        "x_max": float(x.max()) if x.size else None,
+        "dtype": array.dtype.name,
+        "converted_at": time.time(),
+    }
+
+
+def convert_file(archive_root, source_root, source, size, mtime_ns, dtype="float64"):
+    """
+    Parse one source file and write it into the archive data directory.
+
+    This runs inside the worker processes; the catalog is updated by the parent
+    process with the returned entry.
+
+    Args:
+        archive_root (str): Root directory of the archive
+        source_root (str): Root directory of the source tree
+        source (str): Source path relative to ``source_root``
+        size (int): Size of the source file in bytes
+        mtime_ns (int): Modification time of the source file
+        dtype (str): NumPy dtype used for storage
+
+    Returns:
+        dict: Catalog entry for the converted file
+    """
+    kind, x, intensity = read_spectrum_file(os.path.join(source_root, source))
+    key = source_key(source)
+    path = os.path.join(DATA_DIR, key[:2], f"{key}.npy")
+    array = np.vstack([x, intensity]).astype(dtype, copy=False)
+    write_array(os.path.join(archive_root, path), array)
+    return _make_entry(key, source, kind, size, mtime_ns, path, array)
+
+
+def find_source_files(source_root):
+    """
+    Walk a directory tree looking for DPT and CSV files.
+
+    Args:
+        source_root (str): Root directory to scan
+
+    Returns:
+        list: Tuples of (relative path, size, mtime_ns), sorted by path
+    """
+    found = []
+    for dirpath, dirnames, filenames in os.walk(source_root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in SOURCE_KINDS:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            stat = os.stat(full_path)
+            found.append((os.path.relpath(full_path, source_root), stat.st_size, stat.st_mtime_ns))
+    return found
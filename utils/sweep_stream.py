@@ -0,0 +1,673 @@
+"""
+Continuous sweep streams for the live view of the acquisition page.
+
+A background thread acquires sweeps from a source (the OSA, or a simulated
+source for tests and benchmarks) and keeps only the latest one. The live view
+polls for the newest frame at a capped rate, so frames produced while the
+browser is busy are dropped instead of queued, and the Dash callbacks never
+wait for a sweep to finish.
+
+A stream holds the instrument lock while it runs, so single acquisitions and
+streams in other worker processes cannot talk to the same OSA meanwhile. In
+multi-worker mode the stream also publishes its frames and recent sweeps to a
+``StreamChannel`` in the shared directory; the other workers serve polls,
+waterfall views and stop requests from there (``RemoteStream``).
+"""
+
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from utils.osa_connection import AQ6370D
+from utils.shared_state import (
+    FileLock, InstrumentBusy, instrument_lock, multi_worker, pid_alive, safe_name, shared_dir,
+)
+
+# Highest acquisition rate of a stream; sources faster than this are paced
+DEFAULT_MAX_FPS = 10
+
+# A stream nobody has polled for this many seconds stops by itself
+IDLE_TIMEOUT = 30.0
+
+# Seconds to wait for one sweep of the OSA
+SWEEP_TIMEOUT = 60.0
+
+# Recent sweeps kept (as float32) for the waterfall view
+HISTORY_SIZE = 200
+
+
+class OSASweepSource:
+    """
+    Repeated single sweeps of an AQ6370D over one socket connection.
+    """
+
+    def __init__(self, address, port, wavelength_start, wavelength_end, sensitivity):
+        self.osa = AQ6370D(address, port)
+        self.wavelength_start = float(wavelength_start)
+        self.wavelength_end = float(wavelength_end)
+        self.sensitivity = sensitivity
+        self.buffer = b""
+        self.configured = False
+
+    def __call__(self):
+        """
+        Run one sweep and read the trace.
+
+        Returns:
+            tuple: Wavelength and intensity arrays
+        """
+        if not self.configured:
+            self._configure()
+        # *OPC? answers once the sweep is complete. Commands are sent directly:
+        # send_command waits 0.2 s after each one, which would cap the frame rate
+        self._send(":init")
+        self._send("*OPC?")
+        self._read_line()
+        self._send(":TRACE:Y? TRA")
+        values = self._read_line().strip().split(",")
+        intensities = np.array([float(v) for v in values if v.strip()])
+        if intensities.shape[0] == 0:
+            raise ValueError("El OSA no devolvió datos de la traza.")
+        wavelengths = np.linspace(self.wavelength_start, self.wavelength_end, intensities.shape[0])
+        return wavelengths, intensities
+
+    def close(self):
+        """Close the connection to the OSA."""
+        self.osa.close_socket()
+
+    def _configure(self):
+        success, message = self.osa.open_socket()
+        if not success:
+            raise ConnectionError(message)
+        self.osa.socket.settimeout(SWEEP_TIMEOUT)
+        for command in (
+            "open \"anonymous\"",
+            "*RST",
+            "CFORM1",
+            f":sens:wav:start {self.wavelength_start}nm",
+            f":sens:wav:stop {self.wavelength_end}nm",
+            f":sens:sens {self.sensitivity}",
+            ":sens:sens:speed 2x",
+            ":sens:sweep:points:auto on",
+            ":init:smode 1",
+            "*CLS",
+        ):
+            self.osa.send_command(command)
+        # Discard the answers to the login and setup commands
+        self.osa.socket.settimeout(0.5)
+        try:
+            while self.osa.socket.recv(4096):
+                pass
+        except socket.timeout:
+            pass
+        self.osa.socket.settimeout(SWEEP_TIMEOUT)
+        self.configured = True
+
+    def _send(self, command):
+        self.osa.socket.sendall((command + "\r\n").encode())
+
+    def _read_line(self):
+        while b"\n" not in self.buffer:
+            chunk = self.osa.socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("El OSA cerró la conexión.")
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line.decode("utf-8", errors="ignore")
+
+
+class SimulatedSweepSource:
+    """
+    Synthetic sweeps with a drifting peak, for tests and benchmarks.
+    """
+
+    def __init__(self, wavelength_start=1500.0, wavelength_end=1600.0, points=2001, sweep_seconds=0.0, seed=0):
+        self.wavelengths = np.linspace(wavelength_start, wavelength_end, points)
+        self.center = (wavelength_start + wavelength_end) / 2
+        self.span = wavelength_end - wavelength_start
+        self.sweep_seconds = sweep_seconds
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+
+    def __call__(self):
+        if self.sweep_seconds:
+            time.sleep(self.sweep_seconds)
+        self.count += 1
+        peak = self.center + 0.1 * self.span * np.sin(self.count / 20)
+        intensities = -60 + 30 * np.exp(-((self.wavelengths - peak) / (0.01 * self.span)) ** 2)
+        intensities += 0.5 * self.rng.standard_normal(self.wavelengths.shape[0])
+        return self.wavelengths, intensities
+
+    def close(self):
+        pass
+
+
+class SweepStream:
+    """
+    Background acquisition loop that keeps the latest sweep.
+    """
+
+    def __init__(self, source, max_fps=DEFAULT_MAX_FPS, idle_timeout=IDLE_TIMEOUT, history_size=HISTORY_SIZE,
+                 instrument=None, channel=None):
+        self.source = source
+        # Instrument whose lock is held while the stream runs, and channel the frames are published to
+        self.instrument = instrument
+        self.channel = channel
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.idle_timeout = idle_timeout
+        self.frame = None
+        self.seq = 0
+        self.error = None
+        self.sweep_seconds = 0.0
+        self.last_poll = time.time()
+        # (seq, intensities) of the latest sweeps, oldest first
+        self.recent = deque(maxlen=history_size)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sweep-stream", daemon=True)
+
+    @property
+    def running(self):
+        return self.thread.is_alive()
+
+    def start(self):
+        """Start the acquisition thread."""
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Ask the acquisition thread to stop.
+
+        Args:
+            timeout (float): Seconds to wait for the current sweep to finish, None to not wait
+        """
+        self.stop_event.set()
+        if timeout is not None and self.thread.is_alive() and threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+    def latest(self, after_seq=0):
+        """
+        Get the newest frame if it is newer than ``after_seq``.
+
+        Args:
+            after_seq (int): Sequence number of the frame the caller already has
+
+        Returns:
+            dict: Frame with "seq", "timestamp", "wavelengths" and "intensities", or None
+        """
+        with self.lock:
+            self.last_poll = time.time()
+            if self.frame is None or self.frame["seq"] <= after_seq:
+                return None
+            return self.frame
+
+    def history(self):
+        """
+        Get the latest sweeps as a matrix, for the waterfall view.
+
+        Sweeps with a grid different from the newest one (e.g. before a
+        reconfiguration) are left out.
+
+        Returns:
+            tuple: Sequence numbers, wavelengths of the newest sweep and a
+            (sweeps, points) float32 matrix, oldest sweep first; None if no sweep yet
+        """
+        with self.lock:
+            self.last_poll = time.time()
+            if self.frame is None:
+                return None
+            wavelengths = self.frame["wavelengths"]
+            recent = [(seq, row) for seq, row in self.recent if row.shape == wavelengths.shape]
+        return np.array([seq for seq, _ in recent]), wavelengths, np.vstack([row for _, row in recent])
+
+    def stats(self):
+        """
+        Get the state of the stream.
+
+        Returns:
+            dict: Frames produced, mean sweep time, error message and running state
+        """
+        with self.lock:
+            return {
+                "frames": self.seq,
+                "sweep_seconds": self.sweep_seconds,
+                "error": self.error,
+                "running": self.running,
+            }
+
+    def _idle(self):
+        last_poll = self.last_poll
+        if self.channel is not None:
+            last_poll = max(last_poll, self.channel.last_poll())
+        return time.time() - last_poll > self.idle_timeout
+
+    def _run(self):
+        lock = instrument_lock(self.instrument) if self.instrument is not None else None
+        try:
+            # A single acquisition or a stream that is stopping may still hold the instrument
+            if lock is not None and not lock.acquire(timeout=SWEEP_TIMEOUT):
+                raise InstrumentBusy("El OSA está ocupado con otra adquisición.")
+            while not self.stop_event.is_set():
+                if self._idle() or (self.channel is not None and self.channel.stop_requested()):
+                    break
+                start = time.perf_counter()
+                wavelengths, intensities = self.source()
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.seq += 1
+                    self.frame = {
+                        "seq": self.seq,
+                        "timestamp": time.time(),
+                        "wavelengths": wavelengths,
+                        "intensities": intensities,
+                    }
+                    self.recent.append((self.seq, np.asarray(intensities, dtype=np.float32)))
+                    # Exponential mean of the sweep time
+                    self.sweep_seconds = elapsed if self.seq == 1 else 0.8 * self.sweep_seconds + 0.2 * elapsed
+                    frame, sweep_seconds = self.frame, self.sweep_seconds
+                # Another worker started a new stream of the instrument
+                if self.channel is not None and not self.channel.publish(frame, sweep_seconds):
+                    break
+                remaining = self.min_interval - (time.perf_counter() - start)
+                if remaining > 0:
+                    self.stop_event.wait(remaining)
+        except Exception as e:
+            with self.lock:
+                self.error = str(e)
+        finally:
+            try:
+                self.source.close()
+            except Exception:
+                pass
+            if lock is not None:
+                lock.release()
+            if self.channel is not None:
+                self.channel.close(self.error)
+
+
+class StreamChannel:
+    """
+    Files through which a stream running in one worker process is seen by the others.
+
+    The directory holds ``state.json`` (owner, sequence number, timing, error),
+    ``frame.npy`` with the wavelengths and intensities of the newest sweep, a
+    ring of recent sweeps as memory-mapped float32 ``.npy`` files, a ``poll``
+    file touched by every poll (for the idle timeout) and ``stop-<token>``
+    files that ask the owner to stop. Each ``open`` gets a new token, so a
+    stream that was replaced by another one stops publishing.
+    """
+
+    def __init__(self, directory, history_size=HISTORY_SIZE):
+        self.directory = directory
+        self.history_size = history_size
+        self.token = None
+        self.fields = None
+        self.grid = None
+        self.history = None
+        self.history_seqs = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def state(self):
+        """
+        Read the published state.
+
+        Returns:
+            dict: State of the last stream opened on the channel, or None
+        """
+        try:
+            with open(self.path("state.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def open(self):
+        """Take over the channel for a new stream."""
+        self.token = secrets.token_hex(8)
+        self.fields = {
+            "token": self.token,
+            "pid": os.getpid(),
+            "running": True,
+            "seq": 0,
+            "timestamp": None,
+            "sweep_seconds": 0.0,
+            "error": None,
+            "history": None,
+        }
+        self._write_state()
+        self.touch()
+
+    def publish(self, frame, sweep_seconds):
+        """
+        Publish a new sweep.
+
+        Args:
+            frame (dict): Frame with "seq", "timestamp", "wavelengths" and "intensities"
+            sweep_seconds (float): Mean sweep time
+
+        Returns:
+            bool: False if another stream took over the channel
+        """
+        state = self.state()
+        if state is None or state.get("token") != self.token:
+            return False
+        wavelengths = np.asarray(frame["wavelengths"], dtype=np.float64)
+        intensities = np.asarray(frame["intensities"], dtype=np.float64)
+        grid = (float(wavelengths[0]), float(wavelengths[-1]), wavelengths.shape[0])
+        if grid != self.grid:
+            # A new grid starts a new ring of recent sweeps
+            self._remove_history()
+            self.grid = grid
+            self.fields["history"] = f"history-{self.token}-{frame['seq']}"
+            prefix = self.path(self.fields["history"])
+            np.save(prefix + "-x.npy", wavelengths)
+            self.history = open_memmap(prefix + ".npy", "w+", np.float32, (self.history_size, grid[2]))
+            self.history_seqs = open_memmap(prefix + "-seq.npy", "w+", np.int64, (self.history_size,))
+        row = frame["seq"] % self.history_size
+        self.history[row] = intensities
+        self.history_seqs[row] = frame["seq"]
+
+        tmp_path = self.path(f"frame.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.vstack([wavelengths, intensities]))
+        os.replace(tmp_path, self.path("frame.npy"))
+        self.fields.update(seq=frame["seq"], timestamp=frame["timestamp"], sweep_seconds=sweep_seconds)
+        self._write_state()
+        return True
+
+    def close(self, error=None):
+        """
+        Mark the stream as stopped, unless another stream took over the channel.
+
+        Args:
+            error (str): Error that stopped the stream
+        """
+        self._remove_history()
+        try:
+            os.remove(self.path(f"stop-{self.token}"))
+        except OSError:
+            pass
+        state = self.state()
+        if state is not None and state.get("token") == self.token:
+            self.fields.update(running=False, error=error, history=None)
+            self._write_state()
+
+    def stop_requested(self):
+        return os.path.exists(self.path(f"stop-{self.token}"))
+
+    def request_stop(self):
+        """Ask the stream that owns the channel to stop."""
+        state = self.state()
+        if state is not None and state["running"]:
+            open(self.path(f"stop-{state['token']}"), "w").close()
+
+    def touch(self):
+        """Record a poll, which keeps the stream from stopping when idle."""
+        with open(self.path("poll"), "a"):
+            pass
+        os.utime(self.path("poll"))
+
+    def last_poll(self):
+        try:
+            return os.path.getmtime(self.path("poll"))
+        except OSError:
+            return 0.0
+
+    def _write_state(self):
+        tmp_path = self.path(f"state.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.fields, f)
+        os.replace(tmp_path, self.path("state.json"))
+
+    def _remove_history(self):
+        prefix = self.fields.get("history") if self.fields else None
+        self.history = self.history_seqs = self.grid = None
+        if prefix is None:
+            return
+        for suffix in (".npy", "-seq.npy", "-x.npy"):
+            try:
+                os.remove(self.path(prefix + suffix))
+            except OSError:
+                pass
+
+
+class RemoteStream:
+    """
+    Stream of another worker process, read through its channel.
+
+    It offers the same reading methods as ``SweepStream``.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    @property
+    def running(self):
+        state = self.channel.state()
+        return bool(
+            state is not None and state["running"] and pid_alive(state["pid"])
+            and not os.path.exists(self.channel.path(f"stop-{state['token']}"))
+        )
+
+    def stop(self, timeout=None):
+        """Ask the owner of the stream to stop; ``timeout`` is ignored."""
+        self.channel.request_stop()
+
+    def latest(self, after_seq=0):
+        """
+        Get the newest frame if it is newer than ``after_seq``.
+
+        Args:
+            after_seq (int): Sequence number of the frame the caller already has
+
+        Returns:
+            dict: Frame with "seq", "timestamp", "wavelengths" and "intensities", or None
+        """
+        self.channel.touch()
+        state = self.channel.state()
+        if state is None or not state["seq"] or state["seq"] <= after_seq:
+            return None
+        try:
+            frame = np.load(self.channel.path("frame.npy"))
+        except (OSError, ValueError):
+            return None
+        return {
+            "seq": state["seq"],
+            "timestamp": state["timestamp"],
+            "wavelengths": frame[0],
+            "intensities": frame[1],
+        }
+
+    def history(self):
+        """
+        Get the latest sweeps as a matrix, for the waterfall view.
+
+        Returns:
+            tuple: Sequence numbers, wavelengths and a (sweeps, points) float32
+            matrix, oldest sweep first; None if no sweep yet
+        """
+        self.channel.touch()
+        state = self.channel.state()
+        prefix = state.get("history") if state is not None else None
+        if prefix is None:
+            return None
+        prefix = self.channel.path(prefix)
+        try:
+            wavelengths = np.load(prefix + "-x.npy")
+            matrix = np.load(prefix + ".npy", mmap_mode="r")
+            seqs = np.array(np.load(prefix + "-seq.npy", mmap_mode="r"))
+        except (OSError, ValueError):
+            return None
+        order = np.argsort(seqs)
+        order = order[seqs[order] > 0]
+        if order.shape[0] == 0:
+            return None
+        return seqs[order], wavelengths, np.array(matrix[order], dtype=np.float32)
+
+    def stats(self):
+        """
+        Get the state of the stream.
+
+        Returns:
+            dict: Frames produced, mean sweep time, error message and running state
+        """
+        state = self.channel.state() or {}
+        return {
+            "frames": state.get("seq", 0),
+            "sweep_seconds": state.get("sweep_seconds", 0.0),
+            "error": state.get("error"),
+            "running": self.running,
+        }
+
+
+class StreamRegistry:
+    """
+    Live streams by instrument, at most one per instrument.
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.lock = threading.Lock()
+
+    def start(self, instrument, source, max_fps=DEFAULT_MAX_FPS):
+        """
+        Start a stream for an instrument, replacing a stopped one.
+
+        Args:
+            instrument (str): Instrument key (e.g. "ip:port")
+            source (callable): Source returning (wavelengths, intensities) per call
+            max_fps (float): Highest acquisition rate
+
+        Returns:
+            SweepStream: The running stream of the instrument
+        """
+        with self.lock:
+            stream = self.streams.get(instrument)
+            if stream is not None and stream.running:
+                return stream
+            stream = SweepStream(source, max_fps=max_fps, instrument=instrument).start()
+            self.streams[instrument] = stream
+            return stream
+
+    def stop(self, instrument):
+        """
+        Stop the stream of an instrument, if any.
+
+        Args:
+            instrument (str): Instrument key
+        """
+        with self.lock:
+            stream = self.streams.pop(instrument, None)
+        if stream is not None:
+            stream.stop()
+
+    def get(self, instrument):
+        """
+        Get the stream of an instrument.
+
+        Args:
+            instrument (str): Instrument key
+
+        Returns:
+            SweepStream: The stream (possibly stopped with an error), or None
+        """
+        with self.lock:
+            return self.streams.get(instrument)
+
+    def is_streaming(self, instrument):
+        """
+        Check whether an instrument has a running stream.
+
+        Args:
+            instrument (str): Instrument key
+
+        Returns:
+            bool: True while the stream is acquiring
+        """
+        stream = self.get(instrument)
+        return stream is not None and stream.running
+
+
+class SharedStreamRegistry(StreamRegistry):
+    """
+    Live streams by instrument across the worker processes of a server.
+
+    Streams started by this worker are used directly; streams of other
+    workers are reached through their channel.
+    """
+
+    def __init__(self, root=None):
+        super().__init__()
+        self.root = root or shared_dir("streams")
+
+    def channel(self, instrument):
+        """
+        Get the channel of an instrument.
+
+        Args:
+            instrument (str): Instrument key
+
+        Returns:
+            StreamChannel: Channel in the shared directory
+        """
+        return StreamChannel(os.path.join(self.root, safe_name(instrument)))
+
+    def start(self, instrument, source, max_fps=DEFAULT_MAX_FPS):
+        channel = self.channel(instrument)
+        # Two workers must not start a stream of the same instrument at once
+        with FileLock(channel.path("start.lock")):
+            stream = self.get(instrument)
+            if stream is not None and stream.running:
+                return stream
+            channel.open()
+            stream = SweepStream(source, max_fps=max_fps, instrument=instrument, channel=channel).start()
+            with self.lock:
+                self.streams[instrument] = stream
+            return stream
+
+    def stop(self, instrument):
+        with self.lock:
+            stream = self.streams.pop(instrument, None)
+        if stream is not None and stream.running:
+            stream.stop()
+        else:
+            self.channel(instrument).request_stop()
+
+    def get(self, instrument):
+        with self.lock:
+            stream = self.streams.get(instrument)
+        if stream is not None and stream.running:
+            return stream
+        channel = self.channel(instrument)
+        state = channel.state()
+        if state is not None and state["pid"] != os.getpid():
+            return RemoteStream(channel)
+        return stream
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_stream_registry():
+    """
+    Get the shared stream registry, creating it on first use.
+
+    Returns:
+        StreamRegistry: The process-wide stream registry (shared between workers in multi-worker mode)
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SharedStreamRegistry() if multi_worker() else StreamRegistry()
+        return _registry
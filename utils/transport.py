@@ -0,0 +1,227 @@
+"""
+Compact transport of spectra between the server and the browser.
+
+Arrays in figures are sent as base64-encoded typed arrays (``{"dtype": "f4",
+"bdata": ...}``), which Plotly.js decodes natively, instead of decimal JSON
+text: a float32 value takes about 5.3 bytes instead of roughly 18, and
+encoding is a memory copy instead of formatting every number. Evenly spaced x
+values are sent as ``x0``/``dx`` only. Decimated views keep a subset of a
+uniform grid, whose x values can be sent as the number of grid steps between
+points (usually one byte each) with the first value and the grid step;
+Plotly.js does not know that form, so it is only used
+for traces expanded in the browser by ``assets/spectral_transforms.js``.
+Responses are also gzip-compressed, with flask-compress when it is installed and with a
+small standard-library hook otherwise.
+"""
+
+import base64
+import gzip
+
+import numpy as np
+from flask import request
+
+from utils.processing_cache import LRUCache
+
+# Plotly.js typed-array codes by NumPy dtype
+TYPED_ARRAY_CODES = {
+    "float32": "f4", "float64": "f8", "int32": "i4", "uint8": "u1", "uint16": "u2", "uint32": "u4",
+}
+
+# Largest deviation from a uniform grid, relative to the step, sent as x0/dx
+UNIFORM_TOLERANCE = 1e-3
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/html",
+    "text/css",
+)
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 5
+
+# Compressed bodies of cacheable static resources (Plotly.js, component bundles)
+compressed_cache = LRUCache(max_entries=64, max_bytes=64 * 1024 * 1024)
+
+
+def encode_array(values, dtype="float32"):
+    """
+    Encode an array as a Plotly typed-array specification.
+
+    Args:
+        values (array-like): Values to encode
+        dtype (str): NumPy dtype of the encoded data, one of ``TYPED_ARRAY_CODES``
+
+    Returns:
+        dict: ``{"dtype": ..., "bdata": ...}`` accepted by Plotly.js wherever an array is,
+        with ``"shape"`` for 2D arrays (e.g. heatmap ``z``)
+    """
+    array = np.ascontiguousarray(values, dtype=dtype)
+    spec = {
+        "dtype": TYPED_ARRAY_CODES[array.dtype.name],
+        "bdata": base64.b64encode(array.data).decode("ascii"),
+    }
+    if array.ndim > 1:
+        spec["shape"] = ", ".join(str(n) for n in array.shape)
+    return spec
+
+
+def _encode_grid_steps(x, gaps, smallest, largest, tolerance):
+    """
+    Encode monotonic values that lie on a uniform grid as integer grid steps.
+
+    Each value is stored as the number of grid steps from the previous one, so
+    a decimated view of a long sweep usually needs one byte per point. The grid
+    step is the smallest gap between values, refined over the whole span;
+    min-max decimation keeps neighbouring points often enough to find it.
+
+    Args:
+        x (numpy.ndarray): Float64 values
+        gaps (numpy.ndarray): ``np.diff(x)``
+        smallest (float): Smallest gap
+        largest (float): Largest gap
+        tolerance (float): Largest deviation from the grid, as a fraction of the step
+
+    Returns:
+        dict: Typed-array specification of the steps with the first value
+        (``offset``) and the grid step (``step``), or None if the values are
+        not monotonic or not on a uniform grid
+    """
+    if not (smallest > 0 or largest < 0):
+        return None
+    # Grid step over the whole span, refining the smallest gap
+    span = x[-1] - x[0]
+    count = np.rint(span / (smallest if smallest > 0 else largest))
+    step = span / count
+    most = np.rint(max(smallest, largest, key=abs) / step)
+    if most >= 2 ** 32:
+        return None
+
+    # Steps between neighbours, each within the tolerance of an integer and
+    # adding up to the span, so the decoded values do not drift
+    ratios = gaps / step
+    steps = np.empty(x.shape[0])
+    steps[0] = 0
+    np.rint(ratios, out=steps[1:])
+    ratios -= steps[1:]
+    if np.abs(ratios, out=ratios).max() > tolerance or steps.sum() != count:
+        return None
+    spec = encode_array(steps, "uint8" if most < 2 ** 8 else "uint16" if most < 2 ** 16 else "uint32")
+    spec.update(offset=float(x[0]), step=float(step))
+    return spec
+
+
+def encode_axis(x, tolerance=UNIFORM_TOLERANCE, grid_steps=False):
+    """
+    Encode the x values of a trace, as ``x0``/``dx`` when they are evenly spaced.
+
+    OSA sweeps and full-resolution windows are uniform grids, which then cost
+    two numbers instead of an array. ``x`` is set to None in that case so a
+    patched trace does not keep a previous array. Decimated views of a grid can
+    be sent as the number of grid steps between points, with the first value
+    (``offset``) and the grid step (``step``) in the specification.
+
+    Args:
+        x (array-like): X values
+        tolerance (float): Largest deviation from the uniform grid, as a fraction of the step
+        grid_steps (bool): Send values on a uniform grid (decimated views) as grid
+            steps; only for traces expanded by ``assets/spectral_transforms.js``
+
+    Returns:
+        dict: Trace properties ``x`` (and ``x0`` and ``dx`` for uniform grids)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[0]
+    if n > 2:
+        dx = (x[-1] - x[0]) / (n - 1)
+        gaps = np.diff(x)
+        smallest, largest = gaps.min(), gaps.max()
+        # Gaps that differ by more than twice the tolerance rule out a uniform grid cheaply
+        if (
+            dx != 0 and largest - smallest <= 2 * tolerance * abs(dx)
+            and np.abs(x - (x[0] + dx * np.arange(n))).max() <= tolerance * abs(dx)
+        ):
+            return {"x": None, "x0": float(x[0]), "dx": float(dx)}
+        if grid_steps:
+            spec = _encode_grid_steps(x, gaps, smallest, largest, tolerance)
+            if spec is not None:
+                return {"x": spec}
+    return {"x": encode_array(x)}
+
+
+def decode_array(spec):
+    """
+    Decode a typed-array specification created with ``encode_array`` or
+    ``encode_axis`` (grid steps included).
+
+    Args:
+        spec (dict or list): Typed-array specification, or a plain list of numbers
+
+    Returns:
+        numpy.ndarray: Decoded values
+    """
+    if isinstance(spec, dict) and "bdata" in spec:
+        array = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=np.dtype(spec["dtype"]))
+        if "shape" in spec:
+            array = array.reshape([int(n) for n in str(spec["shape"]).split(",")])
+        if "step" in spec:
+            array = spec["offset"] + spec["step"] * np.cumsum(array, dtype=np.float64)
+        return array
+    return np.asarray(spec, dtype=np.float64)
+
+
+def enable_compression(server, level=COMPRESS_LEVEL, min_size=COMPRESS_MIN_SIZE):
+    """
+    Compress the responses of a Flask server with gzip.
+
+    Args:
+        server (flask.Flask): Server of the Dash application
+        level (int): gzip compression level
+        min_size (int): Responses smaller than this are sent as they are
+
+    Returns:
+        str: Name of the mechanism in use ("flask_compress" or "gzip")
+    """
+    try:
+        from flask_compress import Compress
+    except ImportError:
+        Compress = None
+
+    if Compress is not None:
+        server.config.setdefault("COMPRESS_ALGORITHM", "gzip")
+        server.config.setdefault("COMPRESS_LEVEL", level)
+        server.config.setdefault("COMPRESS_MIN_SIZE", min_size)
+        server.config.setdefault("COMPRESS_MIMETYPES", list(COMPRESSIBLE_TYPES))
+        Compress(server)
+        return "flask_compress"
+
+    @server.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+        ):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        # Static resources are compressed once; callback responses every time
+        cacheable = request.method == "GET" and (response.cache_control.max_age or response.get_etag()[0])
+        key = (request.full_path, response.get_etag()[0]) if cacheable else None
+        compressed = compressed_cache.get(key) if key else None
+        if compressed is None:
+            compressed = gzip.compress(data, compresslevel=level)
+            if key:
+                compressed_cache.put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Content-Length"] = str(len(compressed))
+        response.vary.add("Accept-Encoding")
+        return response
+
+    return "gzip"
@@ -0,0 +1,399 @@
+"""
+Waterfall (sweeps x wavelength) views of long sweep series.
+
+A series of sweeps from the binary archive is written once as a 2D matrix on
+a common wavelength grid (``level0.npy``, one row per sweep) plus coarser
+levels, each halving both axes by keeping the maximum of every 2x2 block so
+peaks survive. All the levels are memory-mapped: a view picks the coarsest
+level that still has screen resolution in the visible window, reads only the
+fixed-size tiles that cover the window (tiles are cached), and bins them down
+to the screen size. A 10k-sweep x 50k-point campaign can therefore be panned
+and zoomed without ever reading more than a few screens worth of data.
+
+Each build writes its levels to a new subdirectory and then replaces
+``meta.json``, which names the current build, so a rebuild never truncates
+files that a running server has memory-mapped.
+
+Live streams use the same binning on the sweeps kept in memory by the stream.
+"""
+
+import json
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from utils.processing_cache import LRUCache
+from utils.spectrum_archive import SpectrumArchive
+
+WATERFALL_DIR = "waterfall"
+META_NAME = "meta.json"
+
+# Cells sent to the browser per view (columns along the wavelength axis)
+VIEW_COLUMNS = 800
+VIEW_ROWS = 400
+
+# Side of the square tiles read from the level files
+TILE_SIZE = 256
+
+# Rows reduced at a time when building the coarser levels
+BUILD_BLOCK_ROWS = 512
+
+tile_cache = LRUCache(max_entries=4096, max_bytes=256 * 1024 * 1024)
+
+
+def bin_max(z, rows=VIEW_ROWS, columns=VIEW_COLUMNS):
+    """
+    Reduce a matrix to at most ``rows`` x ``columns`` cells.
+
+    Each cell keeps the maximum of its block (NaN values are ignored).
+
+    Args:
+        z (numpy.ndarray): 2D matrix
+        rows (int): Maximum number of rows
+        columns (int): Maximum number of columns
+
+    Returns:
+        tuple: Binned matrix and the row and column block sizes
+    """
+    row_factor = max(1, math.ceil(z.shape[0] / rows))
+    column_factor = max(1, math.ceil(z.shape[1] / columns))
+    if row_factor == 1 and column_factor == 1:
+        return z, 1, 1
+    n_rows = math.ceil(z.shape[0] / row_factor)
+    n_columns = math.ceil(z.shape[1] / column_factor)
+    padded = np.full((n_rows * row_factor, n_columns * column_factor), np.nan, dtype=z.dtype)
+    padded[:z.shape[0], :z.shape[1]] = z
+    blocks = padded.reshape(n_rows, row_factor, n_columns, column_factor)
+    return np.fmax.reduce(np.fmax.reduce(blocks, axis=3), axis=1), row_factor, column_factor
+
+
+def index_window(n, start, step, value_range):
+    """
+    Indices of a regular grid inside a range of values.
+
+    Args:
+        n (int): Number of grid points
+        start (float): First grid value
+        step (float): Grid step
+        value_range (tuple): Visible (min, max) values, or None for the whole grid
+
+    Returns:
+        tuple: Start and stop indices (at least one point)
+    """
+    if value_range is None or step == 0:
+        return 0, n
+    low, high = sorted(float(v) for v in value_range)
+    first = min(max(int(math.floor((low - start) / step)), 0), n - 1)
+    stop = min(max(int(math.ceil((high - start) / step)) + 1, first + 1), n)
+    return first, stop
+
+
+def matrix_view(z, x0, dx, x_range=None, row_range=None, rows=VIEW_ROWS, columns=VIEW_COLUMNS, row0=0):
+    """
+    Binned window of a matrix held in memory.
+
+    Args:
+        z (numpy.ndarray): (sweeps, points) matrix
+        x0 (float): Wavelength of the first column
+        dx (float): Wavelength step between columns
+        x_range (tuple): Visible wavelength range, or None
+        row_range (tuple): Visible sweep range (in row numbers), or None
+        rows (int): Maximum rows returned
+        columns (int): Maximum columns returned
+        row0 (float): Row number of the first row
+
+    Returns:
+        dict: ``z`` and the ``x0``/``dx``/``y0``/``dy`` of its cell centers
+    """
+    c0, c1 = index_window(z.shape[1], x0, dx, x_range)
+    r0, r1 = index_window(z.shape[0], row0, 1, row_range)
+    binned, row_factor, column_factor = bin_max(np.asarray(z[r0:r1, c0:c1]), rows, columns)
+    return {
+        "z": binned,
+        "x0": x0 + dx * (c0 + (column_factor - 1) / 2),
+        "dx": dx * column_factor,
+        "y0": row0 + r0 + (row_factor - 1) / 2,
+        "dy": row_factor,
+    }
+
+
+def waterfall_dir(archive_root, kind):
+    """
+    Directory of the waterfall of one kind of spectra of an archive.
+
+    Args:
+        archive_root (str): Archive directory
+        kind (str): Kind of spectra ("csv" or "dpt")
+
+    Returns:
+        str: Waterfall directory
+    """
+    return os.path.join(archive_root, WATERFALL_DIR, kind)
+
+
+def catalog_signature(entries):
+    """
+    Summarize catalog entries to detect a waterfall built from older data.
+
+    Args:
+        entries (list): Catalog entries
+
+    Returns:
+        list: Number of entries and latest conversion time
+    """
+    return [len(entries), max((entry["converted_at"] for entry in entries), default=0)]
+
+
+def write_waterfall(directory, rows, n_rows, x0, x1, n_points, sources=None, signature=None, dtype="float32",
+                    report=None):
+    """
+    Write a waterfall from sweeps already on a common grid.
+
+    Args:
+        directory (str): Output directory
+        rows (iterable): Intensity arrays of ``n_points`` values, one per sweep, in order
+        n_rows (int): Number of sweeps
+        x0 (float): First wavelength of the grid
+        x1 (float): Last wavelength of the grid
+        n_points (int): Points of the grid
+        sources (list): Name of each sweep
+        signature (list): ``catalog_signature`` of the data
+        dtype (str): Storage dtype
+        report (callable): Called with (stage, done, total) while writing
+    """
+    meta_path = os.path.join(directory, META_NAME)
+    previous_build = None
+    if os.path.isfile(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            previous_build = json.load(f).get("build", "")
+    build = f"build-{time.time_ns():x}-{os.getpid()}"
+    build_dir = os.path.join(directory, build)
+    os.makedirs(build_dir)
+
+    level = open_memmap(os.path.join(build_dir, "level0.npy"), mode="w+", dtype=dtype, shape=(n_rows, n_points))
+    for index, row in enumerate(rows):
+        level[index] = row
+        if report and (index + 1) % 100 == 0:
+            report("barridos", index + 1, n_rows)
+    level.flush()
+    shapes = [list(level.shape)]
+    del level
+
+    # Each level keeps the maximum of 2x2 blocks of the previous one
+    while shapes[-1][0] > VIEW_ROWS or shapes[-1][1] > VIEW_COLUMNS:
+        previous = np.load(os.path.join(build_dir, f"level{len(shapes) - 1}.npy"), mmap_mode="r")
+        shape = [math.ceil(n / 2) for n in previous.shape]
+        level = open_memmap(os.path.join(build_dir, f"level{len(shapes)}.npy"), mode="w+", dtype=dtype,
+                            shape=tuple(shape))
+        for start in range(0, previous.shape[0], BUILD_BLOCK_ROWS):
+            block, _, _ = bin_max(np.asarray(previous[start:start + BUILD_BLOCK_ROWS]),
+                                  math.ceil(min(BUILD_BLOCK_ROWS, previous.shape[0] - start) / 2), shape[1])
+            level[start // 2:start // 2 + block.shape[0]] = block
+        level.flush()
+        shapes.append(shape)
+        del level, previous
+        if report:
+            report("niveles", len(shapes) - 1, None)
+
+    meta = {
+        "build": build,
+        "x0": float(x0),
+        "x1": float(x1),
+        "levels": shapes,
+        "sources": list(sources or []),
+        "signature": signature,
+        "built_at": time.time(),
+    }
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    remove_old_builds(directory, keep=(build, previous_build))
+
+
+def remove_old_builds(directory, keep):
+    """
+    Delete the level files of superseded waterfall builds.
+
+    The previous build is kept, since a server may have read the old
+    ``meta.json`` just before it was replaced and not mapped its levels yet.
+    Files still mapped elsewhere stay readable (POSIX) or are left in place
+    until a later build (Windows).
+
+    Args:
+        directory (str): Waterfall directory
+        keep (tuple): Names of the builds to keep ("" for levels written
+            directly in the directory by older versions)
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith("build-") and os.path.isdir(path) and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.startswith("level") and name.endswith(".npy") and "" not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_waterfall(archive_root, kind="csv", dtype="float32", report=None):
+    """
+    Build the waterfall of the spectra of one kind of an archive.
+
+    Sweeps are taken in source order (acquisition file names start with their
+    timestamp) and interpolated onto a common grid when their own grid differs.
+
+    Args:
+        archive_root (str): Archive directory
+        kind (str): Kind of spectra ("csv" or "dpt")
+        dtype (str): Storage dtype
+        report (callable): Called with (stage, done, total) while writing
+
+    Returns:
+        str: Waterfall directory
+    """
+    with SpectrumArchive(archive_root) as archive:
+        entries = archive.entries(kind)
+        if not entries:
+            raise ValueError(f"El archivo no contiene espectros de tipo '{kind}'.")
+        x0 = min(entry["x_min"] for entry in entries)
+        x1 = max(entry["x_max"] for entry in entries)
+        n_points = max(entry["n_points"] for entry in entries)
+        grid = np.linspace(x0, x1, n_points)
+
+        def rows():
+            for entry in entries:
+                x, y = archive.load(entry["key"])
+                if x.shape[0] > 1 and x[0] > x[-1]:
+                    x, y = x[::-1], y[::-1]
+                if x.shape == grid.shape and np.allclose(x, grid, rtol=0, atol=1e-9 * max(abs(x1), 1)):
+                    yield y
+                else:
+                    yield np.interp(grid, x, y, left=np.nan, right=np.nan)
+
+        directory = waterfall_dir(archive_root, kind)
+        write_waterfall(
+            directory, rows(), len(entries), x0, x1, n_points,
+            sources=[entry["source"] for entry in entries],
+            signature=catalog_signature(entries), dtype=dtype, report=report,
+        )
+    return directory
+
+
+class Waterfall:
+    """
+    Memory-mapped waterfall levels with tiled, binned views.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_NAME), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        build_dir = os.path.join(directory, self.meta.get("build", ""))
+        self.levels = [
+            np.load(os.path.join(build_dir, f"level{index}.npy"), mmap_mode="r")
+            for index in range(len(self.meta["levels"]))
+        ]
+        self.n_rows, self.n_points = self.levels[0].shape
+        self.x0 = self.meta["x0"]
+        self.dx = (self.meta["x1"] - self.x0) / max(self.n_points - 1, 1)
+
+    def is_current(self, entries):
+        """
+        Check whether the waterfall was built from the current catalog.
+
+        Args:
+            entries (list): Catalog entries of the kind of the waterfall
+
+        Returns:
+            bool: True if no spectrum was added or converted since the build
+        """
+        return self.meta.get("signature") == catalog_signature(entries)
+
+    def view(self, x_range=None, row_range=None, rows=VIEW_ROWS, columns=VIEW_COLUMNS):
+        """
+        Binned window of the waterfall.
+
+        Args:
+            x_range (tuple): Visible wavelength range, or None
+            row_range (tuple): Visible sweep range (row numbers), or None
+            rows (int): Maximum rows returned
+            columns (int): Maximum columns returned
+
+        Returns:
+            dict: ``z``, ``x0``/``dx``/``y0``/``dy`` of the cell centers and the level used
+        """
+        c0, c1 = index_window(self.n_points, self.x0, self.dx, x_range)
+        r0, r1 = index_window(self.n_rows, 0, 1, row_range)
+        # Coarsest level with twice the screen resolution on both axes: binning
+        # it by whole factors then keeps at least 2/3 of the screen resolution,
+        # while a level with just the screen resolution could lose half of it
+        ratio = min((c1 - c0) / columns, (r1 - r0) / rows) / 2
+        level = min(max(int(math.floor(math.log2(ratio))) if ratio >= 1 else 0, 0), len(self.levels) - 1)
+        scale = 2 ** level
+        shape = self.levels[level].shape
+        lr0, lr1 = r0 // scale, min(-(-r1 // scale), shape[0])
+        lc0, lc1 = c0 // scale, min(-(-c1 // scale), shape[1])
+
+        binned, row_factor, column_factor = bin_max(self._window(level, lr0, lr1, lc0, lc1), rows, columns)
+        return {
+            "z": binned,
+            "x0": self.x0 + self.dx * (lc0 * scale + (column_factor * scale - 1) / 2),
+            "dx": self.dx * column_factor * scale,
+            "y0": lr0 * scale + (row_factor * scale - 1) / 2,
+            "dy": row_factor * scale,
+            "level": level,
+        }
+
+    def _window(self, level, r0, r1, c0, c1):
+        """Assemble a window of a level from cached tiles."""
+        window = np.empty((r1 - r0, c1 - c0), dtype=self.levels[level].dtype)
+        for tile_row in range(r0 // TILE_SIZE, -(-r1 // TILE_SIZE)):
+            for tile_column in range(c0 // TILE_SIZE, -(-c1 // TILE_SIZE)):
+                tile = self._tile(level, tile_row, tile_column)
+                top, left = tile_row * TILE_SIZE, tile_column * TILE_SIZE
+                rs, re = max(r0, top), min(r1, top + tile.shape[0])
+                cs, ce = max(c0, left), min(c1, left + tile.shape[1])
+                window[rs - r0:re - r0, cs - c0:ce - c0] = tile[rs - top:re - top, cs - left:ce - left]
+        return window
+
+    def _tile(self, level, tile_row, tile_column):
+        key = (self.directory, self.meta["built_at"], level, tile_row, tile_column)
+
+        def read():
+            data = self.levels[level]
+            return np.array(data[tile_row * TILE_SIZE:(tile_row + 1) * TILE_SIZE,
+                                 tile_column * TILE_SIZE:(tile_column + 1) * TILE_SIZE])
+
+        return tile_cache.get_or_compute(key, read)
+
+
+_waterfalls = LRUCache(max_entries=8)
+
+
+def open_waterfall(archive_root, kind):
+    """
+    Open the waterfall of an archive, reusing an already opened one.
+
+    Args:
+        archive_root (str): Archive directory
+        kind (str): Kind of spectra ("csv" or "dpt")
+
+    Returns:
+        Waterfall: The opened waterfall
+
+    Raises:
+        FileNotFoundError: If the waterfall has not been built
+    """
+    directory = waterfall_dir(archive_root, kind)
+    meta_path = os.path.join(directory, META_NAME)
+    if not os.path.isfile(meta_path):
+        raise FileNotFoundError(
+            f"No hay cascada construida en '{archive_root}'. Ejecute: python build_waterfall.py {archive_root} --kind {kind}"
+        )
+    key = (directory, os.path.getmtime(meta_path))
+    return _waterfalls.get_or_compute(key, lambda: Waterfall(directory))